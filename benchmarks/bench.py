@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：在替身 Endstone 运行时上对给定规模的种子数据库重复执行典型场景，
+输出每个场景的吞吐（ops/s）与耗时分位数（p50/p95/p99/max）。
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench --shops 10000 --iterations 2000
+    python -m benchmarks.bench --scenario interact --scenario sell_trade --json result.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .harness import OVERWORLD, BenchWorld
+from endstone.event import PlayerInteractEvent
+from endstone_arc_button_shop.PerformanceMonitor import LatencyHistogram
+
+# 场景：setup(world, rng) 返回 prepare(i) -> 参数；prepare 不计时，run(参数) 计时
+Scenario = Callable[[BenchWorld, random.Random], Tuple[Callable[[int], Any], Callable[[Any], None]]]
+
+
+def _shops_of_type(world: BenchWorld, shop_type: str) -> List[Dict[str, Any]]:
+    shops = [shop for shop in world.shops if shop["shop_type"] == shop_type]
+    if not shops:
+        raise SystemExit(f"no {shop_type} shops seeded; adjust --buy-ratio")
+    return shops
+
+
+def _owner_of(world: BenchWorld, shop: Dict[str, Any]):
+    return world.server.get_player(shop["owner_name"])
+
+
+def scenario_interact(world: BenchWorld, rng: random.Random):
+    """点击按钮：命中商店（缓存已预热）与未命中各占一定比例"""
+    players = world.players
+
+    def prepare(i: int):
+        player = players[i % len(players)]
+        # 清除交互状态，避免防抖与「表单已打开」把请求直接丢弃
+        world.plugin._open_forms.pop(player.name, None)
+        world.plugin._last_interacts.pop(player.name, None)
+        if rng.random() < 0.8:
+            block = world.button_at(rng.choice(world.shops))
+        else:
+            block = world.button_at({"x": rng.randrange(-4096, 4096), "y": 200, "z": rng.randrange(-4096, 4096)})
+        return PlayerInteractEvent(player, block)
+
+    def run(event):
+        world.plugin.on_player_interact(event)
+
+    return prepare, run
+
+
+def scenario_sell_trade(world: BenchWorld, rng: random.Random):
+    """向出售商店购买 1~16 个物品"""
+    shops = _shops_of_type(world, "sell")
+    players = world.players
+
+    def prepare(i: int):
+        player = players[i % len(players)]
+        world.clear_inventory(player)
+        return player, rng.choice(shops), rng.randint(1, 16)
+
+    def run(args):
+        player, shop, quantity = args
+        world.plugin._execute_purchase(player, shop, quantity)
+
+    return prepare, run
+
+
+def scenario_buy_trade(world: BenchWorld, rng: random.Random):
+    """向收购商店出售 1~16 个物品（背包中事先放入对应物品）"""
+    shops = _shops_of_type(world, "buy")
+    players = world.players
+
+    def prepare(i: int):
+        player = players[i % len(players)]
+        shop = rng.choice(shops)
+        quantity = rng.randint(1, 16)
+        world.clear_inventory(player)
+        world.give_stack(player, json.loads(shop["item_data"]), quantity)
+        return player, shop, quantity
+
+    def run(args):
+        player, shop, quantity = args
+        world.plugin._execute_purchase(player, shop, quantity)
+
+    return prepare, run
+
+
+def scenario_restock(world: BenchWorld, rng: random.Random):
+    """店主为出售商店补货：打开补货表单并提交数量"""
+    shops = _shops_of_type(world, "sell")
+
+    def prepare(i: int):
+        shop = rng.choice(shops)
+        owner = _owner_of(world, shop)
+        quantity = rng.randint(1, 64)
+        world.clear_inventory(owner)
+        world.give_stack(owner, json.loads(shop["item_data"]), quantity)
+        return owner, shop, quantity
+
+    def run(args):
+        owner, shop, quantity = args
+        world.plugin._show_restock_panel(owner, shop)
+        owner.last_form.on_submit(owner, json.dumps([None, str(quantity)]))
+
+    return prepare, run
+
+
+def scenario_nearby(world: BenchWorld, rng: random.Random):
+    """附近商店：API 查询 3x3 区块并打开附近商店面板"""
+    players = world.players
+
+    def prepare(i: int):
+        player = players[i % len(players)]
+        shop = rng.choice(world.shops)
+        player.location.x = shop["x"]
+        player.location.z = shop["z"]
+        return player
+
+    def run(player):
+        world.plugin.api_get_nearby_shops(int(player.location.x), int(player.location.z), OVERWORLD.name)
+        world.plugin._show_nearby_shops_panel(player)
+
+    return prepare, run
+
+
+def scenario_collect_all(world: BenchWorld, rng: random.Random, batches: int = 8):
+    """收购商店店主一键收取 batches 批已收购物品"""
+    shops = _shops_of_type(world, "buy")
+    db = world.plugin.db_manager
+
+    def prepare(i: int):
+        shop = rng.choice(shops)
+        owner = _owner_of(world, shop)
+        world.clear_inventory(owner)
+        item = json.loads(shop["item_data"])
+        item["count"] = rng.randint(1, 32)
+        db.execute(
+            "UPDATE button_shops SET collected_items = ?, revision = revision + 1 WHERE id = ?",
+            (json.dumps([item] * batches), shop["id"])
+        )
+        if world.plugin.shop_cache is not None:
+            world.plugin.shop_cache.refresh_shop(shop["id"])
+        return owner, world.plugin._get_shop_by_id(shop["id"])
+
+    def run(args):
+        owner, shop = args
+        world.plugin._collect_all_items(owner, shop)
+
+    return prepare, run
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "interact": scenario_interact,
+    "sell_trade": scenario_sell_trade,
+    "buy_trade": scenario_buy_trade,
+    "restock": scenario_restock,
+    "nearby": scenario_nearby,
+    "collect_all": scenario_collect_all,
+}
+
+
+def run_scenario(world: BenchWorld, name: str, iterations: int, warmup: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    prepare, run = SCENARIOS[name](world, rng)
+    for i in range(warmup):
+        run(prepare(i))
+    histogram = LatencyHistogram()
+    errors_before = world.logger.errors
+    timed_ns = 0
+    for i in range(iterations):
+        args = prepare(warmup + i)
+        start = time.perf_counter_ns()
+        run(args)
+        elapsed = time.perf_counter_ns() - start
+        histogram.record(elapsed)
+        timed_ns += elapsed
+        # 推进一个 tick，执行插件调度的任务（同步模式下通常为空）
+        world.drain_scheduler()
+    result = histogram.summary()
+    result["ops_per_sec"] = iterations / (timed_ns / 1e9) if timed_ns else 0.0
+    result["errors"] = world.logger.errors - errors_before
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ARCButtonShop offline benchmarks")
+    parser.add_argument("--shops", type=int, default=10000, help="number of seeded shops")
+    parser.add_argument("--players", type=int, default=50, help="number of simulated players")
+    parser.add_argument("--area", type=int, default=2048, help="side length of the square shops are spread over")
+    parser.add_argument("--buy-ratio", type=float, default=0.3, help="fraction of buy (收购) shops")
+    parser.add_argument("--iterations", type=int, default=2000, help="timed operations per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="untimed operations per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="disable the loaded-chunk shop cache")
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print plugin log output")
+    args = parser.parse_args(argv)
+
+    # 运行期间工作目录切换到临时目录，输出路径需先解析为绝对路径
+    json_path = os.path.abspath(args.json) if args.json else None
+    settings = {"shop_cache_enabled": "false"} if args.no_cache else {}
+    names = args.scenario or list(SCENARIOS)
+    results: Dict[str, Any] = {}
+    with BenchWorld(settings, verbose=args.verbose) as world:
+        world.add_players(args.players)
+        start = time.perf_counter()
+        world.seed_shops(args.shops, area=args.area, buy_ratio=args.buy_ratio, seed=args.seed)
+        chunk_count = world.load_all_shop_chunks()
+        print(f"seeded {args.shops} shops in {chunk_count} chunks ({time.perf_counter() - start:.2f}s)")
+        print(f"{'scenario':<14}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+        for name in names:
+            result = run_scenario(world, name, args.iterations, args.warmup, args.seed)
+            results[name] = result
+            print(
+                f"{name:<14}{result['ops_per_sec']:>10.0f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+                f"{result['p99_ms']:>10.3f}{result['max_ms']:>10.3f}{result['errors']:>8}"
+            )
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试框架：在临时目录中用替身运行时启动 ARCButtonShopPlugin，提供模拟的服务器、调度器、玩家与经济插件，
+并按给定规模直接写入种子数据。
+"""
+import base64
+import datetime
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_ROOT = Path(__file__).resolve().parent.parent
+# 替身 endstone 必须先于插件导入
+sys.path.insert(0, str(_ROOT / "benchmarks" / "runtime"))
+sys.path.insert(0, str(_ROOT / "src"))
+
+from endstone.block import Block  # noqa: E402
+from endstone.event import ChunkLoadEvent  # noqa: E402
+from endstone.inventory import ItemStack, PlayerInventory  # noqa: E402
+from endstone.nbt import CompoundTag, load  # noqa: E402
+
+from endstone_arc_button_shop.LanguageManager import LanguageManager  # noqa: E402
+from endstone_arc_button_shop.SettingManager import SettingManager  # noqa: E402
+from endstone_arc_button_shop.arc_button_shop import ARCButtonShopPlugin  # noqa: E402
+
+CHUNK_SIZE = 16
+
+# 基准测试默认配置：关闭耗时统计与异步执行器，测得的是插件本身的同步开销
+DEFAULT_SETTINGS = {
+    "perf_stats_enabled": "false",
+    "db_async_enabled": "false",
+    "transaction_retention_interval_minutes": "0",
+    "trade_tax_enabled": "true",
+    "interact_debounce_ms": "0",
+}
+
+ITEM_TYPES = (
+    "minecraft:diamond", "minecraft:iron_ingot", "minecraft:gold_ingot", "minecraft:emerald",
+    "minecraft:oak_log", "minecraft:bread", "minecraft:redstone", "minecraft:coal",
+    "minecraft:ender_pearl", "minecraft:snowball",
+)
+
+
+class Dimension:
+    def __init__(self, name: str):
+        self.name = name
+
+
+OVERWORLD = Dimension("overworld")
+
+
+class Location:
+    def __init__(self, x: float, y: float, z: float, dimension: Dimension):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.dimension = dimension
+
+
+class Chunk:
+    def __init__(self, x: int, z: int, dimension: Dimension):
+        self.x = x
+        self.z = z
+        self.dimension = dimension
+
+
+class Logger:
+    """收集日志而不输出，错误数量计入结果"""
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.errors = 0
+        self.warnings = 0
+
+    def info(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def warning(self, message: str) -> None:
+        self.warnings += 1
+        if self.verbose:
+            print(message)
+
+    def error(self, message: str) -> None:
+        self.errors += 1
+        if self.verbose:
+            print(message)
+
+
+class Task:
+    def __init__(self, fn: Callable[[], None], due: int, period: int):
+        self.fn = fn
+        self.due = due
+        self.period = period
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Scheduler:
+    """按 tick 推进的调度器"""
+
+    def __init__(self):
+        self.current_tick = 0
+        self.tasks: List[Task] = []
+
+    def run_task(self, plugin: Any, fn: Callable[[], None], delay: int = 0, period: int = 0) -> Task:
+        task = Task(fn, self.current_tick + max(0, delay), period)
+        self.tasks.append(task)
+        return task
+
+    def tick(self) -> None:
+        self.current_tick += 1
+        due = [task for task in self.tasks if not task.cancelled and task.due <= self.current_tick]
+        for task in due:
+            task.fn()
+            if task.period > 0:
+                task.due = self.current_tick + task.period
+            else:
+                task.cancelled = True
+        if len(self.tasks) > 256:
+            self.tasks = [task for task in self.tasks if not task.cancelled]
+
+
+class Economy:
+    """经济插件替身（api 与 arc_core 一致）"""
+
+    def __init__(self):
+        self.balances: Dict[str, int] = {}
+
+    def api_get_player_money(self, player_name: str) -> int:
+        return self.balances.get(player_name, 0)
+
+    def api_change_player_money(self, player_name: str, amount: int) -> bool:
+        balance = self.balances.get(player_name, 0) + amount
+        if balance < 0:
+            return False
+        self.balances[player_name] = balance
+        return True
+
+
+class PluginManager:
+    def __init__(self, economy: Economy):
+        self._economy = economy
+
+    def get_plugin(self, name: str) -> Any:
+        return self._economy if name == "arc_core" else None
+
+
+class Language:
+    def translate(self, key: str, params: Any = None, locale: Any = None) -> str:
+        return key
+
+
+class Player:
+    def __init__(self, name: str, is_op: bool = False):
+        self.name = name
+        self.unique_id = uuid.uuid5(uuid.NAMESPACE_OID, name)
+        self.is_op = is_op
+        self.locale = "zh_CN"
+        self.location = Location(0.0, 64.0, 0.0, OVERWORLD)
+        self.inventory = PlayerInventory()
+        self.forms: List[Any] = []
+        self.messages: List[str] = []
+
+    def send_form(self, form: Any) -> None:
+        self.forms.append(form)
+        if len(self.forms) > 8:
+            del self.forms[:-8]
+
+    def send_message(self, message: str) -> None:
+        self.messages.append(message)
+        if len(self.messages) > 8:
+            del self.messages[:-8]
+
+    @property
+    def last_form(self) -> Any:
+        return self.forms[-1] if self.forms else None
+
+
+class Server:
+    def __init__(self, economy: Economy):
+        self.scheduler = Scheduler()
+        self.plugin_manager = PluginManager(economy)
+        self.language = Language()
+        self.online_players: List[Player] = []
+
+    def get_player(self, name: str) -> Optional[Player]:
+        for player in self.online_players:
+            if player.name == name:
+                return player
+        return None
+
+
+class BenchWorld:
+    """一次基准运行的环境：临时工作目录、插件实例与模拟玩家"""
+
+    def __init__(self, settings: Optional[Dict[str, str]] = None, verbose: bool = False, keep_dir: bool = False):
+        self.workdir = Path(tempfile.mkdtemp(prefix="arc_button_shop_bench_"))
+        self.keep_dir = keep_dir
+        self._old_cwd = os.getcwd()
+        # 插件使用相对路径 plugins/ARCButtonShop
+        os.chdir(self.workdir)
+        plugin_dir = self.workdir / "plugins" / "ARCButtonShop"
+        plugin_dir.mkdir(parents=True)
+        # 使用仓库中发布的语言文件，使表单文本与真实服务器一致
+        for language_file in (_ROOT / "dist" / "ARCButtonShop").glob("*.txt"):
+            shutil.copy(language_file, plugin_dir / language_file.name)
+        merged = dict(DEFAULT_SETTINGS)
+        merged.update(settings or {})
+        (plugin_dir / "core_setting.yml").write_text(
+            "\n".join(f"{key}={value}" for key, value in merged.items()), encoding="utf-8"
+        )
+        # 配置与语言为类变量，多次运行之间需清空
+        SettingManager.setting_dict.clear()
+        LanguageManager.language_dict.clear()
+
+        self.economy = Economy()
+        self.server = Server(self.economy)
+        self.logger = Logger(verbose)
+        self.plugin = ARCButtonShopPlugin()
+        self.plugin.server = self.server
+        self.plugin.logger = self.logger
+        self.plugin.on_load()
+        self.plugin.on_enable()
+        self.players: List[Player] = []
+        self.shops: List[Dict[str, Any]] = []
+
+    def close(self) -> None:
+        self.plugin.on_disable()
+        os.chdir(self._old_cwd)
+        if not self.keep_dir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def __enter__(self) -> "BenchWorld":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add_players(self, count: int, money: int = 10 ** 9) -> List[Player]:
+        for index in range(count):
+            player = Player(f"player_{len(self.players)}", is_op=(len(self.players) == 0))
+            self.players.append(player)
+            self.server.online_players.append(player)
+            self.economy.balances[player.name] = money
+        return self.players
+
+    def seed_shops(self, count: int, area: int = 2048, buy_ratio: float = 0.3, enchant_ratio: float = 0.1,
+                   stock: int = 10 ** 6, seed: int = 1) -> List[Dict[str, Any]]:
+        """
+        直接写入 count 个商店（一次事务），店主在已有玩家中随机选择
+        :param area: 商店分布的正方形边长（方块）
+        """
+        if not self.players:
+            self.add_players(16)
+        rng = random.Random(seed)
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        used = set()
+        rows = []
+        while len(rows) < count:
+            x = rng.randrange(-area // 2, area // 2)
+            z = rng.randrange(-area // 2, area // 2)
+            y = rng.randrange(60, 80)
+            if (x, y, z) in used:
+                continue
+            used.add((x, y, z))
+            owner = rng.choice(self.players)
+            item_type = rng.choice(ITEM_TYPES)
+            enchanted = rng.random() < enchant_ratio
+            item = {
+                "type": item_type,
+                "name": item_type.split(":", 1)[1],
+                "count": 1,
+                "data": 0,
+                "enchants": {"minecraft:unbreaking": 3} if enchanted else {},
+                "lore": [],
+            }
+            if enchanted and rng.random() < 0.5:
+                # 一半附魔物品带完整 NBT（如附魔书），走 nbt_b64 比对路径
+                tag = CompoundTag({"ench": [{"id": 17, "lvl": 3}]})
+                item["nbt_b64"] = base64.b64encode(tag.dump()).decode("ascii")
+            shop_type = "buy" if rng.random() < buy_ratio else "sell"
+            rows.append((
+                str(uuid.UUID(int=rng.getrandbits(128))), str(owner.unique_id), owner.name, shop_type,
+                x, y, z, OVERWORLD.name, x // CHUNK_SIZE, z // CHUNK_SIZE, item_type, json.dumps(item),
+                stock, rng.randint(1, 100), stock, "[]", now,
+            ))
+        with self.plugin.db_manager.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO button_shops (shop_uuid, owner_xuid, owner_name, shop_type, x, y, z, dimension, "
+                "chunk_x, chunk_z, item_type, item_data, quantity, unit_price, stock, collected_items, create_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        # 直接写库绕过了插件的同步逻辑，需重新读取含商店的区块与坐标索引
+        if self.plugin.shop_cache is not None:
+            self.plugin.shop_cache.load_shop_chunks()
+        if self.plugin.position_index is not None:
+            self.plugin.position_index.rebuild()
+        self.shops = self.plugin.db_manager.query_all("SELECT * FROM button_shops WHERE is_active = 1")
+        return self.shops
+
+    def load_all_shop_chunks(self) -> int:
+        """模拟含商店的区块全部已加载（触发 ChunkLoadEvent）"""
+        chunks = {(shop["chunk_x"], shop["chunk_z"]) for shop in self.shops}
+        for chunk_x, chunk_z in chunks:
+            self.plugin.on_chunk_load(ChunkLoadEvent(Chunk(chunk_x, chunk_z, OVERWORLD)))
+        return len(chunks)
+
+    @staticmethod
+    def button_at(shop: Dict[str, Any]) -> Block:
+        return Block("minecraft:stone_button", shop["x"], shop["y"], shop["z"], OVERWORLD)
+
+    def clear_inventory(self, player: Player) -> None:
+        """清空玩家背包；直接修改背包不会触发事件，需让插件的背包快照失效"""
+        player.inventory.clear()
+        self.plugin.inventory_manager.invalidate_inventory(player.name)
+
+    def give_stack(self, player: Player, item_data: Dict[str, Any], amount: int) -> None:
+        """按商店物品数据向玩家背包放入物品（用于收购与补货场景的准备）"""
+        remaining = amount
+        while remaining > 0:
+            stack = ItemStack(type=item_data["type"], amount=1, data=item_data.get("data", 0))
+            stack.amount = min(stack.max_stack_size, remaining)
+            if item_data.get("nbt_b64"):
+                stack.nbt = load(base64.b64decode(item_data["nbt_b64"]))[0]
+            elif item_data.get("enchants"):
+                meta = stack.item_meta
+                for enchant_id, level in item_data["enchants"].items():
+                    meta.add_enchant(enchant_id, level)
+                stack.set_item_meta(meta)
+            player.inventory.add_item(stack)
+            remaining -= stack.amount
+        self.plugin.inventory_manager.invalidate_inventory(player.name)
+
+    def drain_scheduler(self, ticks: int = 1) -> None:
+        for _ in range(ticks):
+            self.server.scheduler.tick()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+负载生成器：模拟大量在线玩家同时交易，按 tick（每秒 20 tick）驱动插件，
+统计每 tick 插件在主线程中的耗时、数据库增长与写锁等待。
+
+每个 tick 中，每名玩家以 --actions-per-second / 20 的概率执行一个动作，动作按 --mix 权重选择：
+  interact  点击商店按钮后关闭详情表单
+  purchase  点击出售商店按钮 -> 购买按钮 -> 提交数量
+  sale      点击收购商店按钮 -> 出售按钮 -> 提交数量（背包中事先放入物品）
+  restock   店主打开补货表单并提交
+  panel     打开主面板 / 我的商店 / 附近商店
+玩家准备工作（放入物品、移动位置）不计入插件耗时；调度器任务（包括异步执行器的主线程回调）计入所在 tick。
+
+用法（在仓库根目录）：
+    python -m benchmarks.loadgen --players 200 --shops 50000 --seconds 60
+    python -m benchmarks.loadgen --sync --realtime --mix interact=5,purchase=3,sale=2,restock=1,panel=2
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .harness import BenchWorld, Player
+from endstone.event import PlayerInteractEvent
+from endstone_arc_button_shop.PerformanceMonitor import LatencyHistogram
+
+TICKS_PER_SECOND = 20
+TICK_BUDGET_NS = 1_000_000_000 // TICKS_PER_SECOND
+
+DEFAULT_MIX = "interact=40,purchase=20,sale=15,restock=5,panel=20"
+
+# 动作：准备（不计时）后返回需要计时的函数；没有可执行的目标时返回 None
+Action = Callable[["LoadGenerator", Player], Optional[Callable[[], None]]]
+
+
+def _submit_quantity(player: Player, quantity: int) -> None:
+    player.last_form.on_submit(player, json.dumps([None, str(quantity)]))
+
+
+def action_interact(gen: "LoadGenerator", player: Player):
+    shop = gen.pick_shop(player)
+    event = PlayerInteractEvent(player, gen.world.button_at(shop))
+
+    def run():
+        gen.plugin.on_player_interact(event)
+        form = player.last_form
+        if event.is_cancelled and form is not None and form.on_close is not None:
+            form.on_close(player)
+
+    return run
+
+
+def _trade(gen: "LoadGenerator", player: Player, shop_type: str):
+    shop = gen.pick_shop(player, shop_type)
+    if shop is None:
+        return None
+    quantity = gen.rng.randint(1, 16)
+    gen.world.clear_inventory(player)
+    if shop_type == "buy":
+        gen.world.give_stack(player, json.loads(shop["item_data"]), quantity)
+    event = PlayerInteractEvent(player, gen.world.button_at(shop))
+
+    def run():
+        gen.plugin.on_player_interact(event)
+        detail = player.last_form
+        if not event.is_cancelled or detail is None or not getattr(detail, "buttons", None):
+            return
+        text, on_click = detail.buttons[0]
+        on_click(player)
+        if player.last_form is not detail and getattr(player.last_form, "on_submit", None):
+            _submit_quantity(player, quantity)
+            gen.trades += 1
+
+    return run
+
+
+def action_purchase(gen: "LoadGenerator", player: Player):
+    return _trade(gen, player, "sell")
+
+
+def action_sale(gen: "LoadGenerator", player: Player):
+    return _trade(gen, player, "buy")
+
+
+def action_restock(gen: "LoadGenerator", player: Player):
+    own_shops = gen.sell_shops_by_owner.get(player.name)
+    if not own_shops:
+        return None
+    shop = gen.rng.choice(own_shops)
+    quantity = gen.rng.randint(1, 64)
+    gen.world.clear_inventory(player)
+    gen.world.give_stack(player, json.loads(shop["item_data"]), quantity)
+
+    def run():
+        gen.plugin._show_restock_panel(player, shop)
+        _submit_quantity(player, quantity)
+
+    return run
+
+
+def action_panel(gen: "LoadGenerator", player: Player):
+    roll = gen.rng.random()
+    if roll < 0.4:
+        return lambda: gen.plugin._show_shop_main_panel(player)
+    if roll < 0.7:
+        return lambda: gen.plugin._show_my_shops_panel(player)
+    shop = gen.rng.choice(gen.world.shops)
+    player.location.x = shop["x"]
+    player.location.z = shop["z"]
+    return lambda: gen.plugin._show_nearby_shops_panel(player)
+
+
+ACTIONS: Dict[str, Action] = {
+    "interact": action_interact,
+    "purchase": action_purchase,
+    "sale": action_sale,
+    "restock": action_restock,
+    "panel": action_panel,
+}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise SystemExit(f"unknown action in --mix: {name} (choose from {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+    """按 tick 推进的负载模拟"""
+
+    def __init__(self, world: BenchWorld, mix: Dict[str, float], actions_per_second: float, seed: int):
+        self.world = world
+        self.plugin = world.plugin
+        self.rng = random.Random(seed)
+        self._action_names = list(mix)
+        self._action_weights = [mix[name] for name in self._action_names]
+        self._action_chance = actions_per_second / TICKS_PER_SECOND
+        self.shops_by_type: Dict[str, List[Dict[str, Any]]] = {"sell": [], "buy": []}
+        self.sell_shops_by_owner: Dict[str, List[Dict[str, Any]]] = {}
+        for shop in world.shops:
+            self.shops_by_type[shop["shop_type"]].append(shop)
+            if shop["shop_type"] == "sell":
+                self.sell_shops_by_owner.setdefault(shop["owner_name"], []).append(shop)
+        self.tick_histogram = LatencyHistogram()
+        self.action_histograms = {name: LatencyHistogram() for name in ACTIONS}
+        self.lock_histogram = LatencyHistogram()
+        self.ticks_over_budget = 0
+        self.trades = 0
+        self._probe: Optional[sqlite3.Connection] = None
+
+    def pick_shop(self, player: Player, shop_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """随机选择一个不属于该玩家的商店，并把玩家移动到商店旁"""
+        shops = self.shops_by_type[shop_type] if shop_type else self.world.shops
+        if not shops:
+            return None
+        for _ in range(8):
+            shop = self.rng.choice(shops)
+            if shop["owner_name"] != player.name:
+                break
+        player.location.x = shop["x"]
+        player.location.z = shop["z"]
+        return shop
+
+    def open_lock_probe(self, db_path: Path) -> None:
+        # 独立连接，模拟主线程写入前获取写锁的等待时间
+        self._probe = sqlite3.connect(str(db_path), timeout=5.0, isolation_level=None)
+
+    def close_lock_probe(self) -> None:
+        if self._probe is not None:
+            self._probe.close()
+            self._probe = None
+
+    def probe_lock_wait(self) -> None:
+        start = time.perf_counter_ns()
+        try:
+            self._probe.execute("BEGIN IMMEDIATE")
+            self._probe.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        self.lock_histogram.record(time.perf_counter_ns() - start)
+
+    def run_tick(self) -> int:
+        """执行一个 tick，返回插件耗时（纳秒）"""
+        rng = self.rng
+        plugin_ns = 0
+        for player in self.world.players:
+            if rng.random() >= self._action_chance:
+                continue
+            name = rng.choices(self._action_names, self._action_weights)[0]
+            run = ACTIONS[name](self, player)
+            if run is None:
+                continue
+            start = time.perf_counter_ns()
+            run()
+            elapsed = time.perf_counter_ns() - start
+            self.action_histograms[name].record(elapsed)
+            plugin_ns += elapsed
+        start = time.perf_counter_ns()
+        self.world.drain_scheduler()
+        plugin_ns += time.perf_counter_ns() - start
+        self.tick_histogram.record(plugin_ns)
+        if plugin_ns > TICK_BUDGET_NS:
+            self.ticks_over_budget += 1
+        return plugin_ns
+
+
+def _db_sizes(db_path: Path) -> Dict[str, int]:
+    sizes = {}
+    for suffix in ("", "-wal"):
+        path = Path(str(db_path) + suffix)
+        sizes["db" + suffix.replace("-", "_")] = path.stat().st_size if path.exists() else 0
+    return sizes
+
+
+def _table_counts(world: BenchWorld) -> Dict[str, int]:
+    db = world.plugin.db_manager
+    return {
+        table: db.query_one(f"SELECT COUNT(*) AS count FROM {table}")["count"]
+        for table in ("button_shops", "shop_transactions")
+    }
+
+
+def _fmt_summary(summary: Dict[str, float]) -> str:
+    return (
+        f"n={summary['count']:<7} avg={summary['avg_ms']:.3f} p50={summary['p50_ms']:.3f} "
+        f"p95={summary['p95_ms']:.3f} p99={summary['p99_ms']:.3f} max={summary['max_ms']:.3f} ms"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ARCButtonShop synthetic load generator")
+    parser.add_argument("--players", type=int, default=200, help="simulated online players")
+    parser.add_argument("--shops", type=int, default=50000, help="number of seeded shops")
+    parser.add_argument("--area", type=int, default=4096, help="side length of the square shops are spread over")
+    parser.add_argument("--buy-ratio", type=float, default=0.3, help="fraction of buy (收购) shops")
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated seconds to run")
+    parser.add_argument("--actions-per-second", type=float, default=0.5, help="actions per player per second")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"action weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--sync", action="store_true", help="disable the async database executor")
+    parser.add_argument("--realtime", action="store_true", help="sleep out the rest of each 50ms tick")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print plugin log output")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    json_path = os.path.abspath(args.json) if args.json else None
+    settings = {"db_async_enabled": "false" if args.sync else "true"}
+    with BenchWorld(settings, verbose=args.verbose) as world:
+        world.add_players(args.players)
+        start = time.perf_counter()
+        world.seed_shops(args.shops, area=args.area, buy_ratio=args.buy_ratio, seed=args.seed)
+        world.load_all_shop_chunks()
+        db_path = world.workdir / "plugins" / "ARCButtonShop" / "button_shop.db"
+        world.plugin.db_manager.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"seeded {args.shops} shops for {args.players} players ({time.perf_counter() - start:.2f}s)")
+        sizes_before = _db_sizes(db_path)
+        counts_before = _table_counts(world)
+
+        gen = LoadGenerator(world, mix, args.actions_per_second, args.seed)
+        gen.open_lock_probe(db_path)
+        ticks = int(args.seconds * TICKS_PER_SECOND)
+        wall_start = time.perf_counter()
+        for _ in range(ticks):
+            tick_start = time.perf_counter()
+            gen.run_tick()
+            gen.probe_lock_wait()
+            if args.realtime:
+                remaining = 1.0 / TICKS_PER_SECOND - (time.perf_counter() - tick_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+        wall = time.perf_counter() - wall_start
+        gen.close_lock_probe()
+        # 等待异步写入落盘后再统计数据库增长
+        world.plugin.db_executor.shutdown()
+        sizes_after = _db_sizes(db_path)
+        counts_after = _table_counts(world)
+        errors = world.logger.errors
+
+    results = {
+        "ticks": ticks,
+        "wall_seconds": wall,
+        "ticks_over_budget": gen.ticks_over_budget,
+        "trades": gen.trades,
+        "plugin_errors": errors,
+        "tick_ms": gen.tick_histogram.summary(),
+        "actions_ms": {name: h.summary() for name, h in gen.action_histograms.items() if h.count},
+        "lock_wait_ms": gen.lock_histogram.summary(),
+        "db_bytes_before": sizes_before,
+        "db_bytes_after": sizes_after,
+        "rows_before": counts_before,
+        "rows_after": counts_after,
+    }
+    print(f"{ticks} ticks simulated in {wall:.2f}s wall, {gen.trades} trades, {errors} plugin errors")
+    print(f"plugin time per tick: {_fmt_summary(results['tick_ms'])}")
+    print(f"ticks over 50ms budget: {gen.ticks_over_budget} ({gen.ticks_over_budget * 100.0 / max(1, ticks):.2f}%)")
+    for name, summary in results["actions_ms"].items():
+        print(f"  {name:<9} {_fmt_summary(summary)}")
+    print(f"write lock wait:      {_fmt_summary(results['lock_wait_ms'])}")
+    growth = sum(sizes_after.values()) - sum(sizes_before.values())
+    print(
+        f"db growth: {growth / 1024:.1f} KiB (db {sizes_before['db']} -> {sizes_after['db']}, "
+        f"wal {sizes_before['db_wal']} -> {sizes_after['db_wal']} bytes), "
+        f"transactions {counts_before['shop_transactions']} -> {counts_after['shop_transactions']}"
+    )
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
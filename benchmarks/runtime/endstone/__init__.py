@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准测试用的 Endstone 替身运行时：只实现插件实际用到的类与属性，行为尽量贴近真实 API
+（例如 Inventory.get_item 返回副本、ItemStack.item_meta 需 set_item_meta 才生效、add_item 返回未放下的物品）。
+仅供 benchmarks 使用，不随插件发布。
+"""
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from typing import Any
+
+
+class Block:
+    def __init__(self, block_type: str, x: int, y: int, z: int, dimension: Any):
+        self.type = block_type
+        self.x = x
+        self.y = y
+        self.z = z
+        self.dimension = dimension
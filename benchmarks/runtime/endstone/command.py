@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+
+class Command:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class CommandSender:
+    """命令发送者替身：收集发送的消息"""
+
+    def __init__(self, name: str = "CONSOLE", is_op: bool = True):
+        self.name = name
+        self.is_op = is_op
+        self.messages = []
+
+    def send_message(self, message: str) -> None:
+        self.messages.append(message)
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+
+class Enchantment:
+    AQUA_AFFINITY = "minecraft:aqua_affinity"
+    EFFICIENCY = "minecraft:efficiency"
+    FORTUNE = "minecraft:fortune"
+    MENDING = "minecraft:mending"
+    PROTECTION = "minecraft:protection"
+    SHARPNESS = "minecraft:sharpness"
+    SILK_TOUCH = "minecraft:silk_touch"
+    UNBREAKING = "minecraft:unbreaking"
+
+
+# Bedrock 物品 NBT 中 ench 列表使用的数字 id
+NUMERIC_IDS = {
+    Enchantment.PROTECTION: 0,
+    Enchantment.AQUA_AFFINITY: 8,
+    Enchantment.SHARPNESS: 9,
+    Enchantment.EFFICIENCY: 15,
+    Enchantment.SILK_TOUCH: 16,
+    Enchantment.UNBREAKING: 17,
+    Enchantment.FORTUNE: 18,
+    Enchantment.MENDING: 26,
+}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from typing import Any
+
+
+def event_handler(func=None, **_options):
+    """支持 @event_handler 与 @event_handler(priority=...) 两种写法"""
+    if func is None:
+        return lambda f: f
+    return func
+
+
+class Event:
+    def __init__(self):
+        self.is_cancelled = False
+
+
+class PlayerInteractEvent(Event):
+    def __init__(self, player: Any, block: Any):
+        super().__init__()
+        self.player = player
+        self.block = block
+
+
+class BlockBreakEvent(Event):
+    def __init__(self, player: Any, block: Any):
+        super().__init__()
+        self.player = player
+        self.block = block
+
+
+class ChunkLoadEvent(Event):
+    def __init__(self, chunk: Any):
+        super().__init__()
+        self.chunk = chunk
+
+
+class ChunkUnloadEvent(Event):
+    def __init__(self, chunk: Any):
+        super().__init__()
+        self.chunk = chunk
+
+
+class PlayerQuitEvent(Event):
+    def __init__(self, player: Any):
+        super().__init__()
+        self.player = player
+
+
+class PlayerDropItemEvent(Event):
+    def __init__(self, player: Any, item: Any):
+        super().__init__()
+        self.player = player
+        self.item = item
+
+
+class PlayerPickupItemEvent(Event):
+    def __init__(self, player: Any, item: Any):
+        super().__init__()
+        self.player = player
+        self.item = item
+
+
+class PlayerItemConsumeEvent(Event):
+    def __init__(self, player: Any, item: Any):
+        super().__init__()
+        self.player = player
+        self.item = item
+
+
+class PlayerDeathEvent(Event):
+    def __init__(self, player: Any):
+        super().__init__()
+        self.player = player
+        self.actor = player
+
+
+class BlockPlaceEvent(Event):
+    def __init__(self, player: Any, block: Any):
+        super().__init__()
+        self.player = player
+        self.block = block
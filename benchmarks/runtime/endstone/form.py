@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""表单替身：只保存参数，由基准测试读取按钮回调或调用 on_submit 模拟玩家操作"""
+from typing import Any, Callable, List, Optional
+
+
+class Label:
+    def __init__(self, text: str = ""):
+        self.text = text
+
+
+class TextInput:
+    def __init__(self, label: str = "", placeholder: str = "", default_value: str = ""):
+        self.label = label
+        self.placeholder = placeholder
+        self.default_value = default_value
+
+
+class ActionForm:
+    def __init__(self, title: str = "", content: str = "", on_close: Optional[Callable] = None,
+                 on_submit: Optional[Callable] = None):
+        self.title = title
+        self.content = content
+        self.on_close = on_close
+        self.on_submit = on_submit
+        self.buttons: List[Any] = []
+
+    def add_button(self, text: str, icon: Optional[str] = None, on_click: Optional[Callable] = None) -> "ActionForm":
+        self.buttons.append((text, on_click))
+        return self
+
+
+class ModalForm:
+    def __init__(self, title: str = "", controls: Optional[list] = None, on_close: Optional[Callable] = None,
+                 on_submit: Optional[Callable] = None, submit_button: Optional[str] = None):
+        self.title = title
+        self.controls = list(controls or [])
+        self.on_close = on_close
+        self.on_submit = on_submit
+        self.submit_button = submit_button
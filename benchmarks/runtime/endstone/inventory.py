@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""物品与背包替身"""
+import copy
+from typing import Dict, List, Optional
+
+from .enchantments import NUMERIC_IDS
+from .nbt import CompoundTag
+
+_ENCHANT_NAMES = {numeric_id: name for name, numeric_id in NUMERIC_IDS.items()}
+
+MAX_STACK_SIZE = 64
+
+# 部分物品的真实最大堆叠数（其余按 64）
+_MAX_STACK_SIZES: Dict[str, int] = {
+    "minecraft:ender_pearl": 16,
+    "minecraft:snowball": 16,
+    "minecraft:egg": 16,
+    "minecraft:enchanted_book": 1,
+    "minecraft:diamond_sword": 1,
+    "minecraft:diamond_pickaxe": 1,
+}
+
+
+class ItemType:
+    def __init__(self, type_id: str):
+        self.id = type_id
+        self.translation_key = "item." + type_id.split(":", 1)[-1] + ".name"
+
+
+class ItemMeta:
+    def __init__(self):
+        self._enchants: Dict[str, int] = {}
+        self.lore: List[str] = []
+        self.display_name: Optional[str] = None
+
+    @property
+    def has_enchants(self) -> bool:
+        return bool(self._enchants)
+
+    @property
+    def has_lore(self) -> bool:
+        return bool(self.lore)
+
+    @property
+    def has_display_name(self) -> bool:
+        return self.display_name is not None
+
+    def get_enchant_level(self, enchant_id: str) -> int:
+        return self._enchants.get(enchant_id, 0)
+
+    def add_enchant(self, enchant_id: str, level: int, force: bool = False) -> bool:
+        self._enchants[enchant_id] = level
+        return True
+
+
+class ItemStack:
+    """物品用户数据只保存在 NBT 中（ench 列表、display.Lore/Name），item_meta 由 NBT 生成，与原生物品一致"""
+
+    def __init__(self, type: str = "minecraft:air", amount: int = 1, data: int = 0):
+        self.type = ItemType(type)
+        self.amount = amount
+        self.data = data
+        self._nbt = CompoundTag()
+
+    @property
+    def nbt(self) -> CompoundTag:
+        return copy.deepcopy(self._nbt)
+
+    @nbt.setter
+    def nbt(self, tag: CompoundTag) -> None:
+        self._nbt = CompoundTag(copy.deepcopy(dict(tag)))
+
+    @property
+    def item_meta(self) -> ItemMeta:
+        # 与真实 API 一致：返回副本，修改后需 set_item_meta
+        meta = ItemMeta()
+        for entry in self._nbt.get("ench", []):
+            meta._enchants[_ENCHANT_NAMES.get(entry["id"], entry["id"])] = entry["lvl"]
+        display = self._nbt.get("display", {})
+        meta.lore = list(display.get("Lore", []))
+        meta.display_name = display.get("Name")
+        return meta
+
+    def set_item_meta(self, meta: ItemMeta) -> bool:
+        self._nbt.pop("ench", None)
+        self._nbt.pop("display", None)
+        if meta._enchants:
+            self._nbt["ench"] = [
+                {"id": NUMERIC_IDS.get(enchant_id, enchant_id), "lvl": level}
+                for enchant_id, level in meta._enchants.items()
+            ]
+        display = {}
+        if meta.lore:
+            display["Lore"] = list(meta.lore)
+        if meta.display_name is not None:
+            display["Name"] = meta.display_name
+        if display:
+            self._nbt["display"] = display
+        return True
+
+    @property
+    def max_stack_size(self) -> int:
+        return _MAX_STACK_SIZES.get(self.type.id, MAX_STACK_SIZE)
+
+    def is_similar(self, other: "ItemStack") -> bool:
+        return (
+            other is not None
+            and self.type.id == other.type.id
+            and self.data == other.data
+            and self._nbt == other._nbt
+        )
+
+    def copy(self) -> "ItemStack":
+        return copy.deepcopy(self)
+
+
+class Inventory:
+    def __init__(self, size: int = 36):
+        self.size = size
+        self._slots: List[Optional[ItemStack]] = [None] * size
+
+    def get_item(self, index: int) -> Optional[ItemStack]:
+        item = self._slots[index]
+        return item.copy() if item is not None else None
+
+    def set_item(self, index: int, item: Optional[ItemStack]) -> None:
+        self._slots[index] = item.copy() if item is not None and item.amount > 0 else None
+
+    def add_item(self, *items: ItemStack) -> Dict[int, ItemStack]:
+        """放入物品（先叠加到相同物品，再放入空格），返回 {参数序号: 未放下的物品}"""
+        leftovers: Dict[int, ItemStack] = {}
+        for index, item in enumerate(items):
+            remaining = item.amount
+            max_stack = item.max_stack_size
+            for slot, existing in enumerate(self._slots):
+                if remaining <= 0:
+                    break
+                if existing is not None and existing.is_similar(item) and existing.amount < max_stack:
+                    moved = min(remaining, max_stack - existing.amount)
+                    existing.amount += moved
+                    remaining -= moved
+            for slot, existing in enumerate(self._slots):
+                if remaining <= 0:
+                    break
+                if existing is None:
+                    placed = item.copy()
+                    placed.amount = min(remaining, max_stack)
+                    self._slots[slot] = placed
+                    remaining -= placed.amount
+            if remaining > 0:
+                leftover = item.copy()
+                leftover.amount = remaining
+                leftovers[index] = leftover
+        return leftovers
+
+    def clear(self) -> None:
+        self._slots = [None] * self.size
+
+
+class PlayerInventory(Inventory):
+    pass
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""NBT 替身：CompoundTag 为 dict，序列化使用稳定排序的 JSON 字节（代替 Bedrock little-endian 二进制）"""
+import json
+from typing import Tuple
+
+
+class CompoundTag(dict):
+    def dump(self, byte_order: str = "little") -> bytes:
+        if not self:
+            return b""
+        return json.dumps(self, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+
+def load(raw: bytes, byte_order: str = "little") -> Tuple[CompoundTag, str]:
+    return CompoundTag(json.loads(raw.decode("utf-8"))), ""
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+异步数据库执行器：写操作在单独的写线程中按提交顺序执行，读操作分配给读线程池，
+结果通过服务器调度器在主线程中回调，事件处理与表单回调不再因数据库访问阻塞 tick。
+每个工作线程使用 DatabaseManager 的线程本地连接（WAL 模式下读写互不阻塞）。
+"""
+import queue
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+# 工作函数接收 DatabaseManager，返回值交给主线程回调
+DbWork = Callable[[Any], Any]
+ResultCallback = Callable[[Any], None]
+ErrorCallback = Callable[[BaseException], None]
+
+_STOP = object()
+
+
+class DatabaseExecutor:
+    """
+    数据库执行器。
+    依赖插件实例以使用 _safe_log、db_manager 与 server.scheduler。
+    未启动（或已关闭）时 submit_read/submit_write 在调用线程中同步执行并立即回调。
+    """
+
+    def __init__(self, plugin: Any, reader_threads: int = 2):
+        """
+        :param plugin: 插件实例
+        :param reader_threads: 读线程数量
+        """
+        self._plugin = plugin
+        self._reader_count = max(1, reader_threads)
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._read_queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        # 已完成待回调的操作 (回调, 错误回调, Future)；由主线程的周期任务取出
+        self._results: Deque[Tuple[Optional[ResultCallback], Optional[ErrorCallback], Future]] = deque()
+        self._pump_task = None
+        self._running = False
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        """启动写线程、读线程与主线程回调任务（需在 on_enable 之后调用，调度器才可用）"""
+        if self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, args=(self._write_queue,), name="ARCButtonShop-DBWriter", daemon=True)
+        ]
+        for index in range(self._reader_count):
+            self._threads.append(
+                threading.Thread(target=self._worker, args=(self._read_queue,), name=f"ARCButtonShop-DBReader-{index}", daemon=True)
+            )
+        for thread in self._threads:
+            thread.start()
+        self._pump_task = self._plugin.server.scheduler.run_task(self._plugin, self._pump, delay=1, period=1)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """停止工作线程：已提交的写操作会先执行完；之后不再回调"""
+        if not self._running:
+            return
+        self._running = False
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            self._pump_task = None
+        self._write_queue.put(_STOP)
+        for _ in range(self._reader_count):
+            self._read_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._results.clear()
+
+    def submit_read(self, work: DbWork, callback: Optional[ResultCallback] = None,
+                    error_callback: Optional[ErrorCallback] = None) -> Future:
+        """
+        提交只读数据库操作（可能与其他读操作并发执行）
+        :param work: 在工作线程中执行的函数，参数为 DatabaseManager
+        :param callback: 主线程中接收返回值的回调
+        :param error_callback: 主线程中接收异常的回调（为 None 时只记录日志）
+        :return: Future（仅用于在非主线程中等待结果，主线程中不要阻塞等待）
+        """
+        return self._submit(self._read_queue, work, callback, error_callback)
+
+    def submit_write(self, work: DbWork, callback: Optional[ResultCallback] = None,
+                     error_callback: Optional[ErrorCallback] = None) -> Future:
+        """
+        提交写数据库操作（在写线程中按提交顺序逐个执行）
+        参数同 submit_read
+        """
+        return self._submit(self._write_queue, work, callback, error_callback)
+
+    def _submit(self, work_queue: "queue.Queue", work: DbWork, callback: Optional[ResultCallback],
+                error_callback: Optional[ErrorCallback]) -> Future:
+        future: Future = Future()
+        if not self._running:
+            self._run(work, future)
+            self._deliver(callback, error_callback, future)
+            return future
+        work_queue.put((work, future, callback, error_callback))
+        return future
+
+    def _run(self, work: DbWork, future: Future) -> None:
+        try:
+            future.set_result(work(self._plugin.db_manager))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _worker(self, work_queue: "queue.Queue") -> None:
+        """工作线程：依次执行队列中的操作，结果放入待回调队列"""
+        try:
+            while True:
+                item = work_queue.get()
+                if item is _STOP:
+                    break
+                work, future, callback, error_callback = item
+                self._run(work, future)
+                if callback is not None or error_callback is not None or future.exception() is not None:
+                    self._results.append((callback, error_callback, future))
+        finally:
+            # 关闭本线程的数据库连接
+            self._plugin.db_manager.close()
+
+    def _pump(self) -> None:
+        """主线程周期任务：执行已完成操作的回调"""
+        results = self._results
+        while results:
+            callback, error_callback, future = results.popleft()
+            self._deliver(callback, error_callback, future)
+
+    def _deliver(self, callback: Optional[ResultCallback], error_callback: Optional[ErrorCallback],
+                 future: Future) -> None:
+        error = future.exception()
+        try:
+            if error is not None:
+                if error_callback is not None:
+                    error_callback(error)
+                else:
+                    self._log(
+                        "error",
+                        "[ARCButtonShop] Async database work error: "
+                        + "".join(traceback.format_exception(type(error), error, error.__traceback__)),
+                    )
+            elif callback is not None:
+                callback(future.result())
+        except Exception as e:
+            self._log("error", f"[ARCButtonShop] Async database callback error: {str(e)}\n{traceback.format_exc()}")
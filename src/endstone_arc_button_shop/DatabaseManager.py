@@ -1,19 +1,154 @@
+import keyword
+import logging
+import logging.handlers
 import sqlite3
-from typing import Any, List, Dict, Optional, Union
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple, Union
 import threading
 from pathlib import Path
 
 
+class Record:
+    """
+    轻量只读行对象：每组列名对应一个带 __slots__ 的子类，只保存查询选出的列。
+    支持 row['col']、row.col、row.get('col')、row.keys() 与 to_dict()，可替代 dict 传给只读取字段的代码。
+    非法、重复或与 get/keys/to_dict 等属性冲突的列名由 record_type 改为 col_<序号>。
+    """
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __init__(self, values):
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Record is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self._fields else default
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __repr__(self) -> str:
+        return f"Record({self.to_dict()!r})"
+
+
+_record_types: Dict[Tuple[str, ...], type] = {}
+
+
+def _safe_field_names(fields: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    把列名规范为可用作 __slots__ 的字段名：
+    未加别名的表达式（如 COUNT(*)）、关键字、下划线开头、与 Record 属性重名或重复的列名改为 col_<序号>
+    """
+    result = []
+    seen = set()
+    for index, name in enumerate(fields):
+        if (not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_")
+                or hasattr(Record, name) or name in seen):
+            name = f"col_{index}"
+            while name in seen or name in fields:
+                name += "_"
+        seen.add(name)
+        result.append(name)
+    return tuple(result)
+
+
+def record_type(fields: Tuple[str, ...]) -> type:
+    """返回（并缓存）给定列名的 Record 子类；不能直接作为字段名的列名会被替换为 col_<序号>"""
+    cls = _record_types.get(fields)
+    if cls is None:
+        names = _safe_field_names(fields)
+        cls = _record_types[fields] = type("Record", (Record,), {"__slots__": names, "_fields": names})
+    return cls
+
+
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, log_func: Optional[Callable[[str, str], None]] = None):
         """
         初始化数据库管理器
         :param db_path: 数据库文件路径
+        :param log_func: 日志函数 (level, message)，通常为插件的 _safe_log；为 None 时使用 print
         """
         self.db_path = db_path
         self._local = threading.local()  # 线程本地存储
+        self._log_func = log_func
+        self._slow_query_logger: Optional[logging.Logger] = None  # 慢查询日志（未启用时为 None）
+        self._slow_query_threshold = 0.0  # 慢查询阈值（秒）
+        self._statements: Dict[str, str] = {}  # 命名语句：名称 -> SQL
+        self._helper_sql: Dict[tuple, str] = {}  # insert/update/delete 生成的 SQL 缓存
         self._ensure_db_exists()
 
+    def _log(self, level: str, message: str) -> None:
+        if self._log_func is not None:
+            self._log_func(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    def enable_slow_query_log(self, threshold_ms: float, log_path: str,
+                              max_bytes: int = 1024 * 1024, backup_count: int = 3) -> None:
+        """
+        启用慢查询日志：耗时超过阈值的语句记录 SQL、参数类型、耗时、行数与 EXPLAIN QUERY PLAN
+        :param threshold_ms: 阈值（毫秒）
+        :param log_path: 日志文件路径（按大小轮转）
+        :param max_bytes: 单个日志文件最大字节数
+        :param backup_count: 保留的轮转文件数量
+        """
+        log_file = Path(log_path)
+        if not log_file.parent.exists():
+            log_file.parent.mkdir(parents=True)
+        logger = logging.getLogger(f"arc_button_shop.slow_query.{log_file.resolve()}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        self._slow_query_threshold = threshold_ms / 1000.0
+        self._slow_query_logger = logger
+
+    def disable_slow_query_log(self) -> None:
+        """关闭慢查询日志"""
+        self._slow_query_logger = None
+
+    def _check_slow_query(self, sql: str, params: tuple, start: float, row_count: int) -> None:
+        """语句耗时超过阈值时写入慢查询日志"""
+        elapsed = time.perf_counter() - start
+        if elapsed < self._slow_query_threshold:
+            return
+        logger = self._slow_query_logger
+        if logger is None:
+            return
+        param_shape = "(" + ", ".join(type(p).__name__ for p in params) + ")"
+        plan = ""
+        if not sql.lstrip().upper().startswith(("PRAGMA", "CREATE", "ALTER", "DROP", "VACUUM", "ATTACH")):
+            try:
+                plan_rows = self.connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plan = " | ".join(str(row[3]) for row in plan_rows)
+            except Exception as e:
+                plan = f"<explain failed: {e}>"
+        sql_text = " ".join(sql.split())
+        logger.info(
+            f"{elapsed * 1000:.2f}ms rows={row_count} params={param_shape} sql={sql_text} plan={plan}"
+        )
+        self._log('warning', f"[ARCButtonShop] Slow query {elapsed * 1000:.2f}ms: {sql_text[:120]}")
+
     def _ensure_db_exists(self):
         """确保数据库文件存在"""
         db_file = Path(self.db_path)
@@ -24,17 +159,103 @@ class DatabaseManager:
     def connection(self) -> sqlite3.Connection:
         """获取当前线程的数据库连接"""
         if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(self.db_path)
+            # 语句缓存需容纳全部命名语句，外加 insert/update/delete 与零散查询
+            cached_statements = max(128, len(self._statements) + 64)
+            self._local.connection = sqlite3.connect(self.db_path, cached_statements=cached_statements)
+            self._local.cursors = {}
             # 设置行工厂为字典类型
             self._local.connection.row_factory = sqlite3.Row
+            # 新建数据库使用增量 auto_vacuum（必须在切换 WAL 之前设置；对已有数据库无效，见 /shopmanage vacuum）
+            self._local.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL 模式：其他线程的长时间读取（如导出）不会阻塞主线程写入
+            self._local.connection.execute("PRAGMA journal_mode=WAL")
         return self._local.connection
 
     def close(self):
         """关闭当前线程的数据库连接"""
         if hasattr(self._local, 'connection'):
+            for cursor in self._local.cursors.values():
+                cursor.close()
+            self._local.cursors = {}
             self._local.connection.close()
             delattr(self._local, 'connection')
 
+    def register_statements(self, statements: Dict[str, str]) -> None:
+        """
+        登记命名语句（应在首次访问数据库之前调用，以便按语句数量设置连接的语句缓存大小）
+        :param statements: 名称 -> SQL
+        """
+        self._statements.update(statements)
+
+    def _named_cursor(self, name: str) -> sqlite3.Cursor:
+        """获取当前线程中该命名语句专用的游标（复用，避免每次创建）"""
+        connection = self.connection
+        cursor = self._local.cursors.get(name)
+        if cursor is None:
+            cursor = self._local.cursors[name] = connection.cursor()
+        return cursor
+
+    def execute_named(self, name: str, params: tuple = ()) -> int:
+        """
+        执行命名写语句并提交
+        :param name: 语句名称
+        :param params: SQL参数
+        :return: 受影响行数，失败返回 -1
+        """
+        sql = self._statements[name]
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
+        try:
+            cursor = self._named_cursor(name)
+            cursor.execute(sql, params)
+            self.connection.commit()
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, cursor.rowcount)
+            return cursor.rowcount
+        except Exception as e:
+            self._log('error', f"[ARCButtonShop] Execute statement {name} error: {str(e)}")
+            self.connection.rollback()
+            return -1
+
+    def query_one_named(self, name: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+        """
+        以命名语句查询单条记录
+        :param name: 语句名称
+        :param params: SQL参数
+        :return: 查询结果字典或None
+        """
+        sql = self._statements[name]
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
+        try:
+            cursor = self._named_cursor(name)
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, 1 if row else 0)
+            return dict(row) if row else None
+        except Exception as e:
+            self._log('error', f"[ARCButtonShop] Query statement {name} error: {str(e)}")
+            return None
+
+    def query_all_named(self, name: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """
+        以命名语句查询多条记录
+        :param name: 语句名称
+        :param params: SQL参数
+        :return: 查询结果列表
+        """
+        sql = self._statements[name]
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
+        try:
+            cursor = self._named_cursor(name)
+            cursor.execute(sql, params)
+            rows = [dict(row) for row in cursor.fetchall()]
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, len(rows))
+            return rows
+        except Exception as e:
+            self._log('error', f"[ARCButtonShop] Query statement {name} error: {str(e)}")
+            return []
+
     def execute(self, sql: str, params: tuple = ()) -> bool:
         """
         执行SQL语句
@@ -42,15 +263,44 @@ class DatabaseManager:
         :param params: SQL参数
         :return: 是否执行成功
         """
+        return self.execute_count(sql, params) >= 0
+
+    def execute_count(self, sql: str, params: tuple = ()) -> int:
+        """
+        执行SQL语句并返回受影响行数（用于条件更新/比较并交换）
+        :param sql: SQL语句
+        :param params: SQL参数
+        :return: 受影响行数（非 DML 语句为 0），失败返回 -1
+        """
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
         try:
             cursor = self.connection.cursor()
             cursor.execute(sql, params)
             self.connection.commit()
-            return True
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, cursor.rowcount)
+            return max(0, cursor.rowcount)
         except Exception as e:
-            print(f"Execute SQL error: {str(e)}")
+            self._log('error', f"[ARCButtonShop] Execute SQL error: {str(e)} | SQL: {sql}")
             self.connection.rollback()
-            return False
+            return -1
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        在同一事务中执行多条语句：正常退出时提交，出现异常时回滚并继续抛出
+        :return: 当前线程连接上的游标
+        """
+        connection = self.connection
+        cursor = connection.cursor()
+        try:
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
 
     def query_one(self, sql: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
         """
@@ -59,13 +309,16 @@ class DatabaseManager:
         :param params: SQL参数
         :return: 查询结果字典或None
         """
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
         try:
             cursor = self.connection.cursor()
             cursor.execute(sql, params)
             row = cursor.fetchone()
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, 1 if row else 0)
             return dict(row) if row else None
         except Exception as e:
-            print(f"Query one error: {str(e)}")
+            self._log('error', f"[ARCButtonShop] Query one error: {str(e)} | SQL: {sql}")
             return None
 
     def query_all(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
@@ -75,14 +328,64 @@ class DatabaseManager:
         :param params: SQL参数
         :return: 查询结果列表
         """
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
         try:
             cursor = self.connection.cursor()
             cursor.execute(sql, params)
-            return [dict(row) for row in cursor.fetchall()]
+            rows = [dict(row) for row in cursor.fetchall()]
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, len(rows))
+            return rows
         except Exception as e:
-            print(f"Query all error: {str(e)}")
+            self._log('error', f"[ARCButtonShop] Query all error: {str(e)} | SQL: {sql}")
             return []
 
+    def query_page(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """
+        读取一页记录后立即关闭游标，读事务只持续这一页（用于导出等按主键分页的大结果集）
+        与 query_all 不同，出错时直接抛出异常，由调用方处理
+        :param sql: 带 LIMIT 的分页 SQL 语句
+        :param params: SQL参数
+        :return: 本页记录列表
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def iter_query(self, sql: str, params: tuple = (), chunk_size: int = 200) -> Iterator[Record]:
+        """
+        逐批读取记录并生成只含所选列的 Record（不复制为 dict，也不一次性构建列表）
+        出错时记录日志并重新抛出（不把失败伪装成空结果）；调用方应只 SELECT 需要的列
+        :param sql: SQL语句
+        :param params: SQL参数
+        :param chunk_size: 每次 fetchmany 的行数
+        :return: Record 迭代器
+        """
+        start = time.perf_counter() if self._slow_query_logger is not None else 0.0
+        cursor = self.connection.cursor()
+        cursor.row_factory = None  # 直接取元组，避免先构建 sqlite3.Row
+        row_count = 0
+        try:
+            cursor.execute(sql, params)
+            cls = record_type(tuple(column[0] for column in cursor.description))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                for row in rows:
+                    yield cls(row)
+            if self._slow_query_logger is not None:
+                self._check_slow_query(sql, params, start, row_count)
+        except Exception as e:
+            self._log('error', f"[ARCButtonShop] Iter query error: {str(e)} | SQL: {sql}")
+            raise
+        finally:
+            cursor.close()
+
     def insert(self, table: str, data: Dict[str, Any]) -> bool:
         """
         插入数据
@@ -90,9 +393,12 @@ class DatabaseManager:
         :param data: 要插入的数据字典
         :return: 是否插入成功
         """
-        fields = ','.join(data.keys())
-        placeholders = ','.join(['?' for _ in data])
-        sql = f"INSERT INTO {table} ({fields}) VALUES ({placeholders})"
+        key = ('insert', table, tuple(data))
+        sql = self._helper_sql.get(key)
+        if sql is None:
+            fields = ','.join(data.keys())
+            placeholders = ','.join(['?' for _ in data])
+            sql = self._helper_sql[key] = f"INSERT INTO {table} ({fields}) VALUES ({placeholders})"
         return self.execute(sql, tuple(data.values()))
 
     def update(self, table: str, data: Dict[str, Any], where: str, params: tuple = ()) -> bool:
@@ -104,8 +410,11 @@ class DatabaseManager:
         :param params: WHERE子句的参数
         :return: 是否更新成功
         """
-        set_clause = ','.join([f"{k}=?" for k in data.keys()])
-        sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
+        key = ('update', table, tuple(data), where)
+        sql = self._helper_sql.get(key)
+        if sql is None:
+            set_clause = ','.join([f"{k}=?" for k in data.keys()])
+            sql = self._helper_sql[key] = f"UPDATE {table} SET {set_clause} WHERE {where}"
         return self.execute(sql, tuple(data.values()) + params)
 
     def delete(self, table: str, where: str, params: tuple = ()) -> bool:
@@ -116,7 +425,10 @@ class DatabaseManager:
         :param params: WHERE子句的参数
         :return: 是否删除成功
         """
-        sql = f"DELETE FROM {table} WHERE {where}"
+        key = ('delete', table, where)
+        sql = self._helper_sql.get(key)
+        if sql is None:
+            sql = self._helper_sql[key] = f"DELETE FROM {table} WHERE {where}"
         return self.execute(sql, params)
 
     def create_table(self, table: str, fields: Dict[str, str]) -> bool:
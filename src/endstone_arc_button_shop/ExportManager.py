@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+离线分析导出：在工作线程中按主键分页（id > 上一页末尾 id）读取商店/交易记录，写入 gzip 压缩的 JSONL 或 CSV 文件。
+每页是独立的短读事务，导出期间不会一直占住 WAL 快照（检查点可正常推进）；
+内存占用与表大小无关；进度由主线程的周期任务读取并汇报给命令发送者。
+"""
+import csv
+import datetime
+import gzip
+import json
+import re
+import threading
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 导出类型 -> (表名, 导出列, 用于 since 过滤的时间列)
+EXPORT_TARGETS: Dict[str, Tuple[str, Tuple[str, ...], str]] = {
+    "shops": (
+        "button_shops",
+        (
+            "id", "shop_uuid", "owner_xuid", "owner_name", "shop_type", "x", "y", "z",
+            "dimension", "chunk_x", "chunk_z", "item_type", "item_data", "quantity",
+            "unit_price", "stock", "collected_items", "is_active", "create_time",
+            "last_purchase_time", "is_infinite",
+        ),
+        "create_time",
+    ),
+    "transactions": (
+        "shop_transactions",
+        (
+            "id", "shop_id", "buyer_xuid", "buyer_name", "quantity", "unit_price",
+            "total_price", "transaction_time",
+        ),
+        "transaction_time",
+    ),
+}
+
+EXPORT_FORMATS = ("jsonl", "csv")
+
+# 每页读取的记录数
+EXPORT_PAGE_SIZE = 1000
+
+_DAYS_AGO_PATTERN = re.compile(r"^(\d+)d$")
+
+
+def parse_since(value: Optional[str]) -> Optional[str]:
+    """
+    解析 since 参数：支持 YYYY-MM-DD、YYYY-MM-DD HH:MM:SS 或 Nd（N 天前）
+    :return: 与数据库一致的时间字符串；无法解析时抛出 ValueError
+    """
+    if not value:
+        return None
+    value = value.strip()
+    match = _DAYS_AGO_PATTERN.match(value)
+    if match:
+        since = datetime.datetime.now() - datetime.timedelta(days=int(match.group(1)))
+        return since.strftime("%Y-%m-%d %H:%M:%S")
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid since value: {value}")
+
+
+class ExportManager:
+    """
+    商店/交易数据导出任务，同一时间只运行一个导出。
+    依赖插件实例以使用 _safe_log、setting_manager、db_manager 与 server.scheduler。
+    """
+
+    PROGRESS_PERIOD_TICKS = 100
+
+    def __init__(self, plugin: Any, export_dir: str):
+        """
+        :param plugin: 插件实例
+        :param export_dir: 导出文件目录
+        """
+        self._plugin = plugin
+        self._export_dir = Path(export_dir)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._progress: Dict[str, Any] = {}
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_progress(self) -> Dict[str, Any]:
+        """返回当前（或最近一次）导出的进度快照"""
+        with self._lock:
+            return dict(self._progress)
+
+    def start_export(
+        self,
+        target: str,
+        since: Optional[str] = None,
+        report: Optional[Callable[[str], None]] = None,
+    ) -> Path:
+        """
+        启动后台导出
+        :param target: shops 或 transactions
+        :param since: 起始时间（见 parse_since）
+        :param report: 在主线程中接收进度/结果消息的回调
+        :return: 导出文件路径
+        """
+        if target not in EXPORT_TARGETS:
+            raise ValueError(f"Unknown export target: {target}")
+        if self.is_running:
+            raise RuntimeError("An export is already running")
+        since_value = parse_since(since)
+        export_format = (self._plugin.setting_manager.GetSetting("export_format") or "jsonl").lower()
+        if export_format not in EXPORT_FORMATS:
+            export_format = "jsonl"
+        if not self._export_dir.exists():
+            self._export_dir.mkdir(parents=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = self._export_dir / f"{target}_{timestamp}.{export_format}.gz"
+
+        with self._lock:
+            self._progress = {
+                "target": target,
+                "path": str(output_path),
+                "rows": 0,
+                "total": None,
+                "done": False,
+                "error": None,
+            }
+        self._thread = threading.Thread(
+            target=self._export_worker,
+            args=(target, since_value, export_format, output_path),
+            name="ARCButtonShop-Export",
+            daemon=True,
+        )
+        self._thread.start()
+        if report is not None:
+            self._start_progress_reporter(report)
+        return output_path
+
+    def _start_progress_reporter(self, report: Callable[[str], None]) -> None:
+        """主线程周期任务：汇报进度，导出结束后汇报结果并取消自身"""
+        state: Dict[str, Any] = {"task": None, "last_rows": -1}
+
+        def send(message: str) -> None:
+            # 发送者可能已下线，消息发送失败只记录日志，不影响周期任务的取消
+            try:
+                report(message)
+            except Exception as e:
+                self._log("warning", f"[ARCButtonShop] Export progress report error: {str(e)}")
+
+        def tick():
+            progress = self.get_progress()
+            if progress.get("done"):
+                if state["task"] is not None:
+                    state["task"].cancel()
+                if progress.get("error"):
+                    send(f"导出失败: {progress['error']}")
+                else:
+                    send(f"导出完成：{progress['rows']} 条记录 -> {progress['path']}")
+                return
+            if progress["rows"] != state["last_rows"]:
+                state["last_rows"] = progress["rows"]
+                total = progress.get("total")
+                if total:
+                    send(f"导出进度：{progress['rows']}/{total}（{progress['rows'] * 100 // total}%）")
+                else:
+                    send(f"导出进度：{progress['rows']} 条")
+
+        state["task"] = self._plugin.server.scheduler.run_task(
+            self._plugin, tick, delay=self.PROGRESS_PERIOD_TICKS, period=self.PROGRESS_PERIOD_TICKS
+        )
+
+    def _export_worker(self, target: str, since: Optional[str], export_format: str, output_path: Path) -> None:
+        """工作线程：逐批读取并写入压缩文件（使用本线程独立的数据库连接）"""
+        db = self._plugin.db_manager
+        table, columns, time_column = EXPORT_TARGETS[target]
+        where = f" WHERE {time_column} >= ?" if since else ""
+        params = (since,) if since else ()
+        page_filter = f"{time_column} >= ? AND " if since else ""
+        try:
+            count_row = db.query_one(f"SELECT COUNT(*) AS count FROM {table}{where}", params)
+            with self._lock:
+                self._progress["total"] = count_row["count"] if count_row else None
+
+            rows_written = 0
+            with gzip.open(output_path, "wt", encoding="utf-8", newline="") as output:
+                writer = None
+                if export_format == "csv":
+                    writer = csv.writer(output)
+                    writer.writerow(columns)
+                sql = (
+                    f"SELECT {', '.join(columns)} FROM {table} "
+                    f"WHERE {page_filter}id > ? ORDER BY id LIMIT {EXPORT_PAGE_SIZE}"
+                )
+                last_id = -1
+                while True:
+                    rows = db.query_page(sql, params + (last_id,))
+                    if not rows:
+                        break
+                    for row in rows:
+                        if writer is not None:
+                            writer.writerow(tuple(row))
+                        else:
+                            output.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                            output.write("\n")
+                    rows_written += len(rows)
+                    last_id = rows[-1]["id"]
+                    with self._lock:
+                        self._progress["rows"] = rows_written
+                    if len(rows) < EXPORT_PAGE_SIZE:
+                        break
+            with self._lock:
+                self._progress["rows"] = rows_written
+            self._log("info", f"[ARCButtonShop] Exported {rows_written} {target} rows to {output_path}")
+        except Exception as e:
+            self._log("error", f"[ARCButtonShop] Export {target} error: {str(e)}\n{traceback.format_exc()}")
+            with self._lock:
+                self._progress["error"] = str(e)
+        finally:
+            db.close()
+            with self._lock:
+                self._progress["done"] = True
@@ -3,15 +3,62 @@
 背包管理类：统一负责玩家背包的读取、匹配、移除与发放。
 复用附魔/洛尔等 Endstone API 的转换与比较逻辑，便于维护与扩展。
 Endstone ItemMeta.enchants 返回 dict[Enchantment, int]，键不可哈希会报错，
-故通过 get_enchant_level(id: str) 逐个查询已知附魔 id 获取等级。
+故优先一次遍历 ItemStack.nbt 中的 ench 列表读取附魔；NBT 不可用时再通过 get_enchant_level(id: str) 逐个查询已知附魔 id。
 """
 import base64
+import copy
+import hashlib
+import time
 import traceback
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 # Endstone 已知附魔 id 列表（minecraft:xxx），用于 get_enchant_level 逐个查询，避免访问 .enchants
 _ENCHANT_IDS: List[str] = []
 
+# 无法读取 ItemStack.max_stack_size 时使用的最大堆叠数
+_DEFAULT_MAX_STACK_SIZE = 64
+
+# 已解码 NBT 缓存的最大条目数（按最近使用淘汰）
+_NBT_CACHE_SIZE = 256
+
+# 物品名翻译缓存的最大条目数（(翻译键, 语言) 组合通常很少）
+_NAME_CACHE_SIZE = 1024
+
+
+# Bedrock 物品 NBT（ench 列表）中的数字附魔 id -> minecraft:xxx
+_ENCHANT_NUMERIC_IDS: Dict[int, str] = {
+    0: "minecraft:protection", 1: "minecraft:fire_protection", 2: "minecraft:feather_falling",
+    3: "minecraft:blast_protection", 4: "minecraft:projectile_protection", 5: "minecraft:thorns",
+    6: "minecraft:respiration", 7: "minecraft:depth_strider", 8: "minecraft:aqua_affinity",
+    9: "minecraft:sharpness", 10: "minecraft:smite", 11: "minecraft:bane_of_arthropods",
+    12: "minecraft:knockback", 13: "minecraft:fire_aspect", 14: "minecraft:looting",
+    15: "minecraft:efficiency", 16: "minecraft:silk_touch", 17: "minecraft:unbreaking",
+    18: "minecraft:fortune", 19: "minecraft:power", 20: "minecraft:punch",
+    21: "minecraft:flame", 22: "minecraft:infinity", 23: "minecraft:luck_of_the_sea",
+    24: "minecraft:lure", 25: "minecraft:frost_walker", 26: "minecraft:mending",
+    27: "minecraft:binding", 28: "minecraft:vanishing", 29: "minecraft:impaling",
+    30: "minecraft:riptide", 31: "minecraft:loyalty", 32: "minecraft:channeling",
+    33: "minecraft:multishot", 34: "minecraft:piercing", 35: "minecraft:quick_charge",
+    36: "minecraft:soul_speed", 37: "minecraft:swift_sneak", 38: "minecraft:wind_burst",
+    39: "minecraft:density", 40: "minecraft:breach",
+}
+
+
+def _nbt_get(tag: Any, key: str) -> Any:
+    """读取 CompoundTag 子标签，不存在或不是复合标签时返回 None。"""
+    try:
+        if key in tag:
+            return tag[key]
+    except Exception:
+        pass
+    return None
+
+
+def _nbt_value(tag: Any) -> Any:
+    """取标签的值（ShortTag 等包装类型取 .value，已是 Python 值时原样返回）。"""
+    return getattr(tag, "value", tag)
+
 
 def _normalize_enchant_id(eid: str) -> str:
     """统一为 minecraft:xxx 格式，兼容旧数据中的短 id。"""
@@ -56,6 +103,46 @@ def _build_enchant_ids() -> List[str]:
     return _ENCHANT_IDS
 
 
+class _InventorySnapshot:
+    """
+    某一代的玩家背包内容：有物品的槽位及其 ItemStack 副本，
+    以及按物品要求缓存的匹配槽位（has_item 与 remove_item 共用）。
+    """
+
+    __slots__ = ("generation", "captured_at", "slots", "matches")
+
+    def __init__(self, generation: int, captured_at: float, slots: List[Tuple[int, Any]]):
+        self.generation = generation
+        self.captured_at = captured_at
+        self.slots = slots
+        self.matches: Dict[tuple, List[Tuple[int, Any]]] = {}
+
+
+class _DeliveryPlan:
+    """
+    一次发放的预计算结果：物品模板、最大堆叠数与背包可容纳数量。
+    由 plan_delivery 生成，调用方据 capacity 决定发放数量后传给 give_item_count，避免重复扫描背包。
+    """
+
+    __slots__ = ("template", "max_stack", "capacity")
+
+    def __init__(self, template: Any, max_stack: int, capacity: int):
+        self.template = template
+        self.max_stack = max_stack
+        self.capacity = capacity
+
+
+def _match_key(item_info: Dict[str, Any]) -> tuple:
+    """物品要求的匹配键（类型、data、NBT、附魔、Lore）。"""
+    return (
+        item_info["type"],
+        item_info.get("data", 0),
+        item_info.get("nbt_b64"),
+        tuple(sorted((item_info.get("enchants") or {}).items())),
+        tuple(item_info.get("lore") or []),
+    )
+
+
 class InventoryManager:
     """
     专门负责玩家背包物品管理的类。
@@ -68,6 +155,23 @@ class InventoryManager:
         """
         self._plugin = plugin
         self._server = getattr(plugin, "server", None)
+        # 物品类型 id -> 最大堆叠数（同一类型固定不变）
+        self._max_stack_sizes: Dict[str, int] = {}
+        # (翻译键, 语言) -> 本地化物品名
+        self._name_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self.name_cache_hits = 0
+        self.name_cache_misses = 0
+        # nbt_b64 摘要 -> 已解码的 NBT 标签（同一商店物品反复发放时只解析一次）
+        self._nbt_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+        self.nbt_cache_hits = 0
+        self.nbt_cache_misses = 0
+        # 背包快照：玩家名 -> 代数（背包可能变化时加 1）与最近一次读取的快照
+        # 并非所有背包变化都有事件（如与箱子交换物品、指令），快照另以 snapshot_ttl 秒限制有效期，0 表示不使用快照
+        self.snapshot_ttl = 15.0
+        self._generations: Dict[str, int] = {}
+        self._snapshots: Dict[str, _InventorySnapshot] = {}
+        self.snapshot_hits = 0
+        self.snapshot_misses = 0
 
     def _log(self, level: str, message: str) -> None:
         if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
@@ -95,16 +199,53 @@ class InventoryManager:
         except Exception:
             return None
 
+    def _read_nbt_enchants(self, item_stack: Any) -> Optional[Dict[str, int]]:
+        """
+        一次遍历 ItemStack.nbt 中的 ench 列表读取附魔（兼容 ench 位于顶层或 tag 子标签下）。
+        NBT 不可用、没有 ench 列表或含无法识别的条目时返回 None，由调用方回退到逐个查询。
+        """
+        try:
+            nbt_compound = getattr(item_stack, "nbt", None)
+            if nbt_compound is None:
+                return None
+            ench_list = _nbt_get(nbt_compound, "ench")
+            if ench_list is None:
+                user_tag = _nbt_get(nbt_compound, "tag")
+                ench_list = _nbt_get(user_tag, "ench") if user_tag is not None else None
+            if ench_list is None:
+                return None
+            result: Dict[str, int] = {}
+            for entry in ench_list:
+                raw_id = _nbt_value(_nbt_get(entry, "id"))
+                level = _nbt_value(_nbt_get(entry, "lvl"))
+                if raw_id is None or level is None:
+                    return None
+                if isinstance(raw_id, str):
+                    enchant_id = _normalize_enchant_id(raw_id)
+                else:
+                    enchant_id = _ENCHANT_NUMERIC_IDS.get(int(raw_id))
+                    if enchant_id is None:
+                        return None
+                if int(level) > 0:
+                    result[enchant_id] = int(level)
+            return result
+        except Exception:
+            return None
+
     def _get_item_enchants(self, item_stack: Any) -> Dict[str, int]:
         """
         从 ItemStack 安全读取附魔信息（str->int）。
-        不访问 ItemMeta.enchants（会触发 unhashable），改用 get_enchant_level(id) 逐个查询。
+        优先从 NBT 的 ench 列表一次读取；NBT 不可用时不访问 ItemMeta.enchants（会触发 unhashable），
+        改用 get_enchant_level(id) 逐个查询。
         """
         if not item_stack or not getattr(item_stack, "item_meta", None):
             return {}
         meta = item_stack.item_meta
         if not getattr(meta, "has_enchants", False):
             return {}
+        nbt_enchants = self._read_nbt_enchants(item_stack)
+        if nbt_enchants:
+            return nbt_enchants
         result: Dict[str, int] = {}
         get_level = getattr(meta, "get_enchant_level", None)
         if not callable(get_level):
@@ -168,133 +309,294 @@ class InventoryManager:
                     return False
         return True
 
+    def translate_item_name(self, translation_key: str, locale: Optional[str], fallback: str) -> str:
+        """
+        物品类型的本地化名称，按 (翻译键, 语言) 缓存（最多 _NAME_CACHE_SIZE 条，按最近使用淘汰）。
+        翻译不可用时返回 fallback（不缓存，便于语言服务可用后重试）。
+        """
+        key = (translation_key, locale)
+        name = self._name_cache.get(key)
+        if name is not None:
+            self.name_cache_hits += 1
+            self._name_cache.move_to_end(key)
+            return name
+        self.name_cache_misses += 1
+        if not translation_key or not self._server or not hasattr(self._server, "language"):
+            return fallback
+        try:
+            name = self._server.language.translate(translation_key, None, locale)
+        except Exception:
+            return fallback
+        if not name:
+            return fallback
+        self._name_cache[key] = name
+        if len(self._name_cache) > _NAME_CACHE_SIZE:
+            self._name_cache.popitem(last=False)
+        return name
+
+    def get_name_cache_stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._name_cache),
+            "hits": self.name_cache_hits,
+            "misses": self.name_cache_misses,
+        }
+
+    def _translate_item_name(self, player: Any, item_stack: Any) -> str:
+        """物品类型在玩家语言下的名称（不可用时返回类型 id）。"""
+        return self.translate_item_name(
+            item_stack.type.translation_key,
+            getattr(player, "locale", None),
+            item_stack.type.id,
+        )
+
+    def _build_item_entry(self, player: Any, item_stack: Any, slot_index: int) -> Dict[str, Any]:
+        """构造单个槽位的完整物品信息（含附魔、Lore 与 nbt_b64）。"""
+        display_name = self._translate_item_name(player, item_stack)
+        custom_name = False
+        if item_stack.item_meta and getattr(
+            item_stack.item_meta, "has_display_name", False
+        ):
+            display_name = item_stack.item_meta.display_name
+            custom_name = True
+        enchants = self._get_item_enchants(item_stack)
+        lore = self._get_item_lore(item_stack)
+        nbt_b64 = self._serialize_item_nbt(item_stack)
+        entry: Dict[str, Any] = {
+            "type": item_stack.type.id,
+            "type_translation_key": item_stack.type.translation_key,
+            "name": display_name,
+            "custom_name": custom_name,
+            "count": item_stack.amount,
+            "data": item_stack.data,
+            "enchants": enchants,
+            "lore": lore,
+            "slot_index": slot_index,
+        }
+        if nbt_b64:
+            entry["nbt_b64"] = nbt_b64
+        return entry
+
+    def invalidate_inventory(self, player_name: str) -> None:
+        """玩家背包可能已变化（拾取、丢弃、消耗、放置方块、死亡或本插件发放/移除物品）：代数加 1，丢弃快照。"""
+        self._generations[player_name] = self._generations.get(player_name, 0) + 1
+        self._snapshots.pop(player_name, None)
+
+    def forget_player(self, player_name: str) -> None:
+        """玩家退出时清理快照与代数。"""
+        self._generations.pop(player_name, None)
+        self._snapshots.pop(player_name, None)
+
+    def get_snapshot_stats(self) -> Dict[str, int]:
+        return {
+            "players": len(self._snapshots),
+            "hits": self.snapshot_hits,
+            "misses": self.snapshot_misses,
+        }
+
+    def _get_snapshot(self, player: Any) -> Tuple[_InventorySnapshot, bool]:
+        """
+        返回玩家背包快照与是否复用了已有快照。
+        代数未变且未超过有效期时复用，否则通过原生 API 重新读取全部槽位。
+        """
+        player_name = player.name
+        generation = self._generations.get(player_name, 0)
+        now = time.monotonic()
+        snapshot = self._snapshots.get(player_name)
+        if (
+            snapshot is not None
+            and snapshot.generation == generation
+            and now - snapshot.captured_at <= self.snapshot_ttl
+        ):
+            self.snapshot_hits += 1
+            return snapshot, True
+        self.snapshot_misses += 1
+        snapshot = _InventorySnapshot(generation, now, list(self._iter_inventory_slots(player)))
+        if self.snapshot_ttl > 0:
+            self._snapshots[player_name] = snapshot
+        return snapshot, False
+
+    def _match_slots(self, snapshot: _InventorySnapshot, item_info: Dict[str, Any]) -> List[Tuple[int, Any]]:
+        """快照中与 item_info 匹配的槽位（按槽位顺序），结果缓存在快照上。"""
+        key = _match_key(item_info)
+        matched = snapshot.matches.get(key)
+        if matched is None:
+            required_type, required_data, required_nbt_b64 = key[0], key[1], key[2]
+            required_enchants = item_info.get("enchants", {})
+            required_lore = item_info.get("lore", [])
+            matched = [
+                (slot_index, item_stack)
+                for slot_index, item_stack in snapshot.slots
+                if self._item_stack_matches_info(
+                    item_stack,
+                    required_type,
+                    required_data,
+                    required_enchants,
+                    required_lore,
+                    required_nbt_b64,
+                )
+            ]
+            snapshot.matches[key] = matched
+        return matched
+
+    def _iter_inventory_slots(self, player: Any):
+        """遍历背包中有物品的槽位，产出 (slot_index, item_stack)。"""
+        inventory = player.inventory
+        for slot_index in range(inventory.size):
+            try:
+                item_stack = inventory.get_item(slot_index)
+            except Exception as slot_e:
+                self._log(
+                    "warning",
+                    f"[ARCButtonShop] get_item(slot={slot_index}) failed: {slot_e}",
+                )
+                continue
+            if not item_stack or not item_stack.type or item_stack.amount <= 0:
+                continue
+            yield slot_index, item_stack
+
     def get_inventory_items(self, player: Any) -> List[Dict[str, Any]]:
         """
         获取玩家背包中所有有效物品的列表。
-        每项为 dict：type, type_translation_key, name, count, data, enchants, lore, slot_index；
+        每项为 dict：type, type_translation_key, name, custom_name（name 是否为自定义名称）, count, data, enchants, lore, slot_index；
         若物品含完整用户 NBT（如附魔书），另含 nbt_b64（Base64 二进制 NBT）。
         """
         items: List[Dict[str, Any]] = []
         try:
-            inventory = player.inventory
-            for slot_index in range(inventory.size):
+            snapshot, _reused = self._get_snapshot(player)
+            for slot_index, item_stack in snapshot.slots:
                 try:
-                    item_stack = inventory.get_item(slot_index)
-                except Exception as slot_e:
+                    items.append(self._build_item_entry(player, item_stack, slot_index))
+                except Exception as item_e:
                     self._log(
                         "warning",
-                        f"[ARCButtonShop] get_item(slot={slot_index}) failed: {slot_e}",
+                        f"[ARCButtonShop] Slot {slot_index} item build failed: "
+                        f"{item_e}\n{traceback.format_exc()}",
                     )
-                    continue
-                if not item_stack or not item_stack.type or item_stack.amount <= 0:
-                    continue
+            return items
+        except Exception as e:
+            self._log(
+                "error",
+                f"[ARCButtonShop] Get player inventory error: {str(e)}\n{traceback.format_exc()}",
+            )
+            return []
+
+    def list_inventory_items(self, player: Any) -> List[Dict[str, Any]]:
+        """
+        轻量列出背包物品（用于物品选择面板的按钮文字）。
+        每项为 dict：slot_index, type, count, name, has_enchants, has_lore；
+        不读取附魔等级、Lore 内容与 NBT，选中后再用 get_slot_item 读取完整信息。
+        """
+        items: List[Dict[str, Any]] = []
+        try:
+            snapshot, _reused = self._get_snapshot(player)
+            for slot_index, item_stack in snapshot.slots:
                 try:
-                    item_type_id = item_stack.type.id
-                    item_type_translation_key = item_stack.type.translation_key
-                    display_name = item_type_id
-                    if self._server and hasattr(self._server, "language"):
-                        try:
-                            display_name = self._server.language.translate(
-                                item_type_translation_key,
-                                None,
-                                getattr(player, "locale", None),
-                            )
-                        except Exception:
-                            pass
-                    if item_stack.item_meta and getattr(
-                        item_stack.item_meta, "has_display_name", False
-                    ):
-                        display_name = item_stack.item_meta.display_name
-                    enchants = self._get_item_enchants(item_stack)
-                    lore = self._get_item_lore(item_stack)
-                    nbt_b64 = self._serialize_item_nbt(item_stack)
-                    entry: Dict[str, Any] = {
-                        "type": item_type_id,
-                        "type_translation_key": item_type_translation_key,
-                        "name": display_name,
-                        "count": item_stack.amount,
-                        "data": item_stack.data,
-                        "enchants": enchants,
-                        "lore": lore,
+                    meta = item_stack.item_meta
+                    name = self._translate_item_name(player, item_stack)
+                    if meta and getattr(meta, "has_display_name", False):
+                        name = meta.display_name
+                    items.append({
                         "slot_index": slot_index,
-                    }
-                    if nbt_b64:
-                        entry["nbt_b64"] = nbt_b64
-                    items.append(entry)
+                        "type": item_stack.type.id,
+                        "count": item_stack.amount,
+                        "name": name,
+                        "has_enchants": bool(meta and getattr(meta, "has_enchants", False)),
+                        "has_lore": bool(meta and getattr(meta, "has_lore", False)),
+                    })
                 except Exception as item_e:
                     self._log(
                         "warning",
-                        f"[ARCButtonShop] Slot {slot_index} item build failed: "
-                        f"{item_e}\n{traceback.format_exc()}",
+                        f"[ARCButtonShop] Slot {slot_index} item listing failed: {item_e}",
                     )
             return items
         except Exception as e:
             self._log(
                 "error",
-                f"[ARCButtonShop] Get player inventory error: {str(e)}\n{traceback.format_exc()}",
+                f"[ARCButtonShop] List player inventory error: {str(e)}\n{traceback.format_exc()}",
             )
             return []
 
+    def get_slot_item(self, player: Any, slot_index: int, expected_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取单个槽位的完整物品信息（格式同 get_inventory_items 的元素）。
+        槽位为空，或给定 expected_type 而物品类型已不同（列表展示后背包发生变化）时返回 None。
+        """
+        try:
+            snapshot, _reused = self._get_snapshot(player)
+            item_stack = next((stack for index, stack in snapshot.slots if index == slot_index), None)
+            if item_stack is None:
+                return None
+            if expected_type is not None and item_stack.type.id != expected_type:
+                return None
+            return self._build_item_entry(player, item_stack, slot_index)
+        except Exception as e:
+            self._log(
+                "error",
+                f"[ARCButtonShop] Get slot {slot_index} item error: {str(e)}\n{traceback.format_exc()}",
+            )
+            return None
+
     def has_item(self, player: Any, item_info: Dict[str, Any]) -> bool:
-        """检查玩家背包是否拥有至少 item_info 要求数量、类型、data、附魔、Lore 一致的物品。"""
+        """检查玩家背包是否拥有至少 item_info 要求数量、类型、data、附魔、Lore 一致的物品（可复用背包快照）。"""
         try:
-            inventory = player.inventory
-            required_type = item_info["type"]
-            required_count = item_info["count"]
-            required_data = item_info.get("data", 0)
-            required_enchants = item_info.get("enchants", {})
-            required_lore = item_info.get("lore", [])
-            required_nbt_b64 = item_info.get("nbt_b64")
-            total_count = 0
-            for slot_index in range(inventory.size):
-                item_stack = inventory.get_item(slot_index)
-                if not self._item_stack_matches_info(
-                    item_stack,
-                    required_type,
-                    required_data,
-                    required_enchants,
-                    required_lore,
-                    required_nbt_b64,
-                ):
-                    continue
-                total_count += item_stack.amount
-                if total_count >= required_count:
-                    return True
-            return False
+            snapshot, reused = self._get_snapshot(player)
+            total_count = sum(item_stack.amount for _slot, item_stack in self._match_slots(snapshot, item_info))
+            if total_count < item_info["count"] and reused:
+                # 复用的快照可能未反映没有事件的变化：数量不足时重新读取一次再下结论
+                self.invalidate_inventory(player.name)
+                snapshot, _reused = self._get_snapshot(player)
+                total_count = sum(item_stack.amount for _slot, item_stack in self._match_slots(snapshot, item_info))
+            return total_count >= item_info["count"]
         except Exception as e:
             self._log("error", f"[ARCButtonShop] Player has item check error: {str(e)}")
             return False
 
+    def _plan_removal(self, player: Any, item_info: Dict[str, Any]) -> Optional[List[tuple]]:
+        """
+        按快照确定要修改的槽位：[(slot_index, 当前 ItemStack, 移除数量)]，数量不足时返回空列表。
+        复用的快照只用于定位，涉及的槽位会重新读取并核对；与快照不一致（或按复用的快照数量不足）时返回 None。
+        """
+        snapshot, reused = self._get_snapshot(player)
+        inventory = player.inventory
+        remaining_to_remove = item_info["count"]
+        slots_to_modify: List[tuple] = []
+        for slot_index, item_stack in self._match_slots(snapshot, item_info):
+            if remaining_to_remove <= 0:
+                break
+            if reused:
+                current = inventory.get_item(slot_index)
+                if (
+                    not current
+                    or current.amount != item_stack.amount
+                    or not self._item_stack_matches_info(
+                        current,
+                        item_info["type"],
+                        item_info.get("data", 0),
+                        item_info.get("enchants", {}),
+                        item_info.get("lore", []),
+                        item_info.get("nbt_b64"),
+                    )
+                ):
+                    return None
+                item_stack = current
+            remove_from_slot = min(remaining_to_remove, item_stack.amount)
+            slots_to_modify.append((slot_index, item_stack, remove_from_slot))
+            remaining_to_remove -= remove_from_slot
+        if remaining_to_remove > 0:
+            return None if reused else []
+        return slots_to_modify
+
     def remove_item(self, player: Any, item_info: Dict[str, Any]) -> bool:
         """从玩家背包移除与 item_info 匹配的物品（数量、类型、data、附魔、Lore）。"""
         try:
             inventory = player.inventory
-            required_type = item_info["type"]
-            required_count = item_info["count"]
-            required_data = item_info.get("data", 0)
-            required_enchants = item_info.get("enchants", {})
-            required_lore = item_info.get("lore", [])
-            required_nbt_b64 = item_info.get("nbt_b64")
-            if not self.has_item(player, item_info):
+            slots_to_modify = self._plan_removal(player, item_info)
+            if slots_to_modify is None:
+                # 快照已过时：重新读取背包后再确定槽位
+                self.invalidate_inventory(player.name)
+                slots_to_modify = self._plan_removal(player, item_info)
+            if not slots_to_modify:
                 return False
-            remaining_to_remove = required_count
-            slots_to_modify: List[tuple] = []
-            for slot_index in range(inventory.size):
-                if remaining_to_remove <= 0:
-                    break
-                item_stack = inventory.get_item(slot_index)
-                if not self._item_stack_matches_info(
-                    item_stack,
-                    required_type,
-                    required_data,
-                    required_enchants,
-                    required_lore,
-                    required_nbt_b64,
-                ):
-                    continue
-                remove_from_slot = min(remaining_to_remove, item_stack.amount)
-                slots_to_modify.append((slot_index, item_stack, remove_from_slot))
-                remaining_to_remove -= remove_from_slot
             for slot_index, original_stack, remove_count in slots_to_modify:
                 new_amount = original_stack.amount - remove_count
                 if new_amount <= 0:
@@ -302,85 +604,207 @@ class InventoryManager:
                 else:
                     original_stack.amount = new_amount
                     inventory.set_item(slot_index, original_stack)
+            self.invalidate_inventory(player.name)
             return True
         except Exception as e:
+            self.invalidate_inventory(player.name)
             self._log(
                 "error", f"[ARCButtonShop] Remove item from player error: {str(e)}"
             )
             return False
 
-    def give_item(self, player: Any, item_info: Dict[str, Any]) -> bool:
-        """向玩家背包发放物品（类型、数量、data；附魔/Lore 若 API 支持则应用）。"""
-        given = self.give_item_count(player, item_info)
+    def give_item(
+        self, player: Any, item_info: Dict[str, Any], plan: Optional[_DeliveryPlan] = None
+    ) -> bool:
+        """向玩家背包发放物品（类型、数量、data；附魔/Lore 若 API 支持则应用）；plan 同 give_item_count。"""
+        given = self.give_item_count(player, item_info, plan)
         return given >= int(item_info.get("count", 0) or 0)
 
-    def give_item_count(self, player: Any, item_info: Dict[str, Any]) -> int:
+    def _decode_item_nbt(self, nbt_b64: str) -> Any:
         """
-        尝试向玩家背包发放物品，返回**实际成功发放的数量**（可能为部分）。
-        注意：当背包不足时不会强行回滚已发放部分；调用方需要基于返回值决定扣款/回滚策略。
+        解码 nbt_b64 为 NBT 标签，按 Base64 内容摘要缓存解码结果。
+        标签可变，每次返回副本，避免调用方修改影响缓存。
         """
+        key = hashlib.blake2b(nbt_b64.encode("ascii"), digest_size=16).digest()
+        tag = self._nbt_cache.get(key)
+        if tag is None:
+            from endstone.nbt import load
+
+            self.nbt_cache_misses += 1
+            tag, _name = load(base64.b64decode(nbt_b64), byte_order="little")
+            if tag is None:
+                return None
+            self._nbt_cache[key] = tag
+            if len(self._nbt_cache) > _NBT_CACHE_SIZE:
+                self._nbt_cache.popitem(last=False)
+        else:
+            self.nbt_cache_hits += 1
+            self._nbt_cache.move_to_end(key)
         try:
-            from endstone.inventory import ItemStack
+            return copy.deepcopy(tag)
+        except Exception:
+            # 原生绑定的标签不支持 deepcopy 时直接返回：赋值给 ItemStack.nbt 时会复制到原生物品中
+            return tag
 
-            inventory = player.inventory
-            item_type_id = item_info["type"]
-            total_amount = item_info["count"]
-            item_data = item_info.get("data", 0)
-            if total_amount <= 0:
-                self._log("warning", f"[ARCButtonShop] Invalid item amount: {total_amount}")
-                return 0
-            remaining_to_give = total_amount
-            given_total = 0
-            while remaining_to_give > 0:
-                current_amount = min(remaining_to_give, 64)
-                if current_amount <= 0:
-                    break
-                item_stack = ItemStack(
-                    type=item_type_id,
-                    amount=current_amount,
-                    data=item_data,
+    def get_nbt_cache_stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._nbt_cache),
+            "hits": self.nbt_cache_hits,
+            "misses": self.nbt_cache_misses,
+        }
+
+    def _build_item_stack(self, item_info: Dict[str, Any], amount: int) -> Any:
+        """按 item_info 构造 ItemStack（类型、数量、data；有 nbt_b64 时还原完整 NBT，否则应用附魔/Lore）。"""
+        from endstone.inventory import ItemStack
+
+        item_stack = ItemStack(
+            type=item_info["type"],
+            amount=amount,
+            data=item_info.get("data", 0),
+        )
+        nbt_b64 = item_info.get("nbt_b64")
+        if nbt_b64:
+            try:
+                tag = self._decode_item_nbt(nbt_b64)
+                if tag is not None and hasattr(item_stack, "nbt"):
+                    item_stack.nbt = tag
+            except Exception as e:
+                self._log(
+                    "warning",
+                    f"[ARCButtonShop] Restore item NBT failed: {e}",
                 )
-                nbt_b64 = item_info.get("nbt_b64")
-                if nbt_b64:
+        elif item_info.get("enchants") or item_info.get("lore"):
+            try:
+                meta = item_stack.item_meta
+                if meta and item_info.get("enchants"):
+                    for enchant_id, level in item_info["enchants"].items():
+                        try:
+                            if hasattr(meta, "add_enchant"):
+                                meta.add_enchant(str(enchant_id), int(level))
+                        except Exception as e:
+                            self._log(
+                                "warning",
+                                f"[ARCButtonShop] Failed to apply enchant {enchant_id}: {e}",
+                            )
+                if meta and item_info.get("lore") and hasattr(meta, "lore"):
                     try:
-                        from endstone.nbt import load
-
-                        raw_nbt = base64.b64decode(nbt_b64)
-                        tag, _name = load(raw_nbt, byte_order="little")
-                        if tag is not None and hasattr(item_stack, "nbt"):
-                            item_stack.nbt = tag
+                        meta.lore = list(item_info["lore"])
                     except Exception as e:
                         self._log(
                             "warning",
-                            f"[ARCButtonShop] Restore item NBT failed: {e}",
+                            f"[ARCButtonShop] Failed to apply lore: {e}",
                         )
-                elif item_info.get("enchants") or item_info.get("lore"):
-                    try:
-                        meta = item_stack.item_meta
-                        if meta and item_info.get("enchants"):
-                            for enchant_id, level in item_info["enchants"].items():
-                                try:
-                                    if hasattr(meta, "add_enchant"):
-                                        meta.add_enchant(str(enchant_id), int(level))
-                                except Exception as e:
-                                    self._log(
-                                        "warning",
-                                        f"[ARCButtonShop] Failed to apply enchant {enchant_id}: {e}",
-                                    )
-                        if meta and item_info.get("lore") and hasattr(meta, "lore"):
-                            try:
-                                meta.lore = list(item_info["lore"])
-                            except Exception as e:
-                                self._log(
-                                    "warning",
-                                    f"[ARCButtonShop] Failed to apply lore: {e}",
-                                )
-                        if meta and hasattr(item_stack, "set_item_meta"):
-                            item_stack.set_item_meta(meta)
-                    except Exception as e:
-                        self._log("warning", f"[ARCButtonShop] Apply item meta: {e}")
+                if meta and hasattr(item_stack, "set_item_meta"):
+                    item_stack.set_item_meta(meta)
+            except Exception as e:
+                self._log("warning", f"[ARCButtonShop] Apply item meta: {e}")
+        return item_stack
+
+    def _get_max_stack_size(self, item_stack: Any) -> int:
+        """物品最大堆叠数（按类型缓存；API 不可用时按 64 处理）。"""
+        type_id = item_stack.type.id
+        size = self._max_stack_sizes.get(type_id)
+        if size is None:
+            try:
+                size = int(getattr(item_stack, "max_stack_size", 0) or 0)
+            except Exception:
+                size = 0
+            if size <= 0:
+                size = _DEFAULT_MAX_STACK_SIZE
+            self._max_stack_sizes[type_id] = size
+        return size
+
+    def _get_free_capacity_for(self, player: Any, template: Any, item_info: Dict[str, Any]) -> int:
+        """按已构造的 ItemStack 计算背包可容纳数量：空槽位按最大堆叠计，相同物品槽位按剩余堆叠空间计。"""
+        inventory = player.inventory
+        max_stack = self._get_max_stack_size(template)
+        is_similar = getattr(template, "is_similar", None)
+        required_type = item_info["type"]
+        required_data = item_info.get("data", 0)
+        required_enchants = item_info.get("enchants", {})
+        required_lore = item_info.get("lore", [])
+        required_nbt_b64 = item_info.get("nbt_b64")
+        capacity = 0
+        for slot_index in range(inventory.size):
+            item_stack = inventory.get_item(slot_index)
+            if not item_stack or not item_stack.type or item_stack.amount <= 0 or item_stack.type.id == "minecraft:air":
+                capacity += max_stack
+                continue
+            if item_stack.amount >= max_stack:
+                continue
+            if callable(is_similar):
+                similar = is_similar(item_stack)
+            else:
+                similar = self._item_stack_matches_info(
+                    item_stack,
+                    required_type,
+                    required_data,
+                    required_enchants,
+                    required_lore,
+                    required_nbt_b64,
+                )
+            if similar:
+                capacity += max_stack - item_stack.amount
+        return capacity
+
+    def plan_delivery(self, player: Any, item_info: Dict[str, Any]) -> Optional[_DeliveryPlan]:
+        """
+        构造物品模板并计算玩家背包可容纳数量（只扫描一次背包）；出错时返回 None。
+        返回的计划可直接传给 give_item_count / give_item，期间背包不应被其他操作修改。
+        """
+        try:
+            template = self._build_item_stack(item_info, 1)
+            capacity = self._get_free_capacity_for(player, template, item_info)
+            return _DeliveryPlan(template, self._get_max_stack_size(template), capacity)
+        except Exception as e:
+            self._log(
+                "error", f"[ARCButtonShop] Get free inventory capacity error: {str(e)}"
+            )
+            return None
+
+    def get_free_capacity(self, player: Any, item_info: Dict[str, Any]) -> int:
+        """
+        计算玩家背包还能放入多少个与 item_info 相同的物品（按物品真实最大堆叠数）；出错时返回 0。
+        随后还要发放时应改用 plan_delivery，并把计划传给 give_item_count。
+        """
+        plan = self.plan_delivery(player, item_info)
+        return plan.capacity if plan is not None else 0
+
+    def give_item_count(
+        self, player: Any, item_info: Dict[str, Any], plan: Optional[_DeliveryPlan] = None
+    ) -> int:
+        """
+        尝试向玩家背包发放物品，返回**实际成功发放的数量**（可能为部分）。
+        按背包剩余空间计算可发放数量（传入 plan 时复用其模板与容量，不再扫描背包），并按物品真实最大堆叠数分组放入；
+        背包不足时只发放能放下的部分，调用方需要基于返回值决定扣款/回滚策略。
+        """
+        try:
+            total_amount = item_info["count"]
+            if total_amount <= 0:
+                self._log("warning", f"[ARCButtonShop] Invalid item amount: {total_amount}")
+                return 0
+            inventory = player.inventory
+            if plan is None:
+                plan = self.plan_delivery(player, item_info)
+                if plan is None:
+                    return 0
+            if plan.capacity <= 0:
+                self._log(
+                    "warning",
+                    f"[ARCButtonShop] Player {player.name} inventory full",
+                )
+                return 0
+            item_stack = plan.template
+            max_stack = plan.max_stack
+            remaining_to_give = min(total_amount, plan.capacity)
+            given_total = 0
+            self.invalidate_inventory(player.name)
+            while remaining_to_give > 0:
+                current_amount = min(remaining_to_give, max_stack)
+                item_stack.amount = current_amount
                 remaining_items = inventory.add_item(item_stack)
                 if remaining_items:
+                    # 预计算后通常不会有剩余；仍按实际放入数量结算以防背包在计算后发生变化
                     try:
                         if hasattr(remaining_items, "get"):
                             first_remaining = remaining_items.get(0)
@@ -398,26 +822,22 @@ class InventoryManager:
                             if first_remaining is not None
                             else 0
                         )
-                        added_amount = item_stack.amount - remaining_amount
+                        added_amount = current_amount - remaining_amount
                         if added_amount > 0:
                             given_total += added_amount
-                        remaining_to_give -= added_amount
-                        if added_amount == 0:
-                            self._log(
-                                "warning",
-                                f"[ARCButtonShop] Player {player.name} inventory full",
-                            )
-                            break
+                        self._log(
+                            "warning",
+                            f"[ARCButtonShop] Player {player.name} inventory full",
+                        )
                     except Exception as e:
                         self._log(
                             "warning",
                             f"[ARCButtonShop] Error calculating remaining: {e}",
                         )
-                        # 计算失败时，宁可保守：认为本次未成功添加，直接停止，避免错误累计
-                        break
-                else:
-                    remaining_to_give -= item_stack.amount
-                    given_total += item_stack.amount
+                    # 出现剩余说明背包已满（或计算失败），宁可保守：直接停止，避免错误累计
+                    break
+                remaining_to_give -= current_amount
+                given_total += current_amount
             return int(given_total)
         except Exception as e:
             self._log(
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+数据库 schema 迁移：以 PRAGMA user_version 记录已应用的版本号。
+启动时只读取一次 user_version；数据库已是最新版本时不执行任何建表或 PRAGMA table_info 检查，
+否则在同一个事务中依次执行尚未应用的迁移并写入新版本号（失败时整体回滚，下次启动重试）。
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)，版本号连续递增，已发布的迁移不再修改。
+"""
+import sqlite3
+import traceback
+from typing import Any, Callable, Dict, List, Tuple
+
+from .PositionIndex import PositionIndex
+
+# 商店表
+SHOP_FIELDS = {
+    "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+    "shop_uuid": "TEXT NOT NULL UNIQUE",  # 商店唯一标识
+    "owner_xuid": "TEXT NOT NULL",  # 店主XUID（主要标识符）
+    "owner_name": "TEXT NOT NULL",  # 店主名称（用于显示）
+    "shop_type": "TEXT NOT NULL DEFAULT 'sell'",  # 商店类型：'sell'出售, 'buy'收购
+    "x": "INTEGER NOT NULL",  # 按钮X坐标
+    "y": "INTEGER NOT NULL",  # 按钮Y坐标
+    "z": "INTEGER NOT NULL",  # 按钮Z坐标
+    "dimension": "TEXT NOT NULL",  # 维度
+    "chunk_x": "INTEGER NOT NULL",  # 区块X坐标（用于优化查询）
+    "chunk_z": "INTEGER NOT NULL",  # 区块Z坐标（用于优化查询）
+    "item_type": "TEXT NOT NULL",  # 物品类型
+    "item_data": "TEXT NOT NULL",  # 物品数据（JSON格式）
+    "quantity": "INTEGER NOT NULL",  # 商品数量
+    "unit_price": "REAL NOT NULL",  # 单价
+    "stock": "INTEGER NOT NULL",  # 库存（出售商店为剩余库存，收购商店为资金余额）
+    "collected_items": "TEXT",  # 收购商店收集的物品（JSON格式）
+    "is_active": "INTEGER NOT NULL DEFAULT 1",  # 是否激活
+    "create_time": "TEXT NOT NULL",  # 创建时间
+    "last_purchase_time": "TEXT",  # 最后购买时间
+    "is_infinite": "INTEGER NOT NULL DEFAULT 0",  # 是否无限商店（系统/官方商店）
+    "revision": "INTEGER NOT NULL DEFAULT 0"  # 修订号：每次写入加 1，用于检测基于旧数据的表单提交
+}
+
+# 交易记录表
+TRANSACTION_FIELDS = {
+    "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+    "shop_id": "INTEGER NOT NULL",  # 商店ID
+    "buyer_xuid": "TEXT NOT NULL",  # 买家XUID（主要标识符）
+    "buyer_name": "TEXT NOT NULL",  # 买家名称（用于显示）
+    "quantity": "INTEGER NOT NULL",  # 购买数量
+    "unit_price": "REAL NOT NULL",  # 购买时的单价
+    "total_price": "REAL NOT NULL",  # 总价
+    "transaction_time": "TEXT NOT NULL"  # 交易时间
+}
+
+# 交易按天汇总表（过期明细清理前先汇总到这里）
+TRANSACTION_DAILY_FIELDS = {
+    "shop_id": "INTEGER NOT NULL",
+    "day": "TEXT NOT NULL",  # 日期 YYYY-MM-DD
+    "trade_count": "INTEGER NOT NULL DEFAULT 0",  # 交易笔数
+    "total_quantity": "INTEGER NOT NULL DEFAULT 0",  # 交易物品总数
+    "total_price": "REAL NOT NULL DEFAULT 0",  # 交易总金额
+    "PRIMARY KEY": "(shop_id, day)"
+}
+
+# 区块索引表（用于快速查询）
+CHUNK_INDEX_FIELDS = {
+    "chunk_x": "INTEGER NOT NULL",
+    "chunk_z": "INTEGER NOT NULL",
+    "dimension": "TEXT NOT NULL",
+    "shop_count": "INTEGER NOT NULL DEFAULT 0",
+    "PRIMARY KEY": "(chunk_x, chunk_z, dimension)"
+}
+
+_BASE_INDEXES = (
+    # 交易时间索引（保留任务按时间分批选取过期明细）
+    "CREATE INDEX IF NOT EXISTS idx_shop_transactions_time ON shop_transactions (transaction_time)",
+    # 按区块查询商店的索引（区块缓存加载、附近商店）
+    "CREATE INDEX IF NOT EXISTS idx_button_shops_chunk ON button_shops (dimension, chunk_x, chunk_z)",
+    # 按坐标查询商店的索引（按钮查找、批量坐标查询）
+    "CREATE INDEX IF NOT EXISTS idx_button_shops_position ON button_shops (x, y, z, dimension)",
+)
+
+
+def _create_table_sql(table: str, fields: Dict[str, str]) -> str:
+    field_defs = ','.join([f"{k} {v}" for k, v in fields.items()])
+    return f"CREATE TABLE IF NOT EXISTS {table} ({field_defs})"
+
+
+def _migration_base_tables(plugin: Any, cursor: sqlite3.Cursor) -> None:
+    """建表与索引（IF NOT EXISTS：启用版本号之前创建的数据库同样适用）"""
+    cursor.execute(_create_table_sql("button_shops", SHOP_FIELDS))
+    cursor.execute(_create_table_sql("shop_transactions", TRANSACTION_FIELDS))
+    cursor.execute(_create_table_sql("shop_transaction_daily", TRANSACTION_DAILY_FIELDS))
+    cursor.execute(_create_table_sql("chunk_index", CHUNK_INDEX_FIELDS))
+    for sql in _BASE_INDEXES:
+        cursor.execute(sql)
+
+
+def _migration_legacy_columns(plugin: Any, cursor: sqlite3.Cursor) -> None:
+    """为启用版本号之前的旧 button_shops 表补齐 is_infinite、revision 列（此后的新列直接 ALTER TABLE）"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(button_shops)").fetchall()}
+    for column in ("is_infinite", "revision"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE button_shops ADD COLUMN {column} {SHOP_FIELDS[column]}")
+
+
+def _migration_spatial_index(plugin: Any, cursor: sqlite3.Cursor) -> None:
+    """触发器维护的 chunk_index 与 shop_rtree（见 ShopIndex）"""
+    plugin.shop_index.create(cursor)
+
+
+def _migration_position_version(plugin: Any, cursor: sqlite3.Cursor) -> None:
+    """坐标版本号表与触发器，用于校验坐标索引快照（见 PositionIndex）"""
+    PositionIndex.create(cursor)
+
+
+# (版本号, 说明, 迁移函数)；函数在迁移事务中执行，不得自行提交
+MIGRATIONS: List[Tuple[int, str, Callable[[Any, sqlite3.Cursor], None]]] = [
+    (1, "base tables and indexes", _migration_base_tables),
+    (2, "is_infinite and revision columns", _migration_legacy_columns),
+    (3, "trigger-maintained spatial index", _migration_spatial_index),
+    (4, "position index version counter", _migration_position_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+class MigrationManager:
+    """
+    schema 迁移管理。
+    依赖插件实例以使用 _safe_log 与 db_manager；迁移函数可使用插件上已初始化的组件（如 shop_index）。
+    """
+
+    def __init__(self, plugin: Any):
+        """
+        :param plugin: 插件实例
+        """
+        self._plugin = plugin
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    def get_version(self) -> int:
+        """读取数据库当前的 schema 版本号"""
+        return self._plugin.db_manager.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self) -> int:
+        """
+        应用所有未执行的迁移
+        :return: 本次应用的迁移数量（失败时为 -1）
+        """
+        current = self.get_version()
+        if current >= SCHEMA_VERSION:
+            if current > SCHEMA_VERSION:
+                self._log('warning', f"[ARCButtonShop] Database schema version {current} is newer than supported {SCHEMA_VERSION}")
+            return 0
+        pending = [migration for migration in MIGRATIONS if migration[0] > current]
+        connection = self._plugin.db_manager.connection
+        cursor = connection.cursor()
+        try:
+            # 显式开启事务：sqlite3 模块不会为 DDL 自动开启事务
+            cursor.execute("BEGIN IMMEDIATE")
+            for version, description, migration in pending:
+                migration(self._plugin, cursor)
+                self._log('info', f"[ARCButtonShop] Applied schema migration {version}: {description}")
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            self._log('error', f"[ARCButtonShop] Schema migration from version {current} failed: {str(e)}\n{traceback.format_exc()}")
+            return -1
+        finally:
+            cursor.close()
+        return len(pending)
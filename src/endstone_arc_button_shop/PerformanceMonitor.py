@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+热路径耗时统计：为事件处理、交易、背包操作与数据库调用记录次数与耗时分布。
+每个操作使用固定大小的对数分桶直方图（内存恒定），可随时计算 p50/p95/p99 与最大值。
+关闭时移除所有计时包装，被统计的方法恢复为原始实现，没有额外开销；
+事件回调注册后无法替换，其包装常驻，关闭时仅多一次标志判断。
+数据库执行器与导出线程也会记录耗时，直方图的读写均加锁。
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 直方图桶上界（纳秒）：1µs 起按 1.2 倍递增至约 60s，之后全部落入最后一个桶
+_BUCKET_BOUNDS: List[int] = []
+_bound = 1000.0
+while _bound < 60_000_000_000:
+    _BUCKET_BOUNDS.append(int(_bound))
+    _bound *= 1.2
+del _bound
+
+
+class LatencyHistogram:
+    """固定大小的耗时直方图（线程安全）"""
+
+    __slots__ = ("count", "total_ns", "max_ns", "buckets", "_lock")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.count = 0
+            self.total_ns = 0
+            self.max_ns = 0
+            self.buckets = [0] * (len(_BUCKET_BOUNDS) + 1)
+
+    def record(self, elapsed_ns: int) -> None:
+        index = bisect.bisect_left(_BUCKET_BOUNDS, elapsed_ns)
+        with self._lock:
+            self.count += 1
+            self.total_ns += elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+            self.buckets[index] += 1
+
+    def percentile_ns(self, percent: float) -> int:
+        """返回给定百分位所在桶的上界（不超过最大值）"""
+        if self.count == 0:
+            return 0
+        target = self.count * percent / 100.0
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if index < len(_BUCKET_BOUNDS):
+                    return min(_BUCKET_BOUNDS[index], self.max_ns)
+                return self.max_ns
+        return self.max_ns
+
+    def summary(self) -> Dict[str, float]:
+        """以毫秒为单位的统计摘要（基于加锁复制的一致快照）"""
+        snapshot = LatencyHistogram.__new__(LatencyHistogram)
+        with self._lock:
+            snapshot.count = self.count
+            snapshot.total_ns = self.total_ns
+            snapshot.max_ns = self.max_ns
+            snapshot.buckets = list(self.buckets)
+        return {
+            "count": snapshot.count,
+            "total_ms": snapshot.total_ns / 1e6,
+            "avg_ms": (snapshot.total_ns / snapshot.count / 1e6) if snapshot.count else 0.0,
+            "p50_ms": snapshot.percentile_ns(50) / 1e6,
+            "p95_ms": snapshot.percentile_ns(95) / 1e6,
+            "p99_ms": snapshot.percentile_ns(99) / 1e6,
+            "max_ms": snapshot.max_ns / 1e6,
+        }
+
+
+class PerformanceMonitor:
+    """
+    耗时统计管理：通过在实例上安装计时包装来统计方法调用。
+    关闭时删除这些实例属性，方法调用回到类上的原始实现。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._histograms_lock = threading.Lock()
+        # (目标对象, 方法名, 统计名, 只统计最外层调用的分组)
+        self._targets: List[Tuple[Any, str, str, Optional[str]]] = []
+        # 各线程当前处于哪些分组的计时调用中（分组名 -> True）
+        self._active = threading.local()
+
+    def register(
+        self,
+        target: Any,
+        method_names: Iterable[str],
+        prefix: str,
+        persistent: bool = False,
+        outermost_only: bool = False,
+    ) -> None:
+        """
+        登记需要统计的方法（启用时才会被包装）
+        生成器方法统计迭代耗时（不含调用方处理每条记录的时间），@contextmanager 方法统计整个 with 块
+        :param target: 对象实例
+        :param method_names: 方法名列表
+        :param prefix: 统计名前缀，如 db、inventory
+        :param persistent: 立即安装且关闭时不移除包装；用于注册后无法替换的事件回调，
+                           使之后再开启统计时仍能计时（须在注册事件前调用）
+        :param outermost_only: 同一线程中已在本组某个被统计的调用内时不再计时（如 insert 内部调用 execute），
+                               使本组各操作的耗时互不重叠
+        """
+        group = prefix if outermost_only else None
+        if persistent:
+            for name in method_names:
+                self._install(target, name, f"{prefix}.{name}", group)
+            return
+        for name in method_names:
+            self._targets.append((target, name, f"{prefix}.{name}", group))
+        if self.enabled:
+            for name in method_names:
+                self._install(target, name, f"{prefix}.{name}", group)
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        for target, name, op_name, group in self._targets:
+            self._install(target, name, op_name, group)
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        for target, name, _op_name, _group in self._targets:
+            # 删除实例属性，恢复类上的原始方法
+            target.__dict__.pop(name, None)
+
+    def _install(self, target: Any, name: str, op_name: str, group: Optional[str] = None) -> None:
+        attribute = getattr(type(target), name)
+        original = attribute.__get__(target)
+        if inspect.isgeneratorfunction(attribute):
+            wrapper = self.wrap_iterator(original, op_name, group)
+        elif inspect.isgeneratorfunction(getattr(attribute, "__wrapped__", None)):
+            # @contextmanager 装饰的方法：__wrapped__ 为原始生成器函数
+            wrapper = self.wrap_context(original, op_name, group)
+        else:
+            wrapper = self.wrap(original, op_name, group)
+        target.__dict__[name] = wrapper
+
+    def _enter_group(self, group: Optional[str]) -> bool:
+        """进入分组的计时调用；已在该分组的调用内（嵌套）时返回 False"""
+        if group is None:
+            return True
+        if getattr(self._active, group, False):
+            return False
+        setattr(self._active, group, True)
+        return True
+
+    def _exit_group(self, group: Optional[str]) -> None:
+        if group is not None:
+            setattr(self._active, group, False)
+
+    def wrap(self, func: Callable, op_name: str, group: Optional[str] = None) -> Callable:
+        """返回带计时的包装函数；关闭统计后（如已注册的事件回调）仅多一次标志判断"""
+        histogram = self._histogram(op_name)
+        perf_counter_ns = time.perf_counter_ns
+        monitor = self
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if not monitor.enabled or not monitor._enter_group(group):
+                return func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(perf_counter_ns() - start)
+                monitor._exit_group(group)
+
+        return timed
+
+    def wrap_iterator(self, func: Callable, op_name: str, group: Optional[str] = None) -> Callable:
+        """包装生成器方法：累计每次取下一项的耗时，迭代结束（或提前关闭）时记录一次"""
+        histogram = self._histogram(op_name)
+        perf_counter_ns = time.perf_counter_ns
+        monitor = self
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            if not monitor.enabled:
+                return (yield from iterator)
+            elapsed = 0
+            counted = False
+            try:
+                while True:
+                    outermost = monitor._enter_group(group)
+                    start = perf_counter_ns()
+                    try:
+                        item = next(iterator)
+                    except StopIteration as stop:
+                        return stop.value
+                    finally:
+                        if outermost:
+                            elapsed += perf_counter_ns() - start
+                            counted = True
+                            monitor._exit_group(group)
+                    yield item
+            finally:
+                iterator.close()
+                if counted:
+                    histogram.record(elapsed)
+
+        return timed
+
+    def wrap_context(self, func: Callable, op_name: str, group: Optional[str] = None) -> Callable:
+        """包装 @contextmanager 方法：统计从进入到退出整个 with 块的耗时"""
+        histogram = self._histogram(op_name)
+        perf_counter_ns = time.perf_counter_ns
+        monitor = self
+
+        @functools.wraps(func)
+        @contextmanager
+        def timed(*args, **kwargs):
+            if not monitor.enabled or not monitor._enter_group(group):
+                with func(*args, **kwargs) as value:
+                    yield value
+                return
+            start = perf_counter_ns()
+            try:
+                with func(*args, **kwargs) as value:
+                    yield value
+            finally:
+                histogram.record(perf_counter_ns() - start)
+                monitor._exit_group(group)
+
+        return timed
+
+    def record(self, op_name: str, elapsed_ns: int) -> None:
+        """手动记录一次耗时"""
+        if not self.enabled:
+            return
+        self._histogram(op_name).record(elapsed_ns)
+
+    def _histogram(self, op_name: str) -> LatencyHistogram:
+        """取（必要时创建）操作的直方图；可能在多个线程中同时调用"""
+        histogram = self._histograms.get(op_name)
+        if histogram is None:
+            with self._histograms_lock:
+                histogram = self._histograms.get(op_name)
+                if histogram is None:
+                    histogram = self._histograms[op_name] = LatencyHistogram()
+        return histogram
+
+    def reset(self) -> None:
+        with self._histograms_lock:
+            histograms = list(self._histograms.values())
+        for histogram in histograms:
+            histogram.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """返回所有有调用记录的操作的统计摘要"""
+        with self._histograms_lock:
+            histograms = list(self._histograms.items())
+        stats = {}
+        for name, histogram in histograms:
+            summary = histogram.summary()
+            if summary["count"]:
+                stats[name] = summary
+        return stats
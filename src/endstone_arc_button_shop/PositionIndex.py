@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+活跃商店坐标 → 商店 id 的内存索引，并持久化为磁盘快照以加快启动。
+每个维度保存两个等长数组：按坐标打包成的 64 位键（升序）与对应的商店 id，查找用二分。
+快照文件以 mmap 映射后直接作为数组使用（不逐行解析），并记录 shop_index_state 表中的坐标版本号；
+button_shops 上的触发器在商店新增、删除、上下架或移动时递增版本号，启动时版本号一致才使用快照，
+否则全表扫描重建并重新写入快照。
+运行期间的变化记录在覆盖字典中，插件关闭时与基础数组合并写回快照。
+"""
+import mmap
+import os
+import struct
+import sys
+import traceback
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# 坐标版本号（单行表），由触发器维护
+_CREATE_STATE = (
+    "CREATE TABLE IF NOT EXISTS shop_index_state ("
+    "id INTEGER PRIMARY KEY CHECK (id = 1), position_version INTEGER NOT NULL DEFAULT 0)"
+)
+_INIT_STATE = "INSERT OR IGNORE INTO shop_index_state (id, position_version) VALUES (1, 0)"
+
+_BUMP = "UPDATE shop_index_state SET position_version = position_version + 1 WHERE id = 1;"
+
+_STATE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_position_version_insert AFTER INSERT ON button_shops
+       WHEN NEW.is_active = 1
+       BEGIN {_BUMP} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_position_version_delete AFTER DELETE ON button_shops
+       WHEN OLD.is_active = 1
+       BEGIN {_BUMP} END""",
+    # 交易结算语句的 SET 中包含 is_active，值未变化时不递增
+    f"""CREATE TRIGGER IF NOT EXISTS trg_position_version_update AFTER UPDATE OF is_active, x, y, z, dimension ON button_shops
+       WHEN OLD.is_active IS NOT NEW.is_active OR OLD.x IS NOT NEW.x OR OLD.y IS NOT NEW.y
+            OR OLD.z IS NOT NEW.z OR OLD.dimension IS NOT NEW.dimension
+       BEGIN {_BUMP} END""",
+)
+
+# 快照格式（小端）：文件头 magic、坐标版本号、维度数；每个维度一条目录（名称、数量、数组偏移）；
+# 数组按 8 字节对齐，键数组之后紧跟 id 数组
+_MAGIC = b"ARCSPIX1"
+_HEADER = struct.Struct("<8sQI")
+_DIR_ENTRY = struct.Struct("<QQ")  # (数量, 键数组偏移)，前面是 <H 名称长度 + UTF-8 名称
+
+# 键：x、z 各 26 位，y 12 位（覆盖 ±3355 万与 -2048~2047，超出范围的坐标不进入索引）
+_XZ_OFFSET = 1 << 25
+_Y_OFFSET = 1 << 11
+
+
+def _pack(x: int, y: int, z: int) -> Optional[int]:
+    if -_XZ_OFFSET <= x < _XZ_OFFSET and -_XZ_OFFSET <= z < _XZ_OFFSET and -_Y_OFFSET <= y < _Y_OFFSET:
+        return ((x + _XZ_OFFSET) << 38) | ((z + _XZ_OFFSET) << 12) | (y + _Y_OFFSET)
+    return None
+
+
+class PositionIndex:
+    """
+    坐标索引。
+    依赖插件实例以使用 _safe_log 与 db_manager；需在 schema 迁移完成后调用 load()。
+    """
+
+    # lookup 对无法打包的坐标返回该值，调用方需自行查询数据库
+    UNKNOWN = -1
+
+    def __init__(self, plugin: Any, snapshot_path: str):
+        """
+        :param plugin: 插件实例
+        :param snapshot_path: 快照文件路径
+        """
+        self._plugin = plugin
+        self._path = Path(snapshot_path)
+        # 维度 -> (键数组, id 数组)；数组为 array 或映射快照得到的 memoryview
+        self._base: Dict[str, Tuple[Any, Any]] = {}
+        # 运行期间的变化：(维度, 键) -> 商店 id，0 表示该坐标的商店已移除
+        self._overlay: Dict[Tuple[str, int], int] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._loaded_version = -1
+        self.from_snapshot = False
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def _db(self):
+        return self._plugin.db_manager
+
+    @staticmethod
+    def create(cursor) -> None:
+        """在迁移事务中创建版本号表与触发器"""
+        cursor.execute(_CREATE_STATE)
+        cursor.execute(_INIT_STATE)
+        for sql in _STATE_TRIGGERS:
+            cursor.execute(sql)
+
+    def _read_version(self) -> int:
+        row = self._db.query_one("SELECT position_version FROM shop_index_state WHERE id = 1")
+        return row["position_version"] if row else 0
+
+    def load(self) -> None:
+        """启动时调用：快照有效则映射快照，否则从数据库重建并写入快照"""
+        version = self._read_version()
+        if self._load_snapshot(version):
+            self.from_snapshot = True
+            self._log('info', f"[ARCButtonShop] Position index loaded from snapshot: {len(self)} shops")
+            return
+        self.rebuild()
+
+    def rebuild(self) -> int:
+        """全表扫描活跃商店重建索引并写入快照，返回索引中的商店数量"""
+        self._close_mmap()
+        version = self._read_version()
+        entries: Dict[str, list] = {}
+        skipped = 0
+        for row in self._db.iter_query(
+            "SELECT id, x, y, z, dimension FROM button_shops WHERE is_active = 1", chunk_size=2000
+        ):
+            key = _pack(row["x"], row["y"], row["z"])
+            if key is None:
+                skipped += 1
+                continue
+            entries.setdefault(row["dimension"], []).append((key, row["id"]))
+        self._base = {}
+        for dimension, pairs in entries.items():
+            pairs.sort()
+            self._base[dimension] = (array("Q", [p[0] for p in pairs]), array("q", [p[1] for p in pairs]))
+        self._overlay = {}
+        self.from_snapshot = False
+        if skipped:
+            self._log('warning', f"[ARCButtonShop] {skipped} shops are outside the position index range")
+        self._write_snapshot(version)
+        self._log('info', f"[ARCButtonShop] Position index rebuilt: {len(self)} shops")
+        return len(self)
+
+    def __len__(self) -> int:
+        count = sum(len(keys) for keys, _ in self._base.values())
+        for (dimension, key), shop_id in self._overlay.items():
+            in_base = self._base_lookup(dimension, key) is not None
+            if shop_id and not in_base:
+                count += 1
+            elif not shop_id and in_base:
+                count -= 1
+        return count
+
+    def _base_lookup(self, dimension: str, key: int) -> Optional[int]:
+        arrays = self._base.get(dimension)
+        if arrays is None:
+            return None
+        keys, ids = arrays
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return ids[index]
+        return None
+
+    def lookup(self, x: int, y: int, z: int, dimension: str) -> Optional[int]:
+        """
+        查询坐标上的活跃商店
+        :return: 商店 id；没有商店时为 None；坐标超出索引范围时为 UNKNOWN
+        """
+        key = _pack(x, y, z)
+        if key is None:
+            return self.UNKNOWN
+        shop_id = self._overlay.get((dimension, key))
+        if shop_id is not None:
+            return shop_id or None
+        return self._base_lookup(dimension, key)
+
+    def update_shop(self, shop_data: Optional[Dict[str, Any]]) -> None:
+        """商店新增或写入后调用：按 is_active 加入或移出索引"""
+        if not shop_data:
+            return
+        key = _pack(shop_data["x"], shop_data["y"], shop_data["z"])
+        if key is not None:
+            self._overlay[(shop_data["dimension"], key)] = shop_data["id"] if shop_data["is_active"] else 0
+
+    def remove_shop(self, shop_data: Dict[str, Any]) -> None:
+        """商店删除后调用"""
+        key = _pack(shop_data["x"], shop_data["y"], shop_data["z"])
+        if key is not None:
+            self._overlay[(shop_data["dimension"], key)] = 0
+
+    def clear(self) -> None:
+        """清空全部商店数据后调用"""
+        self._close_mmap()
+        self._base = {}
+        self._overlay = {}
+
+    def save(self) -> None:
+        """插件关闭时调用：把运行期间的变化合并进基础数组并写入快照"""
+        try:
+            version = self._read_version()
+            if not self._overlay and version == self._loaded_version:
+                self._close_mmap()
+                return
+            merged: Dict[str, Tuple[array, array]] = {}
+            changes: Dict[str, Dict[int, int]] = {}
+            for (dimension, key), shop_id in self._overlay.items():
+                changes.setdefault(dimension, {})[key] = shop_id
+            for dimension in set(self._base) | set(changes):
+                keys, ids = self._base.get(dimension, ((), ()))
+                dimension_changes = changes.get(dimension)
+                if not dimension_changes:
+                    merged[dimension] = (array("Q", keys), array("q", ids))
+                    continue
+                pairs = {key: shop_id for key, shop_id in zip(keys, ids)}
+                for key, shop_id in dimension_changes.items():
+                    if shop_id:
+                        pairs[key] = shop_id
+                    else:
+                        pairs.pop(key, None)
+                ordered = sorted(pairs)
+                merged[dimension] = (array("Q", ordered), array("q", [pairs[key] for key in ordered]))
+            # 先释放映射再覆盖文件（Windows 不允许替换已映射的文件）
+            self._close_mmap()
+            self._base = merged
+            self._overlay = {}
+            self._write_snapshot(version)
+        except Exception as e:
+            self._log('error', f"[ARCButtonShop] Save position index snapshot error: {str(e)}\n{traceback.format_exc()}")
+
+    def _close_mmap(self) -> None:
+        if self._mmap is None:
+            return
+        # 映射上的 memoryview 必须先释放，mmap 才能关闭
+        base = self._base
+        self._base = {}
+        for dimension, (keys, ids) in base.items():
+            if isinstance(keys, memoryview):
+                base[dimension] = (array("Q", keys), array("q", ids))
+                keys.release()
+                ids.release()
+        self._base = base
+        self._mmap.close()
+        self._mmap = None
+
+    def _write_snapshot(self, version: int) -> None:
+        if sys.byteorder != "little":
+            return
+        directory = b""
+        layout = []
+        for dimension, (keys, ids) in self._base.items():
+            name = dimension.encode("utf-8")
+            layout.append((name, keys, ids))
+        # 目录大小确定后计算数组偏移（8 字节对齐）
+        directory_size = sum(2 + len(name) + _DIR_ENTRY.size for name, _, _ in layout)
+        offset = _HEADER.size + directory_size
+        offset += -offset % 8
+        data_start = offset
+        for name, keys, ids in layout:
+            directory += struct.pack("<H", len(name)) + name + _DIR_ENTRY.pack(len(keys), offset)
+            offset += 16 * len(keys)
+        tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, version, len(layout)))
+            f.write(directory)
+            f.write(b"\0" * (data_start - _HEADER.size - len(directory)))
+            for _, keys, ids in layout:
+                f.write(keys.tobytes() if isinstance(keys, array) else bytes(keys))
+                f.write(ids.tobytes() if isinstance(ids, array) else bytes(ids))
+        os.replace(tmp_path, self._path)
+        self._loaded_version = version
+
+    def _load_snapshot(self, version: int) -> bool:
+        if sys.byteorder != "little" or not self._path.exists():
+            return False
+        mapped = None
+        view = None
+        base = {}
+        try:
+            with open(self._path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < _HEADER.size:
+                    return False
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, snapshot_version, dimension_count = _HEADER.unpack_from(mapped, 0)
+            if magic != _MAGIC or snapshot_version != version:
+                mapped.close()
+                return False
+            view = memoryview(mapped)
+            position = _HEADER.size
+            for _ in range(dimension_count):
+                (name_length,) = struct.unpack_from("<H", mapped, position)
+                position += 2
+                name = bytes(mapped[position:position + name_length]).decode("utf-8")
+                position += name_length
+                count, offset = _DIR_ENTRY.unpack_from(mapped, position)
+                position += _DIR_ENTRY.size
+                if offset % 8 or offset + 16 * count > size:
+                    raise ValueError("corrupt snapshot directory")
+                keys = view[offset:offset + 8 * count].cast("Q")
+                ids = view[offset + 8 * count:offset + 16 * count].cast("q")
+                base[name] = (keys, ids)
+            view.release()
+        except Exception as e:
+            self._log('warning', f"[ARCButtonShop] Position index snapshot unreadable, rebuilding: {str(e)}")
+            # 先释放映射上的全部 memoryview，mmap 才能关闭（否则映射与其文件句柄一直占用）
+            for keys, ids in base.values():
+                keys.release()
+                ids.release()
+            if view is not None:
+                view.release()
+            if mapped is not None:
+                mapped.close()
+            return False
+        self._base = base
+        self._overlay = {}
+        self._mmap = mapped
+        self._loaded_version = version
+        return True
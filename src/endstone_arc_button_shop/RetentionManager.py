@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+交易记录保留任务：定期把过期的 shop_transactions 明细汇总进按天统计表 shop_transaction_daily，
+再分批归档（写入独立的归档库）或删除明细，最后执行增量 VACUUM 回收空间。
+每个调度任务只处理一批，批与批之间让出服务器 tick，避免一次清理大量数据造成卡顿。
+"""
+import datetime
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# 分批选取过期明细（按时间顺序、固定上限），同一事务内的三条语句共用该子查询
+_BATCH_SUBQUERY = (
+    "SELECT id FROM shop_transactions WHERE transaction_time < ? "
+    "ORDER BY transaction_time, id LIMIT ?"
+)
+
+_TRANSACTION_COLUMNS = (
+    "id, shop_id, buyer_xuid, buyer_name, quantity, unit_price, total_price, transaction_time"
+)
+
+
+class RetentionManager:
+    """
+    交易记录保留/汇总/归档任务。
+    依赖插件实例以使用 _safe_log、setting_manager、db_manager 与 server.scheduler。
+    """
+
+    TICKS_PER_MINUTE = 20 * 60
+
+    def __init__(self, plugin: Any, archive_path: str):
+        """
+        :param plugin: 插件实例
+        :param archive_path: 归档数据库文件路径（仅在启用归档时创建）
+        """
+        self._plugin = plugin
+        self._archive_path = archive_path
+        self._archive_attached = False
+        self._running = False
+        self._stats: Dict[str, int] = {}
+        self._on_done: Optional[Callable[[Dict[str, int]], None]] = None
+        self._vacuum_running = False
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def _db(self):
+        return self._plugin.db_manager
+
+    def _get_int_setting(self, key: str, default: int) -> int:
+        try:
+            value = self._plugin.setting_manager.GetSetting(key)
+            return int(value) if value is not None else default
+        except (TypeError, ValueError):
+            return default
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        """注册周期任务（间隔由 transaction_retention_interval_minutes 决定，0 表示不自动运行）"""
+        if not self.is_incremental_vacuum():
+            # PRAGMA auto_vacuum 对已有数据库无效：不切换的话删除明细后空间不会被回收
+            self._log(
+                "warning",
+                "[ARCButtonShop] Database is not in incremental auto_vacuum mode; retention cannot reclaim "
+                "free pages. Run '/shopmanage vacuum confirm' while the server is idle to convert it once.",
+            )
+        interval_minutes = self._get_int_setting("transaction_retention_interval_minutes", 60)
+        if interval_minutes <= 0:
+            self._log("info", "[ARCButtonShop] Transaction retention job disabled")
+            return
+        period = interval_minutes * self.TICKS_PER_MINUTE
+        self._plugin.server.scheduler.run_task(
+            self._plugin, lambda: self.start_pass(), delay=period, period=period
+        )
+
+    def start_pass(self, on_done: Optional[Callable[[Dict[str, int]], None]] = None) -> bool:
+        """
+        开始一轮清理；每批通过调度器在后续 tick 中执行
+        :param on_done: 本轮结束时的回调，参数为统计信息
+        :return: 是否成功开始（已有清理在进行时返回 False）
+        """
+        if self._running:
+            return False
+        retention_days = self._get_int_setting("transaction_retention_days", 30)
+        if retention_days <= 0:
+            return False
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+        self._running = True
+        self._on_done = on_done
+        self._stats = {"batches": 0, "rows": 0, "daily_purged": 0, "vacuum_pages": 0}
+        self._run_batch(cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+        return True
+
+    def _schedule_next_batch(self, cutoff: str) -> None:
+        delay = max(1, self._get_int_setting("transaction_retention_batch_delay_ticks", 20))
+        self._plugin.server.scheduler.run_task(
+            self._plugin, lambda: self._run_batch(cutoff), delay=delay
+        )
+
+    def _run_batch(self, cutoff: str) -> None:
+        """处理一批过期明细：汇总 → 归档（可选）→ 删除，三步同一事务"""
+        try:
+            batch_size = max(1, self._get_int_setting("transaction_retention_batch_size", 500))
+            archive = self._get_int_setting("transaction_archive_enabled", 0) != 0
+            if archive:
+                self._ensure_archive_attached()
+            params = (cutoff, batch_size)
+            with self._db.transaction() as cursor:
+                cursor.execute(
+                    f"""INSERT INTO shop_transaction_daily (shop_id, day, trade_count, total_quantity, total_price)
+                        SELECT shop_id, substr(transaction_time, 1, 10), COUNT(*), SUM(quantity), SUM(total_price)
+                        FROM shop_transactions WHERE id IN ({_BATCH_SUBQUERY})
+                        GROUP BY shop_id, substr(transaction_time, 1, 10)
+                        ON CONFLICT(shop_id, day) DO UPDATE SET
+                            trade_count = trade_count + excluded.trade_count,
+                            total_quantity = total_quantity + excluded.total_quantity,
+                            total_price = total_price + excluded.total_price""",
+                    params,
+                )
+                if archive:
+                    cursor.execute(
+                        f"INSERT OR IGNORE INTO archive.shop_transactions ({_TRANSACTION_COLUMNS}) "
+                        f"SELECT {_TRANSACTION_COLUMNS} FROM main.shop_transactions WHERE id IN ({_BATCH_SUBQUERY})",
+                        params,
+                    )
+                cursor.execute(
+                    f"DELETE FROM shop_transactions WHERE id IN ({_BATCH_SUBQUERY})",
+                    params,
+                )
+                removed = cursor.rowcount
+            self._stats["batches"] += 1
+            self._stats["rows"] += max(0, removed)
+            if removed >= batch_size:
+                self._schedule_next_batch(cutoff)
+            else:
+                self._finish_pass()
+        except Exception as e:
+            self._log(
+                "error",
+                f"[ARCButtonShop] Transaction retention batch error: {str(e)}\n{traceback.format_exc()}",
+            )
+            self._finish_pass()
+
+    def _finish_pass(self) -> None:
+        """清理按天统计表中的过期数据并执行增量 VACUUM"""
+        try:
+            daily_days = self._get_int_setting("transaction_daily_retention_days", 0)
+            if daily_days > 0:
+                day_cutoff = (datetime.date.today() - datetime.timedelta(days=daily_days)).isoformat()
+                with self._db.transaction() as cursor:
+                    cursor.execute("DELETE FROM shop_transaction_daily WHERE day < ?", (day_cutoff,))
+                    self._stats["daily_purged"] = max(0, cursor.rowcount)
+            if self._stats["rows"] or self._stats["daily_purged"]:
+                self._stats["vacuum_pages"] = self._incremental_vacuum()
+            self._log(
+                "info",
+                f"[ARCButtonShop] Transaction retention done: {self._stats['rows']} rows in "
+                f"{self._stats['batches']} batches, {self._stats['daily_purged']} daily rows purged, "
+                f"{self._stats['vacuum_pages']} pages vacuumed",
+            )
+        except Exception as e:
+            self._log("error", f"[ARCButtonShop] Transaction retention finish error: {str(e)}")
+        finally:
+            self._running = False
+            on_done, self._on_done = self._on_done, None
+            if on_done:
+                try:
+                    on_done(dict(self._stats))
+                except Exception as e:
+                    self._log("error", f"[ARCButtonShop] Transaction retention callback error: {str(e)}")
+
+    def is_incremental_vacuum(self) -> bool:
+        """数据库是否处于 INCREMENTAL auto_vacuum 模式（PRAGMA auto_vacuum = 2）"""
+        # PRAGMA auto_vacuum 读的是本连接缓存的文件头，先做一次读取使其感知写线程刚完成的 VACUUM
+        self._db.query_one("SELECT 1 FROM sqlite_master LIMIT 1")
+        row = self._db.query_one("PRAGMA auto_vacuum")
+        return bool(row) and int(row["auto_vacuum"]) == 2
+
+    def _incremental_vacuum(self) -> int:
+        """数据库处于 INCREMENTAL auto_vacuum 模式时回收至多 N 页空闲页，返回回收的页数"""
+        if not self.is_incremental_vacuum():
+            return 0
+        free = self._db.query_one("PRAGMA freelist_count")
+        free_pages = int(free["freelist_count"]) if free else 0
+        if free_pages <= 0:
+            return 0
+        pages = max(1, self._get_int_setting("transaction_retention_vacuum_pages", 1000))
+        cursor = self._db.connection.cursor()
+        # incremental_vacuum 需要逐行 step 才会真正执行完
+        cursor.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+        return min(free_pages, pages)
+
+    def _ensure_archive_attached(self) -> None:
+        """将归档库 ATTACH 到当前连接，并确保归档表存在"""
+        if self._archive_attached:
+            return
+        archive_file = Path(self._archive_path)
+        if not archive_file.parent.exists():
+            archive_file.parent.mkdir(parents=True)
+        self._db.execute("ATTACH DATABASE ? AS archive", (str(archive_file),))
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS archive.shop_transactions (
+                id INTEGER PRIMARY KEY,
+                shop_id INTEGER NOT NULL,
+                buyer_xuid TEXT NOT NULL,
+                buyer_name TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                unit_price REAL NOT NULL,
+                total_price REAL NOT NULL,
+                transaction_time TEXT NOT NULL
+            )"""
+        )
+        self._archive_attached = True
+
+    @property
+    def is_vacuum_running(self) -> bool:
+        return self._vacuum_running
+
+    def start_vacuum_conversion(self, on_done: Callable[[bool], None]) -> bool:
+        """
+        把已有数据库切换到 INCREMENTAL auto_vacuum（需要一次完整 VACUUM，耗时与库大小成正比）。
+        提交到数据库写线程执行，期间其他写操作排队等待，主线程不阻塞；执行器未启动时在当前线程同步执行。
+        :param on_done: 主线程中接收是否成功的回调
+        :return: 是否已提交（已有转换在进行时返回 False）
+        """
+        if self._vacuum_running:
+            return False
+        self._vacuum_running = True
+
+        def finish(success: bool) -> None:
+            self._vacuum_running = False
+            on_done(success)
+
+        def on_error(error: BaseException) -> None:
+            self._log("error", f"[ARCButtonShop] Convert to incremental vacuum error: {str(error)}")
+            finish(False)
+
+        self._plugin.db_executor.submit_write(self._convert_to_incremental_vacuum, finish, on_error)
+        return True
+
+    @staticmethod
+    def _convert_to_incremental_vacuum(db: Any) -> bool:
+        """在写线程的连接上设置 auto_vacuum 后执行完整 VACUUM（两步必须在同一连接上）"""
+        if not db.execute("PRAGMA auto_vacuum = INCREMENTAL"):
+            return False
+        return db.execute("VACUUM")
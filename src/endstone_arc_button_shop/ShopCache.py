@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+已加载区块的商店缓存：区块加载时把区块内的活跃商店读入内存，卸载时移除。
+按钮交互、破坏保护与附近商店查询在已加载区块内直接命中内存，不访问数据库。
+写操作后由插件调用 refresh_shop / reload_chunk / remove_shop 保持缓存与数据库一致。
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+ChunkKey = Tuple[str, int, int]  # (dimension, chunk_x, chunk_z)
+Position = Tuple[int, int, int]
+
+
+class ShopCache:
+    """
+    区块级商店缓存。
+    依赖插件实例以使用 _safe_log、db_manager 与 CHUNK_SIZE。
+    缓存中的商店 dict 为共享对象，调用方不得修改。
+    """
+
+    def __init__(self, plugin: Any):
+        """
+        :param plugin: 插件实例
+        """
+        self._plugin = plugin
+        self._chunks: Dict[ChunkKey, Dict[Position, Dict[str, Any]]] = {}
+        # 存在活跃商店的区块（来自触发器维护的 chunk_index），不在其中的区块加载时无需查库
+        self._shop_chunks: Set[ChunkKey] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def _db(self):
+        return self._plugin.db_manager
+
+    def _chunk_key(self, x: int, z: int, dimension: str) -> ChunkKey:
+        chunk_size = self._plugin.CHUNK_SIZE
+        return dimension, x // chunk_size, z // chunk_size
+
+    def load_shop_chunks(self) -> None:
+        """从 chunk_index 读取所有可能存在商店的区块"""
+        rows = self._db.query_all(
+            "SELECT dimension, chunk_x, chunk_z FROM chunk_index WHERE shop_count > 0"
+        )
+        self._shop_chunks = {(row["dimension"], row["chunk_x"], row["chunk_z"]) for row in rows}
+
+    def rebuild(self) -> None:
+        """chunk_index 重建后调用：重新读取含商店的区块集合与所有已缓存区块"""
+        self.load_shop_chunks()
+        for key in list(self._chunks):
+            self.load_chunk(*key)
+
+    def is_chunk_loaded(self, dimension: str, chunk_x: int, chunk_z: int) -> bool:
+        return (dimension, chunk_x, chunk_z) in self._chunks
+
+    def load_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> None:
+        """区块加载：读取区块内的活跃商店"""
+        key = (dimension, chunk_x, chunk_z)
+        shops: Dict[Position, Dict[str, Any]] = {}
+        if key in self._shop_chunks:
+            rows = self._db.query_all_named("shops_in_chunk", key)
+            for row in rows:
+                shops[(row["x"], row["y"], row["z"])] = row
+        self._chunks[key] = shops
+
+    def unload_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> None:
+        """区块卸载：移除缓存"""
+        self._chunks.pop((dimension, chunk_x, chunk_z), None)
+
+    def reload_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> None:
+        """区块内新增商店后调用：标记区块含商店，若已缓存则重新读取"""
+        key = (dimension, chunk_x, chunk_z)
+        self._shop_chunks.add(key)
+        if key in self._chunks:
+            self.load_chunk(*key)
+
+    def get_shop_at(self, x: int, y: int, z: int, dimension: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        查询缓存
+        :return: (是否命中已缓存区块, 商店或 None)；未命中时调用方需自行查询数据库
+        """
+        shops = self._chunks.get(self._chunk_key(x, z, dimension))
+        if shops is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, shops.get((x, y, z))
+
+    def get_chunk_shops(self, dimension: str, chunk_x: int, chunk_z: int) -> Optional[List[Dict[str, Any]]]:
+        """返回已缓存区块内的活跃商店列表；区块未缓存时返回 None"""
+        shops = self._chunks.get((dimension, chunk_x, chunk_z))
+        if shops is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(shops.values())
+
+    def refresh_shop(self, shop_id: int) -> None:
+        """商店数据更新后调用：从数据库重新读取该商店并更新所在区块的缓存"""
+        self.update_shop(self._db.query_one_named("shop_by_id", (shop_id,)))
+
+    def update_shop(self, row: Optional[Dict[str, Any]]) -> None:
+        """用调用方已读取的最新商店行更新所在区块的缓存"""
+        if not row:
+            return
+        shops = self._chunks.get((row["dimension"], row["chunk_x"], row["chunk_z"]))
+        if shops is None:
+            return
+        position = (row["x"], row["y"], row["z"])
+        if row["is_active"]:
+            shops[position] = row
+        else:
+            shops.pop(position, None)
+
+    def remove_shop(self, shop_data: Dict[str, Any]) -> None:
+        """商店删除后调用"""
+        shops = self._chunks.get((shop_data["dimension"], shop_data["chunk_x"], shop_data["chunk_z"]))
+        if shops is not None:
+            shops.pop((shop_data["x"], shop_data["y"], shop_data["z"]), None)
+
+    def clear(self) -> None:
+        """清空全部商店数据后调用（保留已加载区块，视为无商店）"""
+        for key in self._chunks:
+            self._chunks[key] = {}
+        self._shop_chunks.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "loaded_chunks": len(self._chunks),
+            "cached_shops": sum(len(shops) for shops in self._chunks.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+商店空间索引：由 button_shops 上的触发器维护的区块计数表 chunk_index 与 R-tree 坐标表 shop_rtree。
+两者都只包含活跃商店；任何写入 button_shops 的路径（包括直接执行的 SQL）都会自动同步，
+不再需要在 Python 中读出计数再写回。表与触发器由 schema 迁移创建（见 MigrationManager），
+已有数据库可通过 rebuild()（/shopmanage reindex）一次性重建。
+SQLite 未编译 R-tree 模块时只维护 chunk_index，范围查询退回到坐标 B-tree 索引。
+"""
+import sqlite3
+from typing import Any, Iterator
+
+from .DatabaseManager import Record
+
+# R-tree 使用 32 位整数坐标（方块坐标为整数，避免浮点 R-tree 的精度损失）；维度为附加列
+_CREATE_RTREE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS shop_rtree USING rtree_i32("
+    "id, min_x, max_x, min_y, max_y, min_z, max_z, +dimension)"
+)
+
+# chunk_index：活跃商店加入区块时计数加 1（ON CONFLICT 合并），离开时减 1，减到 0 删除该行
+_CHUNK_INDEX_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_chunk_index_insert AFTER INSERT ON button_shops
+       WHEN NEW.is_active = 1
+       BEGIN
+           INSERT INTO chunk_index (chunk_x, chunk_z, dimension, shop_count)
+           VALUES (NEW.chunk_x, NEW.chunk_z, NEW.dimension, 1)
+           ON CONFLICT(chunk_x, chunk_z, dimension) DO UPDATE SET shop_count = shop_count + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_chunk_index_delete AFTER DELETE ON button_shops
+       WHEN OLD.is_active = 1
+       BEGIN
+           UPDATE chunk_index SET shop_count = shop_count - 1
+           WHERE chunk_x = OLD.chunk_x AND chunk_z = OLD.chunk_z AND dimension = OLD.dimension;
+           DELETE FROM chunk_index
+           WHERE chunk_x = OLD.chunk_x AND chunk_z = OLD.chunk_z AND dimension = OLD.dimension AND shop_count <= 0;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_chunk_index_update_old AFTER UPDATE OF is_active, chunk_x, chunk_z, dimension ON button_shops
+       WHEN OLD.is_active = 1 AND (NEW.is_active != 1 OR NEW.chunk_x != OLD.chunk_x
+                                   OR NEW.chunk_z != OLD.chunk_z OR NEW.dimension != OLD.dimension)
+       BEGIN
+           UPDATE chunk_index SET shop_count = shop_count - 1
+           WHERE chunk_x = OLD.chunk_x AND chunk_z = OLD.chunk_z AND dimension = OLD.dimension;
+           DELETE FROM chunk_index
+           WHERE chunk_x = OLD.chunk_x AND chunk_z = OLD.chunk_z AND dimension = OLD.dimension AND shop_count <= 0;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_chunk_index_update_new AFTER UPDATE OF is_active, chunk_x, chunk_z, dimension ON button_shops
+       WHEN NEW.is_active = 1 AND (OLD.is_active != 1 OR NEW.chunk_x != OLD.chunk_x
+                                   OR NEW.chunk_z != OLD.chunk_z OR NEW.dimension != OLD.dimension)
+       BEGIN
+           INSERT INTO chunk_index (chunk_x, chunk_z, dimension, shop_count)
+           VALUES (NEW.chunk_x, NEW.chunk_z, NEW.dimension, 1)
+           ON CONFLICT(chunk_x, chunk_z, dimension) DO UPDATE SET shop_count = shop_count + 1;
+       END""",
+)
+
+# shop_rtree：只保存活跃商店的坐标
+_RTREE_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_shop_rtree_insert AFTER INSERT ON button_shops
+       WHEN NEW.is_active = 1
+       BEGIN
+           INSERT OR REPLACE INTO shop_rtree (id, min_x, max_x, min_y, max_y, min_z, max_z, dimension)
+           VALUES (NEW.id, NEW.x, NEW.x, NEW.y, NEW.y, NEW.z, NEW.z, NEW.dimension);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_shop_rtree_delete AFTER DELETE ON button_shops
+       BEGIN
+           DELETE FROM shop_rtree WHERE id = OLD.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_shop_rtree_update AFTER UPDATE OF is_active, x, y, z, dimension ON button_shops
+       BEGIN
+           DELETE FROM shop_rtree WHERE id = OLD.id;
+           INSERT INTO shop_rtree (id, min_x, max_x, min_y, max_y, min_z, max_z, dimension)
+           SELECT NEW.id, NEW.x, NEW.x, NEW.y, NEW.y, NEW.z, NEW.z, NEW.dimension WHERE NEW.is_active = 1;
+       END""",
+)
+
+_REBUILD_CHUNK_INDEX = (
+    "INSERT INTO chunk_index (chunk_x, chunk_z, dimension, shop_count) "
+    "SELECT chunk_x, chunk_z, dimension, COUNT(*) FROM button_shops WHERE is_active = 1 "
+    "GROUP BY chunk_x, chunk_z, dimension"
+)
+
+_REBUILD_RTREE = (
+    "INSERT INTO shop_rtree (id, min_x, max_x, min_y, max_y, min_z, max_z, dimension) "
+    "SELECT id, x, x, y, y, z, z, dimension FROM button_shops WHERE is_active = 1"
+)
+
+
+class ShopIndex:
+    """
+    空间索引管理。
+    依赖插件实例以使用 _safe_log 与 db_manager；迁移完成后调用 detect() 确定是否可用 R-tree。
+    """
+
+    def __init__(self, plugin: Any):
+        """
+        :param plugin: 插件实例
+        """
+        self._plugin = plugin
+        self.has_rtree = False
+
+    def _log(self, level: str, message: str) -> None:
+        if hasattr(self._plugin, "_safe_log") and self._plugin._safe_log:
+            self._plugin._safe_log(level, message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    @property
+    def _db(self):
+        return self._plugin.db_manager
+
+    def create(self, cursor) -> None:
+        """
+        在调用方的事务中创建 R-tree 表与触发器，并根据现有商店重建索引（由 schema 迁移调用一次）
+        :param cursor: 迁移事务中的游标
+        """
+        try:
+            cursor.execute(_CREATE_RTREE)
+            self.has_rtree = True
+        except sqlite3.OperationalError as e:
+            self.has_rtree = False
+            self._log("warning", f"[ARCButtonShop] SQLite R-tree module unavailable, using B-tree range queries: {str(e)}")
+        for sql in _CHUNK_INDEX_TRIGGERS:
+            cursor.execute(sql)
+        if self.has_rtree:
+            for sql in _RTREE_TRIGGERS:
+                cursor.execute(sql)
+        chunk_count, shop_count = self._rebuild(cursor)
+        self._log("info", f"[ARCButtonShop] Shop index built: {chunk_count} chunks, {shop_count} shops")
+
+    def detect(self) -> None:
+        """启动时检查 R-tree 表是否存在（迁移已完成时不再执行任何建表语句）"""
+        self.has_rtree = self._db.query_one(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'shop_rtree'"
+        ) is not None
+
+    def rebuild(self) -> tuple:
+        """
+        以 GROUP BY 一次性重建 chunk_index（及 shop_rtree），用于修复旧数据库中漂移的计数
+        :return: (区块数, R-tree 商店数)
+        """
+        with self._db.transaction() as cursor:
+            return self._rebuild(cursor)
+
+    def _rebuild(self, cursor) -> tuple:
+        cursor.execute("DELETE FROM chunk_index")
+        cursor.execute(_REBUILD_CHUNK_INDEX)
+        chunk_count = max(0, cursor.rowcount)
+        shop_count = 0
+        if self.has_rtree:
+            cursor.execute("DELETE FROM shop_rtree")
+            cursor.execute(_REBUILD_RTREE)
+            shop_count = max(0, cursor.rowcount)
+        return chunk_count, shop_count
+
+    def iter_box(self, dimension: str, min_x: int, min_y: int, min_z: int,
+                 max_x: int, max_y: int, max_z: int) -> Iterator[Record]:
+        """逐条生成长方体范围内（含边界）的活跃商店 Record"""
+        if self.has_rtree:
+            return self._db.iter_query(
+                "SELECT s.* FROM shop_rtree r JOIN button_shops s ON s.id = r.id "
+                "WHERE r.min_x >= ? AND r.max_x <= ? AND r.min_y >= ? AND r.max_y <= ? "
+                "AND r.min_z >= ? AND r.max_z <= ? AND r.dimension = ? AND s.is_active = 1",
+                (min_x, max_x, min_y, max_y, min_z, max_z, dimension)
+            )
+        return self._db.iter_query(
+            "SELECT * FROM button_shops WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ? AND z BETWEEN ? AND ? "
+            "AND dimension = ? AND is_active = 1",
+            (min_x, max_x, min_y, max_y, min_z, max_z, dimension)
+        )
@@ -2,17 +2,85 @@ import datetime
 import os
 import json
 import math
+import time
 
 from endstone.command import Command, CommandSender
-from endstone.event import event_handler, PlayerInteractEvent, BlockBreakEvent
+from endstone.event import (
+    event_handler, PlayerInteractEvent, BlockBreakEvent, ChunkLoadEvent, ChunkUnloadEvent, PlayerQuitEvent,
+    PlayerDropItemEvent, PlayerPickupItemEvent, PlayerItemConsumeEvent, PlayerDeathEvent, BlockPlaceEvent
+)
 from endstone.plugin import Plugin
 from endstone.form import ActionForm, ModalForm, Label, TextInput
 from endstone.block import Block
 
+from .DatabaseExecutor import DatabaseExecutor
 from .DatabaseManager import DatabaseManager
+from .ExportManager import ExportManager, EXPORT_TARGETS
 from .InventoryManager import InventoryManager
 from .LanguageManager import LanguageManager
+from .MigrationManager import MigrationManager
+from .PerformanceMonitor import PerformanceMonitor
+from .PositionIndex import PositionIndex
+from .RetentionManager import RetentionManager
 from .SettingManager import SettingManager
+from .ShopCache import ShopCache
+from .ShopIndex import ShopIndex
+
+# 按钮方块类型 id（可通过配置 extra_button_types 追加，逗号分隔）
+BUTTON_BLOCK_TYPES = frozenset({
+    "minecraft:wooden_button", "minecraft:stone_button", "minecraft:birch_button",
+    "minecraft:spruce_button", "minecraft:jungle_button", "minecraft:acacia_button",
+    "minecraft:dark_oak_button", "minecraft:mangrove_button", "minecraft:cherry_button",
+    "minecraft:bamboo_button", "minecraft:crimson_button", "minecraft:warped_button",
+    "minecraft:polished_blackstone_button", "minecraft:pale_oak_button",
+})
+
+# 商店列表面板只渲染的列（物品名与附魔/Lore 标记直接在 SQL 中从 item_data 提取，不读取整段 JSON 与 collected_items）
+SHOP_LIST_COLUMNS = (
+    "id, shop_type, is_infinite, owner_name, stock, unit_price, "
+    "json_extract(item_data, '$.name') AS item_name, "
+    "json_extract(item_data, '$.type_translation_key') AS type_translation_key, "
+    "json_extract(item_data, '$.custom_name') AS custom_name, "
+    "(json_extract(item_data, '$.enchants') NOT IN ('{}', '[]')) AS has_enchants, "
+    "(json_extract(item_data, '$.lore') NOT IN ('{}', '[]')) AS has_lore"
+)
+
+# 交易与查找热路径上的命名语句（只声明一次，由 DatabaseManager 以缓存游标执行）
+SHOP_STATEMENTS = {
+    "shop_by_pos": "SELECT * FROM button_shops WHERE x = ? AND y = ? AND z = ? AND dimension = ? AND is_active = 1",
+    "shop_by_id": "SELECT * FROM button_shops WHERE id = ?",
+    "shops_in_chunk": "SELECT * FROM button_shops WHERE dimension = ? AND chunk_x = ? AND chunk_z = ? AND is_active = 1",
+    # 交易先以条件更新预扣库存/预算，受影响行数为 0 表示余量不足（并发交易不会把库存扣成负数）
+    "reserve_stock": (
+        "UPDATE button_shops SET stock = stock - ?, revision = revision + 1 "
+        "WHERE id = ? AND is_active = 1 AND stock >= ?"
+    ),
+    "release_stock": "UPDATE button_shops SET stock = stock + ?, revision = revision + 1 WHERE id = ?",
+    "restock": "UPDATE button_shops SET stock = stock + ?, is_active = 1, revision = revision + 1 WHERE id = ?",
+    # 把一件收取失败的物品放回 collected_items 末尾
+    "return_collected_item": (
+        "UPDATE button_shops SET collected_items = json_insert("
+        "CASE WHEN json_valid(collected_items) THEN collected_items ELSE '[]' END, '$[#]', json(?)), "
+        "revision = revision + 1 WHERE id = ?"
+    ),
+    "settle_sell_purchase": (
+        "UPDATE button_shops SET stock = stock + ?, revision = revision + 1, "
+        "is_active = CASE WHEN stock + ? <= 0 THEN 0 ELSE is_active END, "
+        "last_purchase_time = ? WHERE id = ?"
+    ),
+    "settle_buy_purchase": (
+        "UPDATE button_shops SET collected_items = json_insert("
+        "CASE WHEN json_valid(collected_items) THEN collected_items ELSE '[]' END, '$[#]', json(?)), "
+        "revision = revision + 1, is_active = CASE WHEN stock < unit_price THEN 0 ELSE is_active END, "
+        "last_purchase_time = ? WHERE id = ?"
+    ),
+    "touch_purchase_time": "UPDATE button_shops SET last_purchase_time = ?, revision = revision + 1 WHERE id = ?",
+    "count_active_shops": "SELECT COUNT(*) AS count FROM button_shops WHERE is_active = 1",
+    "insert_transaction": (
+        "INSERT INTO shop_transactions (shop_id, buyer_xuid, buyer_name, quantity, unit_price, total_price, transaction_time) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    ),
+}
 
 
 class ARCButtonShopPlugin(Plugin):
@@ -28,7 +96,7 @@ class ARCButtonShopPlugin(Plugin):
         },
         "shopmanage": {
             "description": "Manage button shops, op only.",
-            "usages": ["/shopmanage"]
+            "usages": ["/shopmanage [action: str] [target: str] [value: str]"]
         }
     }
 
@@ -43,6 +111,14 @@ class ARCButtonShopPlugin(Plugin):
         super().__init__()
         self.setting_shop_player = {}  # 玩家名 -> 商店设置数据
         self.CHUNK_SIZE = 16  # 区块大小，用于优化查询
+        self.button_types = BUTTON_BLOCK_TYPES  # 识别为按钮的方块类型（on_load 时合并配置）
+        self.interact_events_rejected = 0  # 非按钮交互被快速过滤的次数
+        self.break_events_rejected = 0  # 非按钮破坏被快速过滤的次数
+        self.interact_events_debounced = 0  # 重复交互被防抖丢弃的次数
+        self.interact_debounce_seconds = 0.3  # 同一按钮重复交互的丢弃窗口（on_load 时读取配置）
+        self.form_open_timeout_seconds = 10.0  # 「表单已打开」状态的超时（防止未收到回调时一直阻塞）
+        self._last_interacts = {}  # 玩家名 -> (时间, 位置, 是否商店)
+        self._open_forms = {}  # 玩家名 -> (打开时间, 位置)，商店详情表单已发送且尚未响应
     
     def _safe_log(self, level: str, message: str):
         """
@@ -77,13 +153,60 @@ class ARCButtonShopPlugin(Plugin):
         
         # 初始化默认配置
         self._init_default_settings()
+        self._load_button_types()
+        self._load_interact_debounce_settings()
         
         # 初始化数据库管理器
         db_path = os.path.join("plugins", "ARCButtonShop", "button_shop.db")
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(db_path, log_func=self._safe_log)
+        self.db_manager.register_statements(SHOP_STATEMENTS)
+        if (self.setting_manager.GetSetting("slow_query_log_enabled") or "false").lower() == "true":
+            self.db_manager.enable_slow_query_log(
+                float(self.setting_manager.GetSetting("slow_query_threshold_ms") or "50"),
+                os.path.join("plugins", "ARCButtonShop", "logs", "slow_query.log")
+            )
+        
+        # 空间索引（chunk_index 与 R-tree 由触发器维护，表与触发器由迁移创建）
+        self.shop_index = ShopIndex(self)
+        
+        # 建表与 schema 迁移（按 user_version 只执行未应用的迁移）
+        self.migration_manager = MigrationManager(self)
+        self.migration_manager.migrate()
+        self.shop_index.detect()
+        
+        # 异步数据库执行器（写线程 + 读线程池，结果回到主线程；on_enable 时启动）
+        try:
+            reader_threads = int(self.setting_manager.GetSetting("db_reader_threads") or "2")
+        except ValueError:
+            reader_threads = 2
+        self.db_executor = DatabaseExecutor(self, reader_threads)
+        
+        # 交易记录保留任务（汇总/归档/删除过期明细）
+        archive_path = os.path.join("plugins", "ARCButtonShop", "button_shop_archive.db")
+        self.retention_manager = RetentionManager(self, archive_path)
+        
+        # 离线分析导出（后台线程写入 exports 目录）
+        self.export_manager = ExportManager(self, os.path.join("plugins", "ARCButtonShop", "exports"))
+        
+        # 已加载区块的商店缓存（区块加载/卸载事件维护）
+        self.shop_cache = None
+        if (self.setting_manager.GetSetting("shop_cache_enabled") or "true").lower() == "true":
+            self.shop_cache = ShopCache(self)
+            self.shop_cache.load_shop_chunks()
+        
+        # 活跃商店坐标索引（快照有效时直接映射，无需全表扫描）
+        self.position_index = None
+        if (self.setting_manager.GetSetting("position_index_enabled") or "true").lower() == "true":
+            self.position_index = PositionIndex(self, os.path.join("plugins", "ARCButtonShop", "shop_positions.idx"))
+            try:
+                self.position_index.load()
+            except Exception as e:
+                # 加载失败时不能留下空索引（会让所有商店"消失"），退回数据库查询
+                self._safe_log('error', f"[ARCButtonShop] Load position index error: {str(e)}")
+                self.position_index = None
         
-        # 创建商店相关表
-        self._create_shop_tables()
+        # 热路径耗时统计（需在 on_enable 注册事件前安装，事件回调才会被统计）
+        self._init_performance_monitor()
 
     def on_enable(self) -> None:
         self._safe_log('info', "[ARCButtonShop] on_enable is called!")
@@ -91,10 +214,25 @@ class ARCButtonShopPlugin(Plugin):
 
         # 初始化经济插件 - 检查 arc_core 优先，然后 umoney
         self._init_economy_plugin()
+        
+        # 启动交易记录保留任务
+        self.retention_manager.start()
+        
+        # 启动异步数据库执行器（关闭时所有操作在主线程同步执行）
+        if (self.setting_manager.GetSetting("db_async_enabled") or "true").lower() == "true":
+            self.db_executor.start()
 
     def on_disable(self) -> None:
         self._safe_log('info', "[ARCButtonShop] on_disable is called!")
         
+        # 停止异步数据库执行器（等待已提交的写操作完成）
+        if hasattr(self, 'db_executor'):
+            self.db_executor.shutdown()
+        
+        # 写回坐标索引快照（需在写操作全部完成之后）
+        if getattr(self, 'position_index', None) is not None:
+            self.position_index.save()
+        
         # 关闭数据库连接
         if hasattr(self, 'db_manager'):
             self.db_manager.close()
@@ -118,6 +256,103 @@ class ARCButtonShopPlugin(Plugin):
         if tax_enabled is None:
             self.setting_manager.SetSetting("trade_tax_enabled", "true")
             self._safe_log('info', "[ARCButtonShop] Trade tax enabled by default")
+        
+        # 交易记录保留策略（天数为 0 表示不清理）
+        retention_defaults = {
+            "transaction_retention_days": "30",  # 交易明细保留天数
+            "transaction_daily_retention_days": "0",  # 按天汇总数据保留天数
+            "transaction_archive_enabled": "0",  # 1=删除前写入归档库 button_shop_archive.db
+            "transaction_retention_interval_minutes": "60",  # 自动清理间隔（分钟）
+            "transaction_retention_batch_size": "500",  # 每批处理的明细条数
+            "transaction_retention_batch_delay_ticks": "20",  # 批与批之间间隔的 tick 数
+            "transaction_retention_vacuum_pages": "1000",  # 每轮增量 VACUUM 回收的最大页数
+        }
+        for key, value in retention_defaults.items():
+            if self.setting_manager.GetSetting(key) is None:
+                self.setting_manager.SetSetting(key, value)
+        
+        # 交互防抖（毫秒）与表单打开状态超时（秒）
+        if self.setting_manager.GetSetting("interact_debounce_ms") is None:
+            self.setting_manager.SetSetting("interact_debounce_ms", "300")
+        if self.setting_manager.GetSetting("form_open_timeout_seconds") is None:
+            self.setting_manager.SetSetting("form_open_timeout_seconds", "10")
+        
+        # 背包快照有效期（秒，0 表示不复用快照，每次都重新读取背包）
+        if self.setting_manager.GetSetting("inventory_snapshot_ttl_seconds") is None:
+            self.setting_manager.SetSetting("inventory_snapshot_ttl_seconds", "15")
+        
+        # 是否启用热路径耗时统计（关闭时无额外开销）
+        if self.setting_manager.GetSetting("perf_stats_enabled") is None:
+            self.setting_manager.SetSetting("perf_stats_enabled", "true")
+        
+        # 慢查询日志（默认关闭，开启后写入 logs/slow_query.log）
+        if self.setting_manager.GetSetting("slow_query_log_enabled") is None:
+            self.setting_manager.SetSetting("slow_query_log_enabled", "false")
+        if self.setting_manager.GetSetting("slow_query_threshold_ms") is None:
+            self.setting_manager.SetSetting("slow_query_threshold_ms", "50")
+        
+        # 异步数据库执行器：是否启用与读线程数量
+        if self.setting_manager.GetSetting("db_async_enabled") is None:
+            self.setting_manager.SetSetting("db_async_enabled", "true")
+        if self.setting_manager.GetSetting("db_reader_threads") is None:
+            self.setting_manager.SetSetting("db_reader_threads", "2")
+        
+        # 是否启用活跃商店坐标索引（及其磁盘快照 shop_positions.idx）
+        if self.setting_manager.GetSetting("position_index_enabled") is None:
+            self.setting_manager.SetSetting("position_index_enabled", "true")
+        
+        # 是否启用已加载区块的商店缓存
+        if self.setting_manager.GetSetting("shop_cache_enabled") is None:
+            self.setting_manager.SetSetting("shop_cache_enabled", "true")
+        
+        # 导出文件格式（jsonl 或 csv，均为 gzip 压缩）
+        if self.setting_manager.GetSetting("export_format") is None:
+            self.setting_manager.SetSetting("export_format", "jsonl")
+        
+        # 额外识别为商店按钮的方块 id（逗号分隔，默认留空表示只用内置按钮类型）
+        # 默认值为空：GetSetting 在键不存在时会写入 "extra_button_types="，已有配置保持不变
+        self.setting_manager.GetSetting("extra_button_types")
+
+    def _load_button_types(self) -> None:
+        """合并内置按钮类型与配置中的 extra_button_types（逗号分隔，留空表示不追加）"""
+        extra = self.setting_manager.GetSetting("extra_button_types") or ""
+        extra_types = {t.strip() for t in extra.split(",") if t.strip()}
+        self.button_types = BUTTON_BLOCK_TYPES | frozenset(extra_types)
+
+    def _init_performance_monitor(self) -> None:
+        """登记需要统计耗时的事件处理、交易、背包与数据库方法"""
+        self.perf_monitor = PerformanceMonitor()
+        # 事件回调在 on_enable 注册后无法再替换，包装常驻，之后 /shopmanage stats on 也能统计
+        self.perf_monitor.register(self, (
+            "on_player_interact", "on_block_break", "on_chunk_load", "on_chunk_unload",
+        ), "plugin", persistent=True)
+        self.perf_monitor.register(self, (
+            "_get_shop_at_position_optimized", "_show_shop_detail_panel", "_handle_shop_creation",
+            "_execute_purchase", "_execute_sell_shop_purchase", "_execute_buy_shop_purchase",
+        ), "plugin")
+        self.perf_monitor.register(self.inventory_manager, (
+            "get_inventory_items", "list_inventory_items", "get_slot_item",
+            "has_item", "remove_item", "give_item_count", "plan_delivery",
+        ), "inventory")
+        # 数据库方法互相调用（insert -> execute -> execute_count），只统计最外层调用，各操作耗时不重叠
+        self.perf_monitor.register(self.db_manager, (
+            "execute", "execute_count", "query_one", "query_all", "insert", "update", "delete", "create_table", "table_exists",
+            "execute_named", "query_one_named", "query_all_named", "iter_query", "query_page", "transaction",
+        ), "db", outermost_only=True)
+        if (self.setting_manager.GetSetting("perf_stats_enabled") or "true").lower() == "true":
+            self.perf_monitor.enable()
+
+    def _load_interact_debounce_settings(self) -> None:
+        """读取交互防抖配置"""
+        try:
+            self.interact_debounce_seconds = int(self.setting_manager.GetSetting("interact_debounce_ms") or "300") / 1000.0
+            self.form_open_timeout_seconds = float(self.setting_manager.GetSetting("form_open_timeout_seconds") or "10")
+        except ValueError:
+            self._safe_log('warning', "[ARCButtonShop] Invalid interact debounce settings, using defaults")
+        try:
+            self.inventory_manager.snapshot_ttl = float(self.setting_manager.GetSetting("inventory_snapshot_ttl_seconds") or "15")
+        except ValueError:
+            self._safe_log('warning', "[ARCButtonShop] Invalid inventory_snapshot_ttl_seconds, using default")
 
     def _init_economy_plugin(self) -> None:
         """初始化经济插件 - 检查 arc_core 优先，然后 umoney"""
@@ -169,89 +404,6 @@ class ARCButtonShopPlugin(Plugin):
                 return self._handle_shop_manage_command(sender, args)
         return True
     
-    # 数据库
-    def _create_shop_tables(self) -> None:
-        """创建商店相关数据表"""
-        
-        # 创建商店表
-        shop_fields = {
-            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
-            "shop_uuid": "TEXT NOT NULL UNIQUE",  # 商店唯一标识
-            "owner_xuid": "TEXT NOT NULL",  # 店主XUID（主要标识符）
-            "owner_name": "TEXT NOT NULL",  # 店主名称（用于显示）
-            "shop_type": "TEXT NOT NULL DEFAULT 'sell'",  # 商店类型：'sell'出售, 'buy'收购
-            "x": "INTEGER NOT NULL",  # 按钮X坐标
-            "y": "INTEGER NOT NULL",  # 按钮Y坐标
-            "z": "INTEGER NOT NULL",  # 按钮Z坐标
-            "dimension": "TEXT NOT NULL",  # 维度
-            "chunk_x": "INTEGER NOT NULL",  # 区块X坐标（用于优化查询）
-            "chunk_z": "INTEGER NOT NULL",  # 区块Z坐标（用于优化查询）
-            "item_type": "TEXT NOT NULL",  # 物品类型
-            "item_data": "TEXT NOT NULL",  # 物品数据（JSON格式）
-            "quantity": "INTEGER NOT NULL",  # 商品数量
-            "unit_price": "REAL NOT NULL",  # 单价
-            "stock": "INTEGER NOT NULL",  # 库存（出售商店为剩余库存，收购商店为资金余额）
-            "collected_items": "TEXT",  # 收购商店收集的物品（JSON格式）
-            "is_active": "INTEGER NOT NULL DEFAULT 1",  # 是否激活
-            "create_time": "TEXT NOT NULL",  # 创建时间
-            "last_purchase_time": "TEXT",  # 最后购买时间
-            "is_infinite": "INTEGER NOT NULL DEFAULT 0"  # 是否无限商店（系统/官方商店）
-        }
-        
-        if self.db_manager.create_table("button_shops", shop_fields):
-            self._safe_log('info', "[ARCButtonShop] Button shops table created successfully")
-        else:
-            self._safe_log('error', "[ARCButtonShop] Failed to create button shops table")
-        
-        # 创建交易记录表
-        transaction_fields = {
-            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
-            "shop_id": "INTEGER NOT NULL",  # 商店ID
-            "buyer_xuid": "TEXT NOT NULL",  # 买家XUID（主要标识符）
-            "buyer_name": "TEXT NOT NULL",  # 买家名称（用于显示）
-            "quantity": "INTEGER NOT NULL",  # 购买数量
-            "unit_price": "REAL NOT NULL",  # 购买时的单价
-            "total_price": "REAL NOT NULL",  # 总价
-            "transaction_time": "TEXT NOT NULL"  # 交易时间
-        }
-        
-        if self.db_manager.create_table("shop_transactions", transaction_fields):
-            self._safe_log('info', "[ARCButtonShop] Shop transactions table created successfully")
-        else:
-            self._safe_log('error', "[ARCButtonShop] Failed to create shop transactions table")
-        
-        # 创建区块索引表（用于快速查询）
-        chunk_index_fields = {
-            "chunk_x": "INTEGER NOT NULL",
-            "chunk_z": "INTEGER NOT NULL", 
-            "dimension": "TEXT NOT NULL",
-            "shop_count": "INTEGER NOT NULL DEFAULT 0",
-            "PRIMARY KEY": "(chunk_x, chunk_z, dimension)"
-        }
-        
-        if self.db_manager.create_table("chunk_index", chunk_index_fields):
-            self._safe_log('info', "[ARCButtonShop] Chunk index table created successfully")
-        else:
-            self._safe_log('error', "[ARCButtonShop] Failed to create chunk index table")
-
-        # 迁移：为已有表添加 is_infinite 列（若不存在）
-        self._migrate_add_is_infinite_column()
-
-    def _migrate_add_is_infinite_column(self) -> None:
-        """为 button_shops 表添加 is_infinite 列（兼容旧数据库）"""
-        try:
-            rows = self.db_manager.query_all("PRAGMA table_info(button_shops)")
-            if rows is None:
-                return
-            column_names = [row['name'] for row in rows]
-            if 'is_infinite' not in column_names:
-                self.db_manager.execute(
-                    "ALTER TABLE button_shops ADD COLUMN is_infinite INTEGER NOT NULL DEFAULT 0"
-                )
-                self._safe_log('info', "[ARCButtonShop] Migrated: added is_infinite column to button_shops")
-        except Exception as e:
-            self._safe_log('error', f"[ARCButtonShop] Migrate is_infinite column error: {str(e)}")
-
     # 无限商店库存/预算常量（表示无限）
     UNLIMITED_STOCK = 2147483647
 
@@ -260,51 +412,123 @@ class ARCButtonShopPlugin(Plugin):
     def on_player_interact(self, event: PlayerInteractEvent):
         """处理玩家交互事件"""
         try:
-            player = event.player
+            # 快速过滤：非按钮方块直接返回（仅商店设置状态需要提示玩家）
             block = event.block
-
-            # 检查block是否为None
             if block is None:
                 return
-
-            # 检查玩家是否处于商店设置状态
-            if player.name in self.setting_shop_player:
-                if not self._is_button_block(block):
+            if self._get_block_type_id(block) not in self.button_types:
+                player = event.player
+                if player.name in self.setting_shop_player:
                     # 提示玩家当前交互的不是按钮
                     player.send_message(self.language_manager.GetText("SHOP_NOT_BUTTON").format(block.type))
-                    return
                 else:
-                    self._handle_shop_creation(player, block)
-                    event.is_cancelled = True
+                    self.interact_events_rejected += 1
+                return
+
+            player = event.player
+            dimension = block.dimension.name
+            position = (block.x, block.y, block.z, dimension)
+
+            # 防抖：同一按钮的重复交互（按住右键）在查库和发送表单之前丢弃
+            now = time.monotonic()
+            debounced = self._check_interact_debounce(player.name, position, now)
+            if debounced is not None:
+                self.interact_events_debounced += 1
+                event.is_cancelled = debounced
+                return
+
+            # 检查玩家是否处于商店设置状态
+            if player.name in self.setting_shop_player:
+                self._handle_shop_creation(player, block)
+                event.is_cancelled = True
+                self._last_interacts[player.name] = (now, position, True)
                 return
             else:
-                # 检查是否是按钮交互
-                if not self._is_button_block(block):
-                    return
-                
                 # 通过区块索引快速检查该位置是否有商店
-                shop_data = self._get_shop_at_position_optimized(block.x, block.y, block.z, block.dimension.name)
+                shop_data = self._get_shop_at_position_optimized(block.x, block.y, block.z, dimension)
+                self._last_interacts[player.name] = (now, position, bool(shop_data))
                 if shop_data:
+                    self._open_forms[player.name] = (now, position)
                     self._show_shop_detail_panel(player, shop_data)
                     event.is_cancelled = True
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Player interact error: {str(e)}")
 
+    def _check_interact_debounce(self, player_name: str, position: tuple, now: float):
+        """
+        判断本次按钮交互是否应被丢弃
+        :return: None 表示正常处理；否则为丢弃时是否取消事件（与上一次处理结果一致）
+        """
+        open_form = self._open_forms.get(player_name)
+        if open_form is not None:
+            opened_at, form_position = open_form
+            if now - opened_at >= self.form_open_timeout_seconds:
+                del self._open_forms[player_name]
+            elif form_position == position:
+                # 该商店的表单已发送且玩家尚未响应
+                return True
+        last = self._last_interacts.get(player_name)
+        if last is not None:
+            last_time, last_position, was_shop = last
+            if last_position == position and now - last_time < self.interact_debounce_seconds:
+                return was_shop
+        return None
+
+    def _release_form(self, callback=None):
+        """包装商店详情表单回调：玩家点击或关闭表单后解除「表单已打开」状态"""
+        def wrapper(sender, *args):
+            self._open_forms.pop(sender.name, None)
+            if callback is not None:
+                return callback(sender, *args)
+        return wrapper
+
+    @event_handler
+    def on_player_quit(self, event: PlayerQuitEvent):
+        """玩家退出时清理交互状态"""
+        player_name = event.player.name
+        self._last_interacts.pop(player_name, None)
+        self._open_forms.pop(player_name, None)
+        self.inventory_manager.forget_player(player_name)
+
+    @event_handler
+    def on_player_drop_item(self, event: PlayerDropItemEvent):
+        """丢弃物品：背包快照失效"""
+        self.inventory_manager.invalidate_inventory(event.player.name)
+
+    @event_handler
+    def on_player_pickup_item(self, event: PlayerPickupItemEvent):
+        """拾取物品：背包快照失效"""
+        self.inventory_manager.invalidate_inventory(event.player.name)
+
+    @event_handler
+    def on_player_item_consume(self, event: PlayerItemConsumeEvent):
+        """消耗物品（食物、药水）：背包快照失效"""
+        self.inventory_manager.invalidate_inventory(event.player.name)
+
+    @event_handler
+    def on_player_death(self, event: PlayerDeathEvent):
+        """死亡掉落：背包快照失效"""
+        self.inventory_manager.invalidate_inventory(event.player.name)
+
+    @event_handler
+    def on_block_place(self, event: BlockPlaceEvent):
+        """放置方块会消耗手中物品：背包快照失效"""
+        self.inventory_manager.invalidate_inventory(event.player.name)
+
     @event_handler
     def on_block_break(self, event: BlockBreakEvent):
         """处理方块破坏事件（商店保护）"""
         try:
-            player = event.player
+            # 快速过滤：非按钮方块直接返回
             block = event.block
-            
-            # 检查block是否为None
             if block is None:
                 return
-            
-            # 检查是否是按钮破坏
-            if not self._is_button_block(block):
+            if self._get_block_type_id(block) not in self.button_types:
+                self.break_events_rejected += 1
                 return
             
+            player = event.player
+            
             # 检查该位置是否有商店
             shop_data = self._get_shop_at_position_optimized(block.x, block.y, block.z, block.dimension.name)
             if not shop_data:
@@ -329,6 +553,28 @@ class ARCButtonShopPlugin(Plugin):
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Block break error: {str(e)}")
 
+    @event_handler
+    def on_chunk_load(self, event: ChunkLoadEvent):
+        """区块加载时预热该区块的商店缓存"""
+        if self.shop_cache is None:
+            return
+        try:
+            chunk = event.chunk
+            self.shop_cache.load_chunk(chunk.dimension.name, chunk.x, chunk.z)
+        except Exception as e:
+            self._safe_log('error', f"[ARCButtonShop] Chunk load error: {str(e)}")
+
+    @event_handler
+    def on_chunk_unload(self, event: ChunkUnloadEvent):
+        """区块卸载时移除该区块的商店缓存"""
+        if self.shop_cache is None:
+            return
+        try:
+            chunk = event.chunk
+            self.shop_cache.unload_chunk(chunk.dimension.name, chunk.x, chunk.z)
+        except Exception as e:
+            self._safe_log('error', f"[ARCButtonShop] Chunk unload error: {str(e)}")
+
     # 商店管理系统
     def _show_shop_main_panel(self, player):
         """显示商店主面板"""
@@ -421,8 +667,8 @@ class ARCButtonShopPlugin(Plugin):
     def _show_item_selection_panel(self, player, shop_type="sell"):
         """显示物品选择面板"""
         try:
-            # 获取玩家背包中的物品
-            inventory_items = self.inventory_manager.get_inventory_items(player)
+            # 获取玩家背包中的物品（轻量列表，选中后再读取该槽位的完整信息）
+            inventory_items = self.inventory_manager.list_inventory_items(player)
             
             if not inventory_items:
                 no_items_panel = ActionForm(
@@ -448,11 +694,11 @@ class ARCButtonShopPlugin(Plugin):
                 button_text = f"{item_name} x{item_count}"
                 
                 # 添加附魔信息
-                if item_info.get('enchants'):
+                if item_info.get('has_enchants'):
                     button_text += " §b[附魔]"
                 
                 # 添加Lore信息
-                if item_info.get('lore'):
+                if item_info.get('has_lore'):
                     button_text += " §d[Lore]"
                 
                 item_select_panel.add_button(
@@ -475,6 +721,15 @@ class ARCButtonShopPlugin(Plugin):
     def _show_price_setting_panel(self, player, item_info, shop_type="sell"):
         """显示价格设置面板（支持 sell/buy/sell_infinite/buy_infinite）"""
         try:
+            if 'enchants' not in item_info:
+                # 来自物品选择面板的轻量条目：此时才读取所选槽位的附魔、Lore 与 NBT
+                full_info = self.inventory_manager.get_slot_item(player, item_info['slot_index'], item_info['type'])
+                if full_info is None:
+                    player.send_message("背包物品已变化，请重新选择")
+                    self._show_item_selection_panel(player, shop_type)
+                    return
+                item_info = full_info
+            
             controls = []
             is_infinite = shop_type in ("sell_infinite", "buy_infinite")
             base_type = "sell" if shop_type in ("sell", "sell_infinite") else "buy"
@@ -698,6 +953,21 @@ class ARCButtonShopPlugin(Plugin):
             payload['nbt_b64'] = nbt_b64
         return payload
 
+    def _get_item_display_name(self, player, item_data, name=None) -> str:
+        """
+        物品在查看者语言下的名称；自定义名称或未记录 custom_name 的旧数据沿用保存时的名称
+        :param item_data: 商店 item_data（或含 type_translation_key、custom_name 列的商店列表行）
+        :param name: 保存时的名称，默认取 item_data['name']
+        """
+        if name is None:
+            name = item_data.get('name', 'Unknown')
+        custom_name = item_data.get('custom_name')
+        if custom_name is None or custom_name or not item_data.get('type_translation_key'):
+            return name
+        return self.inventory_manager.translate_item_name(
+            item_data['type_translation_key'], getattr(player, 'locale', None), name
+        )
+
     def _show_shop_detail_panel(self, player, shop_data):
         """显示商店详情面板"""
         try:
@@ -708,7 +978,7 @@ class ARCButtonShopPlugin(Plugin):
             shop_info = f"店主: {self._get_shop_owner_display(shop_data)}\n"
             shop_info += f"类型: {self._get_shop_type_plain_headline(shop_data)}\n"
             shop_info += f"{self._get_shop_type_manage_line(shop_data)}\n"
-            shop_info += f"物品: {item_data.get('name', 'Unknown')}\n"
+            shop_info += f"物品: {self._get_item_display_name(player, item_data)}\n"
             if is_infinite:
                 shop_info += "库存: §e无限\n" if shop_type == "sell" else "预算: §e无限\n"
             else:
@@ -729,7 +999,8 @@ class ARCButtonShopPlugin(Plugin):
             
             detail_panel = ActionForm(
                 title=self.language_manager.GetText("SHOP_DETAIL_TITLE"),
-                content=shop_info
+                content=shop_info,
+                on_close=self._release_form()
             )
             
             # 如果不是店主且有库存（或无限商店），添加购买按钮
@@ -739,25 +1010,25 @@ class ARCButtonShopPlugin(Plugin):
                     # 出售商店 - 显示购买按钮
                     detail_panel.add_button(
                         self.language_manager.GetText("SHOP_BUY_BUTTON"),
-                        on_click=lambda sender: self._show_purchase_panel(sender, shop_data)
+                        on_click=self._release_form(lambda sender: self._show_purchase_panel(sender, shop_data))
                     )
                 else:
                     # 收购商店 - 显示出售按钮
                     detail_panel.add_button(
                         self.language_manager.GetText("SHOP_SELL_BUTTON"),
-                        on_click=lambda sender: self._show_purchase_panel(sender, shop_data)
+                        on_click=self._release_form(lambda sender: self._show_purchase_panel(sender, shop_data))
                     )
             elif str(player.unique_id) == shop_data['owner_xuid']:
                 # 店主管理按钮
                 detail_panel.add_button(
                     self.language_manager.GetText("SHOP_MANAGE_BUTTON"),
-                    on_click=lambda sender: self._show_shop_manage_panel(sender, shop_data)
+                    on_click=self._release_form(lambda sender: self._show_shop_manage_panel(sender, shop_data))
                 )
             
             # 关闭按钮
             detail_panel.add_button(
                 self.language_manager.GetText("SHOP_CLOSE_BUTTON"),
-                on_click=lambda sender: None
+                on_click=self._release_form()
             )
             
             player.send_form(detail_panel)
@@ -774,11 +1045,11 @@ class ARCButtonShopPlugin(Plugin):
             is_infinite = self._is_shop_infinite(shop_data)
             type_headline = f"{self._get_shop_type_plain_headline(shop_data)}\n\n"
             if shop_type == "sell":
-                purchase_info = type_headline + f"物品: {item_data.get('name', 'Unknown')}\n"
+                purchase_info = type_headline + f"物品: {self._get_item_display_name(player, item_data)}\n"
                 purchase_info += f"库存: {'无限' if is_infinite else shop_data['stock']}\n"
                 purchase_info += f"单价: {shop_data['unit_price']}\n"
             else:
-                purchase_info = type_headline + f"收购物品: {item_data.get('name', 'Unknown')}\n"
+                purchase_info = type_headline + f"收购物品: {self._get_item_display_name(player, item_data)}\n"
                 purchase_info += f"预算: {'无限' if is_infinite else shop_data['stock']}\n"
                 purchase_info += f"收购价: {shop_data['unit_price']}\n"
             
@@ -958,8 +1229,13 @@ class ARCButtonShopPlugin(Plugin):
             if operation_success:
                 # 插入商店数据
                 if self.db_manager.insert("button_shops", new_shop):
-                    # 更新区块索引
-                    self._update_chunk_index(chunk_x, chunk_z, block.dimension.name, 1)
+                    # chunk_index 由触发器维护，这里只需同步区块缓存与坐标索引
+                    if self.shop_cache is not None:
+                        self.shop_cache.reload_chunk(block.dimension.name, chunk_x, chunk_z)
+                    if self.position_index is not None:
+                        self.position_index.update_shop(self.db_manager.query_one_named(
+                            "shop_by_pos", (block.x, block.y, block.z, block.dimension.name)
+                        ))
                     
                     if is_infinite:
                         player.send_message(f"系统商店创建成功！{item_info['name']} - 单价:{unit_price}（无限库存/预算）")
@@ -1020,20 +1296,35 @@ class ARCButtonShopPlugin(Plugin):
     def _execute_sell_shop_purchase(self, player, shop_data, quantity, base_price, tax_amount, total_price):
         """执行出售商店的购买操作（含无限商店）"""
         try:
+            # 先按背包剩余空间截断购买数量，再检查余额与预扣库存，避免发放后才发现背包已满
+            item_data = json.loads(shop_data['item_data'])
+            requested_qty = int(quantity)
+            plan = self.inventory_manager.plan_delivery(player, item_data)
+            capacity = plan.capacity if plan is not None else 0
+            if capacity <= 0:
+                return False, self.language_manager.GetText("SHOP_ITEM_GIVE_FAILED")
+            if capacity < requested_qty:
+                quantity = capacity
+                base_price = int(quantity * shop_data['unit_price'])
+                tax_amount = self._calculate_tax(base_price)
+                total_price = base_price + tax_amount
+
             buyer_money = self._get_player_money(player.name)
             if buyer_money < total_price:
                 return False, self.language_manager.GetText("SHOP_INSUFFICIENT_FUNDS").format(total_price, buyer_money)
             
             is_infinite = self._is_shop_infinite(shop_data)
-            if not is_infinite and shop_data['stock'] < quantity:
+            # 预扣库存：条件更新成功才继续，失败路径须调用 _release_reserved_stock 归还
+            if not is_infinite and not self._reserve_shop_stock(shop_data['id'], quantity):
                 return False, self.language_manager.GetText("SHOP_INSUFFICIENT_STOCK")
+            reserved = 0 if is_infinite else int(quantity)
             
-            # 先尝试发放物品，按“实际发放数量”结算，避免背包满导致部分到账但全额退款的漏洞
-            item_data = json.loads(shop_data['item_data'])
+            # 发放物品（复用上面的容量计划），仍按“实际发放数量”结算（背包在计算容量后发生变化时兜底）
             purchase_item = self._shop_item_transaction_payload(item_data, quantity)
-            given_qty = self.inventory_manager.give_item_count(player, purchase_item)
+            given_qty = self.inventory_manager.give_item_count(player, purchase_item, plan)
 
             if given_qty <= 0:
+                self._release_reserved_stock(shop_data['id'], reserved)
                 return False, self.language_manager.GetText("SHOP_ITEM_GIVE_FAILED")
 
             # 按实际发放数量重新计算费用/税
@@ -1049,6 +1340,7 @@ class ARCButtonShopPlugin(Plugin):
                     self.inventory_manager.remove_item(player, rollback_item)
                 except Exception:
                     pass
+                self._release_reserved_stock(shop_data['id'], reserved)
                 return False, self.language_manager.GetText("SHOP_PAYMENT_FAILED")
 
             # 店主收款（系统/无限商店不收款）
@@ -1060,24 +1352,20 @@ class ARCButtonShopPlugin(Plugin):
                     self.inventory_manager.remove_item(player, rollback_item)
                 except Exception:
                     pass
+                self._release_reserved_stock(shop_data['id'], reserved)
                 return False, self.language_manager.GetText("SHOP_OWNER_PAYMENT_FAILED")
 
-            # 更新库存（非无限商店按实际发放数量扣库存）
-            update_data = {
-                'last_purchase_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            if not is_infinite:
-                new_stock = shop_data['stock'] - int(given_qty)
-                update_data['stock'] = new_stock
-                if new_stock <= 0:
-                    update_data['is_active'] = 0
-
-            self.db_manager.update(
-                table='button_shops',
-                data=update_data,
-                where='id = ?',
-                params=(shop_data['id'],)
-            )
+            # 结算库存：归还未发放部分的预扣数量，库存耗尽时下架
+            purchase_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if is_infinite:
+                self._run_shop_statement("touch_purchase_time", (purchase_time, shop_data['id']), shop_data['id'])
+            else:
+                refund = reserved - int(given_qty)
+                self._run_shop_statement(
+                    "settle_sell_purchase",
+                    (refund, refund, purchase_time, shop_data['id']),
+                    shop_data['id']
+                )
 
             # 记录交易（按实际数量）
             self._record_transaction(
@@ -1090,15 +1378,15 @@ class ARCButtonShopPlugin(Plugin):
             )
 
             # 通知店主（按实际数量）
-            self._notify_shop_owner(shop_data, player.name, int(given_qty), item_data['name'], actual_base_price, "sell")
+            self._notify_shop_owner(shop_data, player.name, int(given_qty), item_data, actual_base_price, "sell")
 
             # 若实际发放少于输入数量，给出明确提示
-            if int(given_qty) < int(quantity):
-                msg = self._get_purchase_success_message(int(given_qty), item_data['name'], actual_total_price, actual_tax_amount)
-                msg += f"\n§e注意：背包空间不足，本次仅成功购买 {given_qty}/{quantity} 个，其余未购买。"
+            if int(given_qty) < requested_qty:
+                msg = self._get_purchase_success_message(int(given_qty), self._get_item_display_name(player, item_data), actual_total_price, actual_tax_amount)
+                msg += f"\n§e注意：背包空间不足，本次仅成功购买 {given_qty}/{requested_qty} 个，其余未购买。"
                 return True, msg
 
-            return True, self._get_purchase_success_message(int(given_qty), item_data['name'], actual_total_price, actual_tax_amount)
+            return True, self._get_purchase_success_message(int(given_qty), self._get_item_display_name(player, item_data), actual_total_price, actual_tax_amount)
                 
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Execute sell shop purchase error: {str(e)}")
@@ -1108,65 +1396,58 @@ class ARCButtonShopPlugin(Plugin):
         """执行收购商店的购买操作（玩家出售物品给收购商店，含无限商店）"""
         try:
             is_infinite = self._is_shop_infinite(shop_data)
-            if not is_infinite and shop_data['stock'] < base_price:
-                return False, self.language_manager.GetText("SHOP_INSUFFICIENT_BUDGET")
-            
             item_data = json.loads(shop_data['item_data'])
             required_item = self._shop_item_transaction_payload(item_data, quantity)
 
             if not self.inventory_manager.has_item(player, required_item):
                 return False, self.language_manager.GetText("SHOP_PLAYER_NO_ITEMS")
             
+            # 预扣收购预算：条件更新成功才继续，失败路径须归还
+            if not is_infinite and not self._reserve_shop_stock(shop_data['id'], base_price):
+                return False, self.language_manager.GetText("SHOP_INSUFFICIENT_BUDGET")
+            reserved = 0 if is_infinite else base_price
+            
             if not self.inventory_manager.remove_item(player, required_item):
+                self._release_reserved_stock(shop_data['id'], reserved)
                 return False, self.language_manager.GetText("SHOP_ITEM_REMOVE_FAILED")
             
             player_income = base_price - tax_amount
             if not self._change_player_money(player.name, player_income):
                 self.inventory_manager.give_item(player, required_item)
+                self._release_reserved_stock(shop_data['id'], reserved)
                 return False, self.language_manager.GetText("SHOP_PAYMENT_FAILED")
             
-            update_data = {
-                'last_purchase_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
+            purchase_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             if not is_infinite:
-                new_budget = shop_data['stock'] - base_price
-                collected_items = []
-                if shop_data.get('collected_items'):
-                    try:
-                        collected_items = json.loads(shop_data['collected_items'])
-                    except Exception:
-                        collected_items = []
+                # 收购物品在 SQL 中追加到 collected_items，不覆盖并发交易追加的记录
                 collected_item = {
                     'type': item_data['type'],
                     'name': item_data['name'],
+                    'type_translation_key': item_data.get('type_translation_key'),
+                    'custom_name': item_data.get('custom_name', True),
                     'count': quantity,
                     'data': item_data.get('data', 0),
                     'enchants': item_data.get('enchants', {}),
                     'lore': item_data.get('lore', []),
-                    'collect_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    'collect_time': purchase_time
                 }
                 if item_data.get('nbt_b64'):
                     collected_item['nbt_b64'] = item_data['nbt_b64']
-                collected_items.append(collected_item)
-                update_data['stock'] = new_budget
-                update_data['collected_items'] = json.dumps(collected_items)
-                if new_budget < shop_data['unit_price']:
-                    update_data['is_active'] = 0
-            
-            self.db_manager.update(
-                table='button_shops',
-                data=update_data,
-                where='id = ?',
-                params=(shop_data['id'],)
-            )
+                self._run_shop_statement(
+                    "settle_buy_purchase",
+                    (json.dumps(collected_item), purchase_time, shop_data['id']),
+                    shop_data['id']
+                )
+            else:
+                self._run_shop_statement("touch_purchase_time", (purchase_time, shop_data['id']), shop_data['id'])
             
             # 记录交易（注意：对收购商店，玩家是卖家）
             self._record_transaction(shop_data['id'], player, quantity, shop_data['unit_price'], base_price, tax_amount, is_buy_shop=True)
             
             # 通知店主（系统商店不通知创建者）
-            self._notify_shop_owner(shop_data, player.name, quantity, item_data['name'], base_price, "buy")
+            self._notify_shop_owner(shop_data, player.name, quantity, item_data, base_price, "buy")
             
-            return True, self._get_sell_success_message(quantity, item_data['name'], player_income, tax_amount)
+            return True, self._get_sell_success_message(quantity, self._get_item_display_name(player, item_data), player_income, tax_amount)
                 
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Execute buy shop purchase error: {str(e)}")
@@ -1176,28 +1457,29 @@ class ARCButtonShopPlugin(Plugin):
     def _record_transaction(self, shop_id, player, quantity, unit_price, total_price, tax_amount, is_buy_shop=False):
         """记录交易"""
         try:
-            transaction_data = {
-                'shop_id': shop_id,
-                'buyer_xuid': str(player.unique_id),
-                'buyer_name': player.name,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_price': total_price,
-                'transaction_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            self.db_manager.insert("shop_transactions", transaction_data)
+            # 交易明细只追加、不影响本次交易结果，交给写线程执行
+            params = (
+                shop_id,
+                str(player.unique_id),
+                player.name,
+                quantity,
+                unit_price,
+                total_price,
+                datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
+            self.db_executor.submit_write(lambda db: db.execute_named("insert_transaction", params))
             
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Record transaction error: {str(e)}")
 
-    def _notify_shop_owner(self, shop_data, buyer_name, quantity, item_name, amount, shop_type):
-        """通知店主（系统/无限商店不通知创建者，资金与创建者无关）"""
+    def _notify_shop_owner(self, shop_data, buyer_name, quantity, item_data, amount, shop_type):
+        """通知店主（系统/无限商店不通知创建者，资金与创建者无关；物品名按店主语言显示）"""
         try:
             if self._is_shop_infinite(shop_data):
                 return
             owner_player = self.server.get_player(shop_data['owner_name'])
             if owner_player:
+                item_name = self._get_item_display_name(owner_player, item_data)
                 if shop_type == "sell":
                     message = self.language_manager.GetText("SHOP_SALE_NOTIFICATION").format(
                         buyer_name, quantity, item_name, amount
@@ -1234,49 +1516,23 @@ class ARCButtonShopPlugin(Plugin):
                 quantity, item_name, income
             )
 
-    def _rollback_sell_transaction(self, player, shop_data, total_price, base_price, is_infinite=False):
-        """回滚出售交易（系统商店未给店主加钱，不得扣店主）"""
-        try:
-            self._change_player_money(player.name, total_price)
-            if not is_infinite:
-                self._change_player_money(shop_data['owner_name'], -base_price)
-                self.db_manager.update(
-                    table='button_shops',
-                    data={'stock': shop_data['stock']},
-                    where='id = ?',
-                    params=(shop_data['id'],)
-                )
-        except Exception as e:
-            self._safe_log('error', f"[ARCButtonShop] Rollback transaction error: {str(e)}")
-
     # 辅助方法
+    @staticmethod
+    def _get_block_type_id(block: Block):
+        """获取方块类型 id（block.type 为 str 时直接返回，兼容带 id 属性的类型对象）"""
+        block_type = block.type
+        if block_type.__class__ is str:
+            return block_type
+        if block_type is None:
+            return None
+        return getattr(block_type, 'id', None) or str(block_type)
+
     def _is_button_block(self, block: Block) -> bool:
         """检查是否为按钮方块"""
-        # 检查block是否为None
         if block is None:
             return False
-            
-        # 检查block.type是否为None
-        if block.type is None:
-            return False
-            
-        # 检查方块类型是否为按钮
-        button_types = [
-            "minecraft:wooden_button", "minecraft:stone_button", "minecraft:birch_button",
-            "minecraft:spruce_button", "minecraft:jungle_button", "minecraft:acacia_button",
-            "minecraft:dark_oak_button", "minecraft:mangrove_button", "minecraft:cherry_button",
-            "minecraft:bamboo_button", "minecraft:crimson_button", "minecraft:warped_button",
-            "minecraft:polished_blackstone_button"
-        ]
-        
-        # 安全地获取block.type.id
         try:
-            if hasattr(block.type, 'id'):
-                return block.type.id in button_types
-            else:
-                # 如果block.type没有id属性，尝试转换为字符串进行比较
-                block_type_str = str(block.type)
-                return block_type_str in button_types
+            return self._get_block_type_id(block) in self.button_types
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Error checking button block: {str(e)}")
             return False
@@ -1284,20 +1540,36 @@ class ARCButtonShopPlugin(Plugin):
     def _get_shop_at_position(self, x: int, y: int, z: int, dimension: str):
         """获取指定位置的商店（直接查询，用于API接口）"""
         try:
-            return self.db_manager.query_one(
-                "SELECT * FROM button_shops WHERE x = ? AND y = ? AND z = ? AND dimension = ? AND is_active = 1",
-                (x, y, z, dimension)
-            )
+            return self.db_manager.query_one_named("shop_by_pos", (x, y, z, dimension))
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Get shop at position error: {str(e)}")
             return None
 
     def _get_shop_at_position_optimized(self, x: int, y: int, z: int, dimension: str):
-        """获取指定位置的商店（优化版本，先查区块索引）"""
+        """获取指定位置的商店（优化版本，先查区块缓存，再查区块索引；仅用于已加载区块内的方块）"""
         try:
+            # 坐标索引中没有该坐标时直接返回，不访问缓存或数据库
+            shop_id = None
+            if self.position_index is not None:
+                shop_id = self.position_index.lookup(x, y, z, dimension)
+                if shop_id is None:
+                    return None
+            
             # 1. 计算区块坐标
             chunk_x, chunk_z = self._get_chunk_coords(x, z)
             
+            # 已加载区块直接从缓存返回；插件启用前已加载的区块在首次访问时补充加载
+            if self.shop_cache is not None:
+                cached, shop = self.shop_cache.get_shop_at(x, y, z, dimension)
+                if not cached:
+                    self.shop_cache.load_chunk(dimension, chunk_x, chunk_z)
+                    cached, shop = self.shop_cache.get_shop_at(x, y, z, dimension)
+                return shop
+            
+            if shop_id is not None and shop_id != PositionIndex.UNKNOWN:
+                shop = self.db_manager.query_one_named("shop_by_id", (shop_id,))
+                return shop if shop and shop['is_active'] else None
+            
             # 2. 检查该区块是否有商店
             chunk_has_shops = self.db_manager.query_one(
                 "SELECT COUNT(*) as count FROM chunk_index WHERE chunk_x = ? AND chunk_z = ? AND dimension = ? AND shop_count > 0",
@@ -1309,21 +1581,23 @@ class ARCButtonShopPlugin(Plugin):
                 return None
             
             # 4. 如果区块有商店，再精确查询该位置的商店
-            return self.db_manager.query_one(
-                "SELECT * FROM button_shops WHERE x = ? AND y = ? AND z = ? AND dimension = ? AND is_active = 1",
-                (x, y, z, dimension)
-            )
+            return self.db_manager.query_one_named("shop_by_pos", (x, y, z, dimension))
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Get shop at position optimized error: {str(e)}")
             return None
 
+    def _get_chunk_shops(self, chunk_x: int, chunk_z: int, dimension: str) -> list:
+        """获取区块内的活跃商店（已加载区块走缓存）"""
+        if self.shop_cache is not None:
+            cached_shops = self.shop_cache.get_chunk_shops(dimension, chunk_x, chunk_z)
+            if cached_shops is not None:
+                return cached_shops
+        return self.db_manager.query_all_named("shops_in_chunk", (dimension, chunk_x, chunk_z))
+
     def _get_shop_by_id(self, shop_id: int):
         """根据ID获取商店"""
         try:
-            return self.db_manager.query_one(
-                "SELECT * FROM button_shops WHERE id = ?",
-                (shop_id,)
-            )
+            return self.db_manager.query_one_named("shop_by_id", (shop_id,))
         except Exception as e:
             self._safe_log('error', f"[ARCButtonShop] Get shop by id error: {str(e)}")
             return None
@@ -1332,34 +1606,93 @@ class ARCButtonShopPlugin(Plugin):
         """获取区块坐标"""
         return x // self.CHUNK_SIZE, z // self.CHUNK_SIZE
 
-    def _update_chunk_index(self, chunk_x: int, chunk_z: int, dimension: str, delta: int):
-        """更新区块索引"""
-        try:
-            # 先尝试获取现有记录
-            existing = self.db_manager.query_one(
-                "SELECT shop_count FROM chunk_index WHERE chunk_x = ? AND chunk_z = ? AND dimension = ?",
-                (chunk_x, chunk_z, dimension)
-            )
-            
-            if existing:
-                # 更新现有记录
-                new_count = max(0, existing['shop_count'] + delta)
-                self.db_manager.update(
-                    table='chunk_index',
-                    data={'shop_count': new_count},
-                    where='chunk_x = ? AND chunk_z = ? AND dimension = ?',
-                    params=(chunk_x, chunk_z, dimension)
-                )
-            else:
-                # 创建新记录
-                self.db_manager.insert("chunk_index", {
-                    'chunk_x': chunk_x,
-                    'chunk_z': chunk_z,
-                    'dimension': dimension,
-                    'shop_count': max(0, delta)
-                })
-        except Exception as e:
-            self._safe_log('error', f"[ARCButtonShop] Update chunk index error: {str(e)}")
+    def _update_shop_record(self, shop_id: int, update_data: dict, expected_revision=None) -> bool:
+        """
+        更新商店记录（修订号加 1）并同步区块缓存
+        :param expected_revision: 不为 None 时仅当数据库中的修订号仍等于该值才更新（比较并交换）
+        :return: 是否更新了该商店；修订号不一致（表单基于旧数据）时返回 False
+        """
+        set_clause = ', '.join(f"{key} = ?" for key in update_data)
+        sql = f"UPDATE button_shops SET {set_clause}, revision = revision + 1 WHERE id = ?"
+        params = tuple(update_data.values()) + (shop_id,)
+        if expected_revision is not None:
+            sql += " AND revision = ?"
+            params += (expected_revision,)
+        success = self.db_manager.execute_count(sql, params) == 1
+        if success:
+            self._refresh_shop_views(shop_id)
+        return success
+
+    def _run_shop_statement(self, name: str, params: tuple, shop_id: int) -> int:
+        """执行更新商店的命名语句并同步区块缓存，返回受影响行数（失败为 -1）"""
+        affected = self.db_manager.execute_named(name, params)
+        if affected > 0:
+            self._refresh_shop_views(shop_id)
+        return affected
+
+    def _refresh_shop_views(self, shop_id: int) -> None:
+        """商店写入后重新读取一次该商店，同步区块缓存与坐标索引（上下架会改变索引）"""
+        if self.shop_cache is None and self.position_index is None:
+            return
+        row = self.db_manager.query_one_named("shop_by_id", (shop_id,))
+        if self.shop_cache is not None:
+            self.shop_cache.update_shop(row)
+        if self.position_index is not None:
+            self.position_index.update_shop(row)
+
+    def _reserve_shop_stock(self, shop_id: int, amount: int) -> bool:
+        """预扣库存/预算：仅当商店仍上架且余量不少于 amount 时扣减，返回是否成功"""
+        return self._run_shop_statement("reserve_stock", (amount, shop_id, amount), shop_id) == 1
+
+    def _release_reserved_stock(self, shop_id: int, amount: int) -> None:
+        """交易失败时归还预扣的库存/预算"""
+        if amount > 0:
+            self._run_shop_statement("release_stock", (amount, shop_id), shop_id)
+
+    def _delete_shop_record(self, shop_data):
+        """
+        按修订号删除商店记录（比较并交换）并同步区块缓存（区块索引由触发器维护）
+        :return: 实际删除的行（返还库存/预算/收购物品应以此为准）；修订号已变化或商店不存在时返回 None
+        """
+        deleted = None
+        with self.db_manager.transaction() as cursor:
+            # 显式开启写事务：读取与删除之间不会插入其他连接的写入
+            cursor.execute("BEGIN IMMEDIATE")
+            row = cursor.execute(
+                "SELECT * FROM button_shops WHERE id = ? AND revision = ?",
+                (shop_data['id'], shop_data.get('revision', 0))
+            ).fetchone()
+            if row is not None:
+                cursor.execute("DELETE FROM button_shops WHERE id = ?", (shop_data['id'],))
+                deleted = dict(row)
+        if deleted is not None:
+            if self.shop_cache is not None:
+                self.shop_cache.remove_shop(deleted)
+            if self.position_index is not None:
+                self.position_index.remove_shop(deleted)
+        return deleted
+
+    def _refund_deleted_shop(self, owner_name: str, owner_player, shop_data) -> None:
+        """按已删除的商店行返还店主：出售商店返还库存物品（店主在线），收购商店返还剩余预算与收集的物品"""
+        if self._is_shop_infinite(shop_data):
+            return
+        item_data = json.loads(shop_data['item_data'])
+        if shop_data.get('shop_type', 'sell') == "sell":
+            if shop_data['stock'] > 0 and owner_player:
+                return_item = self._shop_item_transaction_payload(item_data, shop_data['stock'])
+                self.inventory_manager.give_item(owner_player, return_item)
+            return
+        if shop_data['stock'] > 0:
+            self._change_player_money(owner_name, shop_data['stock'])
+        collected_items = []
+        if shop_data.get('collected_items'):
+            try:
+                collected_items = json.loads(shop_data['collected_items'])
+            except Exception:
+                collected_items = []
+        if owner_player:
+            for item in collected_items:
+                self.inventory_manager.give_item(owner_player, item)
 
     def _generate_shop_uuid(self) -> str:
         """生成商店UUID"""
@@ -1392,7 +1725,7 @@ class ARCButtonShopPlugin(Plugin):
             return True
         
         if not args:
-            sender.send_message("用法: /shopmanage <list|clear|reload>")
+            sender.send_message("用法: /shopmanage <list|clear|reload|retention|vacuum|export|stats|reindex>")
             return True
         
         command = args[0].lower()
@@ -1403,28 +1736,188 @@ class ARCButtonShopPlugin(Plugin):
             sender.send_message(f"当前活跃商店数量: {len(shops)}")
             
         elif command == "clear":
-            # 清除所有商店（危险操作）
-            self.db_manager.execute("DELETE FROM button_shops")
-            self.db_manager.execute("DELETE FROM shop_transactions") 
-            self.db_manager.execute("DELETE FROM chunk_index")
+            # 清除所有商店（危险操作）：商店、交易明细与按天汇总在同一事务中删除
+            try:
+                with self.db_manager.transaction() as cursor:
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute("DELETE FROM button_shops")
+                    cursor.execute("DELETE FROM shop_transactions")
+                    cursor.execute("DELETE FROM shop_transaction_daily")
+            except Exception as e:
+                self._safe_log('error', f"[ARCButtonShop] Clear shops error: {str(e)}")
+                sender.send_message("清除商店数据失败，请查看日志")
+                return True
+            if self.shop_cache is not None:
+                self.shop_cache.clear()
+            if self.position_index is not None:
+                self.position_index.clear()
             sender.send_message("所有商店数据已清除")
             
         elif command == "reload":
             # 重新加载配置
             sender.send_message("商店系统已重新加载")
             
+        elif command == "retention":
+            # 立即执行一轮交易记录清理（分批在后续 tick 中完成）
+            def on_retention_done(stats):
+                sender.send_message(
+                    f"交易记录清理完成：处理 {stats['rows']} 条明细（{stats['batches']} 批），"
+                    f"清理 {stats['daily_purged']} 条按天汇总，回收 {stats['vacuum_pages']} 页"
+                )
+            if self.retention_manager.start_pass(on_done=on_retention_done):
+                sender.send_message("交易记录清理已开始")
+            elif self.retention_manager.is_running:
+                sender.send_message("交易记录清理正在进行中")
+            else:
+                sender.send_message("交易记录保留天数为 0，未启用清理")
+            
+        elif command == "vacuum":
+            # 一次性把旧数据库切换为增量 VACUUM 模式（完整 VACUUM，大库耗时较长，需要 confirm 确认）
+            if self.retention_manager.is_incremental_vacuum():
+                sender.send_message("数据库已处于增量 VACUUM 模式，无需切换")
+                return True
+            if self.retention_manager.is_vacuum_running:
+                sender.send_message("数据库 VACUUM 正在进行中")
+                return True
+            blocking = not self.db_executor.is_running
+            if len(args) < 2 or args[1].lower() != "confirm":
+                sender.send_message("该操作会对整个数据库执行一次完整 VACUUM，耗时与数据库大小成正比")
+                if blocking:
+                    sender.send_message("异步数据库执行器未启用，执行期间服务器会卡住，请在无人在线时执行")
+                else:
+                    sender.send_message("将在数据库写线程中执行，期间商店交易等写操作会排队等待，建议在服务器空闲时执行")
+                sender.send_message("确认执行请输入: /shopmanage vacuum confirm")
+                return True
+
+            def on_vacuum_done(success):
+                if success:
+                    sender.send_message("数据库已切换为增量 VACUUM 模式")
+                else:
+                    sender.send_message("数据库 VACUUM 失败，请查看日志")
+
+            sender.send_message("数据库 VACUUM 已开始" + ("（服务器将暂时无响应）" if blocking else "，完成后会通知"))
+            self.retention_manager.start_vacuum_conversion(on_vacuum_done)
+            
+        elif command == "reindex":
+            # 根据现有商店重建 chunk_index 与 R-tree（修复旧数据库中漂移的区块计数）
+            try:
+                chunk_count, shop_count = self.shop_index.rebuild()
+                if self.shop_cache is not None:
+                    self.shop_cache.rebuild()
+                if self.position_index is not None:
+                    self.position_index.rebuild()
+            except Exception as e:
+                self._safe_log('error', f"[ARCButtonShop] Rebuild shop index error: {str(e)}")
+                sender.send_message("重建索引失败，请查看日志")
+                return True
+            sender.send_message(f"索引已重建：{chunk_count} 个区块，{shop_count} 个商店坐标")
+            
+        elif command == "stats":
+            # 插件运行统计：/shopmanage stats [on|off|reset]
+            action = args[1].lower() if len(args) > 1 else ""
+            if action == "on":
+                self.perf_monitor.enable()
+                sender.send_message("耗时统计已开启")
+            elif action == "off":
+                self.perf_monitor.disable()
+                sender.send_message("耗时统计已关闭")
+            elif action == "reset":
+                self.perf_monitor.reset()
+                sender.send_message("耗时统计已清零")
+            else:
+                for line in self._get_stats_lines():
+                    sender.send_message(line)
+            
+        elif command == "export":
+            # 后台导出商店/交易数据：/shopmanage export <shops|transactions> [since]
+            if len(args) < 2 or args[1].lower() not in EXPORT_TARGETS:
+                sender.send_message("用法: /shopmanage export <shops|transactions> [YYYY-MM-DD|Nd]")
+                return True
+            if self.export_manager.is_running:
+                sender.send_message("已有导出任务正在进行")
+                return True
+            try:
+                output_path = self.export_manager.start_export(
+                    args[1].lower(),
+                    args[2] if len(args) > 2 else None,
+                    report=sender.send_message
+                )
+                sender.send_message(f"导出已开始: {output_path}")
+            except ValueError:
+                sender.send_message("无效的起始时间，请使用 YYYY-MM-DD 或 Nd（N 天前）")
+            
         return True
 
+    def _get_stats_lines(self) -> list:
+        """/shopmanage stats 输出内容"""
+        lines = [
+            f"事件快速过滤: 交互 {self.interact_events_rejected} 次，破坏 {self.break_events_rejected} 次",
+            f"交互防抖丢弃: {self.interact_events_debounced} 次"
+        ]
+        if self.shop_cache is not None:
+            cache_stats = self.shop_cache.get_stats()
+            lines.append(
+                f"区块缓存: {cache_stats['loaded_chunks']} 个区块，{cache_stats['cached_shops']} 个商店，"
+                f"命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次"
+            )
+        nbt_stats = self.inventory_manager.get_nbt_cache_stats()
+        lines.append(
+            f"NBT 解码缓存: {nbt_stats['size']} 条，命中 {nbt_stats['hits']} 次，未命中 {nbt_stats['misses']} 次"
+        )
+        snapshot_stats = self.inventory_manager.get_snapshot_stats()
+        lines.append(
+            f"背包快照: {snapshot_stats['players']} 名玩家，复用 {snapshot_stats['hits']} 次，"
+            f"重新读取 {snapshot_stats['misses']} 次"
+        )
+        name_stats = self.inventory_manager.get_name_cache_stats()
+        name_lookups = name_stats['hits'] + name_stats['misses']
+        name_hit_rate = name_stats['hits'] / name_lookups * 100 if name_lookups else 0.0
+        lines.append(
+            f"物品名翻译缓存: {name_stats['size']} 条，命中 {name_stats['hits']} 次，"
+            f"未命中 {name_stats['misses']} 次，命中率 {name_hit_rate:.1f}%"
+        )
+        if not self.perf_monitor.enabled:
+            lines.append("耗时统计: 未开启（/shopmanage stats on）")
+            return lines
+        perf_stats = self.perf_monitor.get_stats()
+        lines.append(f"耗时统计（按总耗时排序，单位 ms）: {len(perf_stats)} 项")
+        ranked = sorted(perf_stats.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for op_name, op_stats in ranked[:15]:
+            lines.append(
+                f"  {op_name}: {op_stats['count']} 次 总 {op_stats['total_ms']:.1f} "
+                f"p50 {op_stats['p50_ms']:.3f} p95 {op_stats['p95_ms']:.3f} "
+                f"p99 {op_stats['p99_ms']:.3f} max {op_stats['max_ms']:.3f}"
+            )
+        return lines
+
     def _show_all_shops_panel(self, player):
-        """显示全部商店面板（OP 管理用）"""
+        """显示全部商店面板（OP 管理用）；商店列表在读线程中查询，查询完成后在主线程发送表单"""
+        if not getattr(player, 'is_op', False):
+            player.send_message(self.language_manager.GetText("NO_PERMISSION"))
+            return
+
+        def load(db):
+            count_row = db.query_one_named("count_active_shops")
+            shops = list(db.iter_query(
+                f"SELECT {SHOP_LIST_COLUMNS} FROM button_shops WHERE is_active = 1 ORDER BY create_time DESC LIMIT 50"
+            ))
+            return (count_row['count'] if count_row else 0), shops
+
+        self.db_executor.submit_read(
+            load,
+            lambda result: self._send_all_shops_panel(player, *result),
+            lambda error: self._on_panel_load_error(player, "Show all shops panel", error, "显示商店列表时出现错误")
+        )
+
+    def _on_panel_load_error(self, player, action: str, error: BaseException, message: str):
+        """异步加载面板数据失败"""
+        self._safe_log('error', f"[ARCButtonShop] {action} error: {str(error)}")
+        player.send_message(message)
+
+    def _send_all_shops_panel(self, player, shop_count: int, shops: list):
+        """发送全部商店面板"""
         try:
-            if not getattr(player, 'is_op', False):
-                player.send_message(self.language_manager.GetText("NO_PERMISSION"))
-                return
-            all_shops = self.db_manager.query_all(
-                "SELECT * FROM button_shops WHERE is_active = 1 ORDER BY create_time DESC"
-            )
-            if not all_shops:
+            if not shop_count:
                 no_shops_panel = ActionForm(
                     title="管理全部商店",
                     content="服务器内暂无活跃商店",
@@ -1434,16 +1927,15 @@ class ARCButtonShopPlugin(Plugin):
                 return
             panel = ActionForm(
                 title="管理全部商店（OP）",
-                content=f"共 {len(all_shops)} 个活跃商店。\n绿色[出售]=玩家在此买货；蓝色[收购]=玩家卖货换钱；黄色[系统]=官方无限商店。\n点击条目进入管理。"
+                content=f"共 {shop_count} 个活跃商店。\n绿色[出售]=玩家在此买货；蓝色[收购]=玩家卖货换钱；黄色[系统]=官方无限商店。\n点击条目进入管理。"
             )
-            for shop in all_shops[:50]:
-                item_data = json.loads(shop['item_data'])
+            for shop in shops:
                 is_infinite = self._is_shop_infinite(shop)
                 stock_text = "无限" if is_infinite else shop['stock']
-                button_text = f"{self._get_shop_type_short_tag(shop)} {item_data['name']} - {self._get_shop_owner_display(shop)} - {'库存' if shop.get('shop_type', 'sell') == 'sell' else '预算'}:{stock_text} - 单价:{shop['unit_price']}"
+                button_text = f"{self._get_shop_type_short_tag(shop)} {self._get_item_display_name(player, shop, shop['item_name'])} - {self._get_shop_owner_display(shop)} - {'库存' if shop.get('shop_type', 'sell') == 'sell' else '预算'}:{stock_text} - 单价:{shop['unit_price']}"
                 panel.add_button(
                     button_text,
-                    on_click=lambda sender, s=shop: self._show_shop_manage_panel(sender, s, from_all_shops=True)
+                    on_click=lambda sender, shop_id=shop['id']: self._open_shop_manage_panel(sender, shop_id, from_all_shops=True)
                 )
             panel.add_button(
                 "返回",
@@ -1455,12 +1947,20 @@ class ARCButtonShopPlugin(Plugin):
             player.send_message("显示商店列表时出现错误")
 
     def _show_my_shops_panel(self, player):
-        """显示我的商店面板"""
+        """显示我的商店面板；商店列表在读线程中查询，查询完成后在主线程发送表单"""
+        owner_xuid = str(player.unique_id)
+        self.db_executor.submit_read(
+            lambda db: list(db.iter_query(
+                f"SELECT {SHOP_LIST_COLUMNS} FROM button_shops WHERE owner_xuid = ? AND is_active = 1 ORDER BY create_time DESC",
+                (owner_xuid,)
+            )),
+            lambda my_shops: self._send_my_shops_panel(player, my_shops),
+            lambda error: self._on_panel_load_error(player, "Show my shops", error, "显示商店列表时出现错误")
+        )
+
+    def _send_my_shops_panel(self, player, my_shops: list):
+        """发送我的商店面板"""
         try:
-            my_shops = self.db_manager.query_all(
-                "SELECT * FROM button_shops WHERE owner_xuid = ? AND is_active = 1 ORDER BY create_time DESC",
-                (str(player.unique_id),)
-            )
             
             if not my_shops:
                 no_shops_panel = ActionForm(
@@ -1478,16 +1978,15 @@ class ARCButtonShopPlugin(Plugin):
             )
             
             for shop in my_shops:
-                item_data = json.loads(shop['item_data'])
                 stock_text = "无限" if self._is_shop_infinite(shop) else shop['stock']
-                button_text = f"{self._get_shop_type_short_tag(shop)} {item_data['name']} - 库存:{stock_text} - 单价:{shop['unit_price']}"
-                if item_data.get('enchants'):
+                button_text = f"{self._get_shop_type_short_tag(shop)} {self._get_item_display_name(player, shop, shop['item_name'])} - 库存:{stock_text} - 单价:{shop['unit_price']}"
+                if shop['has_enchants']:
                     button_text += " §b[附魔]"
-                if item_data.get('lore'):
+                if shop['has_lore']:
                     button_text += " §d[Lore]"
                 my_shops_panel.add_button(
                     button_text,
-                    on_click=lambda sender, s=shop: self._show_shop_manage_panel(sender, s)
+                    on_click=lambda sender, shop_id=shop['id']: self._open_shop_manage_panel(sender, shop_id)
                 )
             
             my_shops_panel.add_button(
@@ -1514,10 +2013,7 @@ class ARCButtonShopPlugin(Plugin):
                     search_chunk_x = chunk_x + dx
                     search_chunk_z = chunk_z + dz
                     
-                    chunk_shops = self.db_manager.query_all(
-                        "SELECT * FROM button_shops WHERE chunk_x = ? AND chunk_z = ? AND dimension = ? AND is_active = 1",
-                        (search_chunk_x, search_chunk_z, player_loc.dimension.name)
-                    )
+                    chunk_shops = self._get_chunk_shops(search_chunk_x, search_chunk_z, player_loc.dimension.name)
                     nearby_shops.extend(chunk_shops)
             
             if not nearby_shops:
@@ -1541,7 +2037,7 @@ class ARCButtonShopPlugin(Plugin):
                     (shop['x'] - player_loc.x) ** 2 + 
                     (shop['z'] - player_loc.z) ** 2
                 )
-                button_text = f"{self._get_shop_type_short_tag(shop)} {item_data['name']} - {self._get_shop_owner_display(shop)} - {distance:.1f}方块"
+                button_text = f"{self._get_shop_type_short_tag(shop)} {self._get_item_display_name(player, item_data)} - {self._get_shop_owner_display(shop)} - {distance:.1f}方块"
                 
                 # 添加附魔和Lore标识
                 if item_data.get('enchants'):
@@ -1565,6 +2061,18 @@ class ARCButtonShopPlugin(Plugin):
             self._safe_log('error', f"[ARCButtonShop] Show nearby shops error: {str(e)}")
             player.send_message("显示附近商店时出现错误")
 
+    def _open_shop_manage_panel(self, player, shop_id: int, from_all_shops=False):
+        """从商店列表进入管理面板：列表只含部分列，此时再读取完整商店数据"""
+        shop_data = self._get_shop_by_id(shop_id)
+        if not shop_data or not shop_data.get('is_active'):
+            player.send_message("商店不存在或已被删除")
+            if from_all_shops:
+                self._show_all_shops_panel(player)
+            else:
+                self._show_my_shops_panel(player)
+            return
+        self._show_shop_manage_panel(player, shop_data, from_all_shops=from_all_shops)
+
     def _show_shop_manage_panel(self, player, shop_data, from_all_shops=False):
         """显示商店管理面板（from_all_shops 为 True 时返回至「管理全部商店」）"""
         try:
@@ -1583,7 +2091,7 @@ class ARCButtonShopPlugin(Plugin):
 ————————————
 {self._get_shop_type_manage_line(shop_data)}
 
-物品: {item_data['name']}
+物品: {self._get_item_display_name(player, item_data)}
 {"库存" if shop_type == "sell" else "预算余额"}: {stock_text}
 {price_label}: {shop_data['unit_price']}
 位置: ({shop_data['x']}, {shop_data['y']}, {shop_data['z']})
@@ -1678,12 +2186,21 @@ class ARCButtonShopPlugin(Plugin):
                 )
                 player.send_form(result_form)
                 return
-            self.db_manager.update(
-                table='button_shops',
-                data={'is_infinite': 1, 'stock': self.UNLIMITED_STOCK, 'quantity': self.UNLIMITED_STOCK},
-                where='id = ?',
-                params=(shop_data['id'],)
-            )
+            # 按修订号更新：面板打开后商店可能已被交易、修改或删除
+            if not self._update_shop_record(
+                shop_data['id'],
+                {'is_infinite': 1, 'stock': self.UNLIMITED_STOCK, 'quantity': self.UNLIMITED_STOCK},
+                shop_data.get('revision', 0)
+            ):
+                player.send_message("商店数据已变化，请确认后重试")
+                latest = self._get_shop_by_id(shop_data['id'])
+                if latest:
+                    self._show_shop_manage_panel(player, latest, from_all_shops)
+                elif from_all_shops:
+                    self._show_all_shops_panel(player)
+                else:
+                    self._show_my_shops_panel(player)
+                return
             updated = self._get_shop_by_id(shop_data['id'])
             if updated:
                 shop_data = updated
@@ -1703,7 +2220,7 @@ class ARCButtonShopPlugin(Plugin):
         try:
             item_data = json.loads(shop_data['item_data'])
             restock_title = f"补充库存{self._get_shop_manage_title_suffix(shop_data)}"
-            restock_info = f"{self._get_shop_type_plain_headline(shop_data)}\n\n为 {item_data['name']} 补充库存\n当前库存: {shop_data['stock']}"
+            restock_info = f"{self._get_shop_type_plain_headline(shop_data)}\n\n为 {self._get_item_display_name(player, item_data)} 补充库存\n当前库存: {shop_data['stock']}"
             
             # 添加附魔信息
             if item_data.get('enchants'):
@@ -1747,18 +2264,16 @@ class ARCButtonShopPlugin(Plugin):
                     required_item = self._shop_item_transaction_payload(item_data, quantity)
 
                     if self.inventory_manager.has_item(sender, required_item) and self.inventory_manager.remove_item(sender, required_item):
-                        # 更新库存
-                        new_stock = shop_data['stock'] + quantity
-                        self.db_manager.update(
-                            table='button_shops',
-                            data={'stock': new_stock, 'is_active': 1},
-                            where='id = ?',
-                            params=(shop_data['id'],)
-                        )
+                        # 在数据库当前库存上累加（不使用面板打开时的库存快照）
+                        if self._run_shop_statement("restock", (quantity, shop_data['id']), shop_data['id']) != 1:
+                            # 商店已被删除：退还物品
+                            self.inventory_manager.give_item(sender, required_item)
+                            sender.send_message("商店不存在或已被删除")
+                            return
                         
                         success_form = ActionForm(
                             title=restock_title,
-                            content=f"成功补充 {quantity} 个 {item_data['name']}",
+                            content=f"成功补充 {quantity} 个 {self._get_item_display_name(sender, item_data)}",
                             on_close=lambda s: self._show_shop_manage_panel(s, shop_data, from_all_shops)
                             if from_all_shops else self._show_my_shops_panel(s)
                         )
@@ -1810,7 +2325,7 @@ class ARCButtonShopPlugin(Plugin):
 
 确定要删除这个商店吗？
 
-物品: {item_data['name']}
+物品: {self._get_item_display_name(player, item_data)}
 {stock_line}"""
             
             # 添加附魔信息
@@ -1856,47 +2371,37 @@ class ARCButtonShopPlugin(Plugin):
     def _handle_shop_removal_by_owner(self, player, shop_data):
         """处理店主破坏商店按钮（删除商店）"""
         try:
+            # 先按修订号删除，再按实际删除的行返还，避免基于旧数据重复返还
+            deleted = self._delete_shop_record(shop_data)
+            if deleted is None:
+                player.send_message("商店数据已变化，请重新操作")
+                return
+            shop_data = deleted
             item_data = json.loads(shop_data['item_data'])
             shop_type = shop_data.get('shop_type', 'sell')
-            is_infinite = self._is_shop_infinite(shop_data)
             
-            if not is_infinite:
-                if shop_type == "sell":
-                    if shop_data['stock'] > 0:
-                        return_item = self._shop_item_transaction_payload(item_data, shop_data['stock'])
-                        self.inventory_manager.give_item(player, return_item)
-                        player.send_message(self.language_manager.GetText("SHOP_REMOVED_BY_OWNER_SELL").format(
-                            shop_data['stock'], item_data['name']
-                        ))
-                else:
-                    if shop_data['stock'] > 0:
-                        self._change_player_money(player.name, shop_data['stock'])
-                        player.send_message(self.language_manager.GetText("SHOP_REMOVED_BY_OWNER_BUY").format(
-                            shop_data['stock']
-                        ))
-                    collected_items = []
-                    if shop_data.get('collected_items'):
-                        try:
-                            collected_items = json.loads(shop_data['collected_items'])
-                        except Exception:
-                            collected_items = []
-                    if collected_items:
-                        total_items = sum(item['count'] for item in collected_items)
-                        for item in collected_items:
-                            self.inventory_manager.give_item(player, item)
-                        player.send_message(f"商店已删除，{len(collected_items)} 批收集的物品（共 {total_items} 个）已返还到背包")
-            else:
+            self._refund_deleted_shop(player.name, player, shop_data)
+            if self._is_shop_infinite(shop_data):
                 player.send_message("系统商店已删除")
-            
-            # 删除商店记录
-            self.db_manager.delete(
-                table='button_shops',
-                where='id = ?',
-                params=(shop_data['id'],)
-            )
-            
-            # 更新区块索引
-            self._update_chunk_index(shop_data['chunk_x'], shop_data['chunk_z'], shop_data['dimension'], -1)
+            elif shop_type == "sell":
+                if shop_data['stock'] > 0:
+                    player.send_message(self.language_manager.GetText("SHOP_REMOVED_BY_OWNER_SELL").format(
+                        shop_data['stock'], self._get_item_display_name(player, item_data)
+                    ))
+            else:
+                if shop_data['stock'] > 0:
+                    player.send_message(self.language_manager.GetText("SHOP_REMOVED_BY_OWNER_BUY").format(
+                        shop_data['stock']
+                    ))
+                collected_items = []
+                if shop_data.get('collected_items'):
+                    try:
+                        collected_items = json.loads(shop_data['collected_items'])
+                    except Exception:
+                        collected_items = []
+                if collected_items:
+                    total_items = sum(item['count'] for item in collected_items)
+                    player.send_message(f"商店已删除，{len(collected_items)} 批收集的物品（共 {total_items} 个）已返还到背包")
             
             self._safe_log('info', f"[ARCButtonShop] Shop removed by owner {player.name} at ({shop_data['x']}, {shop_data['y']}, {shop_data['z']})")
             
@@ -1930,7 +2435,7 @@ class ARCButtonShopPlugin(Plugin):
             )
             
             for i, item in enumerate(collected_items):
-                button_text = f"{item['name']} x{item['count']} - {item['collect_time']}"
+                button_text = f"{self._get_item_display_name(player, item)} x{item['count']} - {item['collect_time']}"
                 if item.get('enchants'):
                     button_text += " §b[附魔]"
                 if item.get('lore'):
@@ -1956,32 +2461,48 @@ class ARCButtonShopPlugin(Plugin):
             self._safe_log('error', f"[ARCButtonShop] Show collect items panel error: {str(e)}")
             player.send_message("显示收取物品面板时出现错误")
 
+    def _show_stale_collect_panel(self, player, shop_data, from_all_shops=False):
+        """收取面板基于的商店数据已被修改：提示后以最新数据重新打开"""
+        player.send_message("商店数据已变化，已刷新收取列表")
+        latest = self._get_shop_by_id(shop_data['id'])
+        if latest:
+            self._show_collect_items_panel(player, latest, from_all_shops)
+
     def _collect_single_item(self, player, shop_data, item_data, item_index, from_all_shops=False):
-        """收取单个物品"""
+        """收取单个物品：先按修订号移除该条记录，成功后再发放，避免基于旧列表重复收取"""
         try:
             collect_title = f"收取物品{self._get_shop_manage_title_suffix(shop_data)}"
-            if self.inventory_manager.give_item(player, item_data):
-                collected_items = []
-                if shop_data.get('collected_items'):
-                    try:
-                        collected_items = json.loads(shop_data['collected_items'])
-                    except Exception:
-                        collected_items = []
-                if item_index < len(collected_items):
-                    collected_items.pop(item_index)
-                self.db_manager.update(
-                    table='button_shops',
-                    data={'collected_items': json.dumps(collected_items)},
-                    where='id = ?',
-                    params=(shop_data['id'],)
-                )
+            collected_items = []
+            if shop_data.get('collected_items'):
+                try:
+                    collected_items = json.loads(shop_data['collected_items'])
+                except Exception:
+                    collected_items = []
+            if item_index < len(collected_items):
+                collected_items.pop(item_index)
+            if not self._update_shop_record(
+                shop_data['id'], {'collected_items': json.dumps(collected_items)}, shop_data.get('revision', 0)
+            ):
+                self._show_stale_collect_panel(player, shop_data, from_all_shops)
+                return
+            shop_data = self._get_shop_by_id(shop_data['id']) or shop_data
+            # 先确认背包放得下整批物品再发放：部分发放后整批放回会导致物品复制
+            plan = self.inventory_manager.plan_delivery(player, item_data)
+            if (
+                plan is not None
+                and plan.capacity >= int(item_data.get('count', 0) or 0)
+                and self.inventory_manager.give_item(player, item_data, plan)
+            ):
                 success_form = ActionForm(
                     title=collect_title,
-                    content=f"成功收取 {item_data['count']} 个 {item_data['name']}",
+                    content=f"成功收取 {item_data['count']} 个 {self._get_item_display_name(player, item_data)}",
                     on_close=lambda sender: self._show_collect_items_panel(sender, shop_data, from_all_shops)
                 )
                 player.send_form(success_form)
             else:
+                # 发放失败：物品放回收取列表
+                self._run_shop_statement("return_collected_item", (json.dumps(item_data), shop_data['id']), shop_data['id'])
+                shop_data = self._get_shop_by_id(shop_data['id']) or shop_data
                 error_form = ActionForm(
                     title=collect_title,
                     content="背包空间不足，无法收取物品",
@@ -2016,20 +2537,26 @@ class ARCButtonShopPlugin(Plugin):
                 )
                 player.send_form(no_items_panel)
                 return
+            # 先按修订号清空收取列表，成功后再发放；发放失败的物品放回列表
+            if not self._update_shop_record(shop_data['id'], {'collected_items': '[]'}, shop_data.get('revision', 0)):
+                self._show_stale_collect_panel(player, shop_data, from_all_shops)
+                return
             success_count = 0
             failed_items = []
             for item in collected_items:
-                if self.inventory_manager.give_item(player, item):
+                # 放不下整批的物品不发放，直接保留在收取列表中
+                plan = self.inventory_manager.plan_delivery(player, item)
+                if (
+                    plan is not None
+                    and plan.capacity >= int(item.get('count', 0) or 0)
+                    and self.inventory_manager.give_item(player, item, plan)
+                ):
                     success_count += 1
                 else:
                     failed_items.append(item)
-            if success_count > 0:
-                self.db_manager.update(
-                    table='button_shops',
-                    data={'collected_items': json.dumps(failed_items)},
-                    where='id = ?',
-                    params=(shop_data['id'],)
-                )
+            for item in failed_items:
+                self._run_shop_statement("return_collected_item", (json.dumps(item), shop_data['id']), shop_data['id'])
+            shop_data = self._get_shop_by_id(shop_data['id']) or shop_data
             if success_count == len(collected_items):
                 result_content = f"成功收取所有 {success_count} 批物品"
             elif success_count > 0:
@@ -2055,42 +2582,31 @@ class ARCButtonShopPlugin(Plugin):
     def _execute_delete_shop(self, player, shop_data, from_all_shops=False):
         """执行删除商店操作（from_all_shops 为 True 时删除后返回「管理全部商店」；返还物品/资金给店主）"""
         try:
+            delete_title = f"删除商店{self._get_shop_manage_title_suffix(shop_data)}"
+            # 先按修订号删除（面板打开后商店可能已有交易），再按实际删除的行返还
+            deleted = self._delete_shop_record(shop_data)
+            if deleted is None:
+                player.send_message("商店数据已变化，请确认后重试")
+                latest = self._get_shop_by_id(shop_data['id'])
+                if latest:
+                    self._show_delete_shop_panel(player, latest, from_all_shops)
+                elif from_all_shops:
+                    self._show_all_shops_panel(player)
+                else:
+                    self._show_my_shops_panel(player)
+                return
+            shop_data = deleted
             item_data = json.loads(shop_data['item_data'])
             shop_type = shop_data.get('shop_type', 'sell')
             is_infinite = self._is_shop_infinite(shop_data)
-            delete_title = f"删除商店{self._get_shop_manage_title_suffix(shop_data)}"
             owner_name = shop_data['owner_name']
             owner_player = self.server.get_player(owner_name)  # 店主（在线才可返还物品）
-            
-            if not is_infinite:
-                if shop_type == "sell":
-                    if shop_data['stock'] > 0 and owner_player:
-                        return_item = self._shop_item_transaction_payload(item_data, shop_data['stock'])
-                        self.inventory_manager.give_item(owner_player, return_item)
-                else:
-                    if shop_data['stock'] > 0:
-                        self._change_player_money(owner_name, shop_data['stock'])
-                    collected_items = []
-                    if shop_data.get('collected_items'):
-                        try:
-                            collected_items = json.loads(shop_data['collected_items'])
-                        except Exception:
-                            collected_items = []
-                    for item in collected_items:
-                        if owner_player:
-                            self.inventory_manager.give_item(owner_player, item)
-            
-            self.db_manager.delete(
-                table='button_shops',
-                where='id = ?',
-                params=(shop_data['id'],)
-            )
-            self._update_chunk_index(shop_data['chunk_x'], shop_data['chunk_z'], shop_data['dimension'], -1)
+            self._refund_deleted_shop(owner_name, owner_player, shop_data)
             
             if is_infinite:
                 result_content = "系统商店已成功删除"
             elif shop_type == "sell":
-                result_content = f"商店已成功删除，{shop_data['stock']} 个 {item_data['name']} 已返还到背包"
+                result_content = f"商店已成功删除，{shop_data['stock']} 个 {self._get_item_display_name(player, item_data)} 已返还到背包"
             else:
                 result_content = f"商店已成功删除，剩余预算 {shop_data['stock']} 已返还，收集的物品已返还到背包"
             
@@ -2119,6 +2635,78 @@ class ARCButtonShopPlugin(Plugin):
         """获取指定位置的商店信息（API接口）"""
         return self._get_shop_at_position(x, y, z, dimension)
     
+    def api_get_shops_at_positions(self, positions) -> dict:
+        """
+        批量获取多个坐标上的商店（API接口）
+        已加载区块直接从区块缓存回答，其余坐标写入临时表后与商店表做一次连接查询
+        :param positions: (x, y, z, dimension) 元组的可迭代对象
+        :return: {(x, y, z, dimension): 商店字典}，只包含存在活跃商店的坐标
+        """
+        result = {}
+        try:
+            remaining = []
+            for x, y, z, dimension in positions:
+                key = (int(x), int(y), int(z), dimension)
+                if self.position_index is not None and self.position_index.lookup(*key) is None:
+                    continue
+                if self.shop_cache is not None:
+                    hit, shop = self.shop_cache.get_shop_at(key[0], key[1], key[2], dimension)
+                    if hit:
+                        if shop:
+                            # 缓存中的商店为共享对象，返回副本给外部插件
+                            result[key] = dict(shop)
+                        continue
+                remaining.append(key)
+            if not remaining:
+                return result
+            with self.db_manager.transaction() as cursor:
+                cursor.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS shop_position_lookup "
+                    "(x INTEGER NOT NULL, y INTEGER NOT NULL, z INTEGER NOT NULL, dimension TEXT NOT NULL)"
+                )
+                cursor.execute("DELETE FROM temp.shop_position_lookup")
+                cursor.executemany(
+                    "INSERT INTO temp.shop_position_lookup (x, y, z, dimension) VALUES (?, ?, ?, ?)", remaining
+                )
+                cursor.execute(
+                    "SELECT DISTINCT s.* FROM temp.shop_position_lookup p JOIN button_shops s "
+                    "ON s.x = p.x AND s.y = p.y AND s.z = p.z AND s.dimension = p.dimension AND s.is_active = 1"
+                )
+                for row in cursor.fetchall():
+                    result[(row['x'], row['y'], row['z'], row['dimension'])] = dict(row)
+                cursor.execute("DELETE FROM temp.shop_position_lookup")
+            return result
+        except Exception as e:
+            self._safe_log('error', f"[ARCButtonShop] Get shops at positions error: {str(e)}")
+            return result
+    
+    def api_get_shops_in_box(self, dimension: str, min_pos, max_pos):
+        """
+        获取长方体范围内（含边界）的商店（API接口，生成器：逐条产出商店字典，不一次性载入全部结果）
+        :param dimension: 维度名
+        :param min_pos: (x, y, z) 一角
+        :param max_pos: (x, y, z) 对角
+        """
+        (x1, y1, z1), (x2, y2, z2) = min_pos, max_pos
+        for shop in self.shop_index.iter_box(
+            dimension, min(x1, x2), min(y1, y2), min(z1, z2), max(x1, x2), max(y1, y2), max(z1, z2)
+        ):
+            yield shop.to_dict()
+
+    def api_get_shops_in_radius(self, dimension: str, x: float, y: float, z: float, radius: float):
+        """
+        获取以 (x, y, z) 为球心、radius 为半径的球内商店（API接口，生成器）
+        先按外接立方体过滤，再计算实际距离
+        """
+        radius_sq = radius * radius
+        for shop in self.shop_index.iter_box(
+            dimension,
+            math.floor(x - radius), math.floor(y - radius), math.floor(z - radius),
+            math.ceil(x + radius), math.ceil(y + radius), math.ceil(z + radius)
+        ):
+            if (shop.x - x) ** 2 + (shop.y - y) ** 2 + (shop.z - z) ** 2 <= radius_sq:
+                yield shop.to_dict()
+    
     def api_get_player_shops(self, player_xuid: str) -> list:
         """获取玩家的所有商店（API接口）"""
         try:
@@ -2142,11 +2730,9 @@ class ARCButtonShopPlugin(Plugin):
                     search_chunk_x = chunk_x + dx
                     search_chunk_z = chunk_z + dz
                     
-                    chunk_shops = self.db_manager.query_all(
-                        "SELECT * FROM button_shops WHERE chunk_x = ? AND chunk_z = ? AND dimension = ? AND is_active = 1",
-                        (search_chunk_x, search_chunk_z, dimension)
-                    )
-                    nearby_shops.extend(chunk_shops)
+                    chunk_shops = self._get_chunk_shops(search_chunk_x, search_chunk_z, dimension)
+                    # 缓存中的商店为共享对象，返回副本给外部插件
+                    nearby_shops.extend(dict(shop) for shop in chunk_shops)
             
             return nearby_shops
         except Exception as e:
@@ -2163,6 +2749,21 @@ class ARCButtonShopPlugin(Plugin):
             self._safe_log('error', f"[ARCButtonShop] Get all active shops error: {str(e)}")
             return []
     
+    def api_get_performance_stats(self) -> dict:
+        """获取热路径耗时统计：操作名 -> {count, total_ms, avg_ms, p50_ms, p95_ms, p99_ms, max_ms}"""
+        return self.perf_monitor.get_stats()
+    
+    def api_set_performance_stats_enabled(self, enabled: bool) -> None:
+        """开启/关闭耗时统计（关闭时移除计时包装）"""
+        if enabled:
+            self.perf_monitor.enable()
+        else:
+            self.perf_monitor.disable()
+    
+    def api_reset_performance_stats(self) -> None:
+        """清零耗时统计"""
+        self.perf_monitor.reset()
+    
     def api_purchase_from_shop(self, shop_id: int, buyer_xuid: str, quantity: int) -> tuple[bool, str]:
         """从商店购买商品（API接口）"""
         try: